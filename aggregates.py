@@ -0,0 +1,262 @@
+import os
+from dataclasses import dataclass, field
+from itertools import chain
+from pathlib import Path
+import numpy as np
+from models import SessionFilter
+from query import AGGREGATE_COLUMNS, DB_PATH, Query, read_int_columns
+from snapshot import open_snapshot
+import paths
+
+AGGREGATES_FILE = Path(paths.AGGREGATES_FILE)
+# Changed sessions looked up per statement
+ID_CHUNK = 500
+
+# Column-wise (local epochs, category ids, durations), ready for NumPy
+AggregateColumns = tuple[np.ndarray, np.ndarray, np.ndarray]
+
+SECONDS_PER_DAY = 86400
+SECONDS_PER_HOUR = 3600
+
+
+def _zeros(size: int = 0) -> np.ndarray:
+    return np.zeros(size, dtype=np.int64)
+
+
+@dataclass
+class Aggregates:
+    """Running totals behind the charts, keyed by local day, category and hour.
+
+    Category totals are indexed by category id; names are only looked up
+    for display. Counts are kept next to the second totals so a day or
+    category whose sessions were all deleted drops out instead of showing
+    as zero.
+    `last_change` is the change-log high-water mark the totals reflect.
+    `category_names` is read with the totals and not saved, so renames
+    and merges show up without a rebuild.
+    """
+
+    last_change: int | None = None
+    day0: int = 0
+    daily_seconds: np.ndarray = field(default_factory=_zeros)
+    daily_counts: np.ndarray = field(default_factory=_zeros)
+    category_seconds: np.ndarray = field(default_factory=_zeros)
+    category_counts: np.ndarray = field(default_factory=_zeros)
+    hourly_seconds: np.ndarray = field(default_factory=lambda: _zeros(24))
+    category_names: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=object))
+
+    def apply(self, columns: AggregateColumns, sign: int = 1) -> None:
+        """Add (sign=1) or retract (sign=-1) sessions given as local epochs, category ids and seconds."""
+        epochs, category_ids, durations = columns
+        if not len(epochs):
+            return
+
+        epochs = np.asarray(epochs, dtype=np.int64)
+        durations = np.asarray(durations, dtype=np.int64) * sign
+        counts = np.full(len(epochs), sign, dtype=np.int64)
+
+        days = epochs // SECONDS_PER_DAY
+        self._cover_days(int(days.min()), int(days.max()))
+        day_idx = days - self.day0
+        size = len(self.daily_seconds)
+        self.daily_seconds += _bincount(day_idx, durations, size)
+        self.daily_counts += _bincount(day_idx, counts, size)
+
+        category_ids = np.asarray(category_ids, dtype=np.int64)
+        self._cover_categories(int(category_ids.max()))
+        size = len(self.category_seconds)
+        self.category_seconds += _bincount(category_ids, durations, size)
+        self.category_counts += _bincount(category_ids, counts, size)
+
+        hours = (epochs % SECONDS_PER_DAY) // SECONDS_PER_HOUR
+        self.hourly_seconds += _bincount(hours, durations, 24)
+
+    def _cover_days(self, first: int, last: int) -> None:
+        if not len(self.daily_seconds):
+            self.day0 = first
+        start = min(first, self.day0)
+        end = max(last + 1, self.day0 + len(self.daily_seconds))
+        before = self.day0 - start
+        after = end - self.day0 - len(self.daily_seconds)
+        if before or after:
+            self.daily_seconds = np.pad(self.daily_seconds, (before, after))
+            self.daily_counts = np.pad(self.daily_counts, (before, after))
+            self.day0 = start
+
+    def _cover_categories(self, last: int) -> None:
+        added = last + 1 - len(self.category_seconds)
+        if added > 0:
+            self.category_seconds = np.pad(self.category_seconds, (0, added))
+            self.category_counts = np.pad(self.category_counts, (0, added))
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.daily_counts.any()
+
+    def day_range(self) -> tuple[np.datetime64, np.datetime64]:
+        active = np.flatnonzero(self.daily_counts)
+        first, last = self.day0 + active[0], self.day0 + active[-1]
+        return np.datetime64(int(first), "D"), np.datetime64(int(last), "D")
+
+    def active_days(self) -> tuple[np.ndarray, np.ndarray]:
+        """Dates that have sessions, with their total seconds."""
+        active = np.flatnonzero(self.daily_counts)
+        dates = (self.day0 + active).astype("datetime64[D]")
+        return dates, self.daily_seconds[active]
+
+    def category_totals(self) -> list[tuple[str, int]]:
+        """Categories that have sessions, largest total first."""
+        active = np.flatnonzero(self.category_counts)
+        totals = [
+            (str(self.category_names[category_id]), int(self.category_seconds[category_id]))
+            for category_id in active
+        ]
+        return sorted(totals, key=lambda x: x[1], reverse=True)
+
+    def heatmap_grid(self) -> np.ndarray:
+        """Seconds per day as a 7 x weeks grid, Monday first, padded to whole weeks."""
+        active = np.flatnonzero(self.daily_counts)
+        first, last = self.day0 + active[0], self.day0 + active[-1]
+        # Day 0 (1970-01-01) was a Thursday
+        start = first - (first + 3) % 7
+        end = last + (6 - (last + 3) % 7)
+        grid = _zeros(end - start + 1)
+        grid[first - start:last - start + 1] = self.daily_seconds[first - self.day0:last - self.day0 + 1]
+        return grid.reshape(-1, 7).T
+
+
+def _bincount(idx: np.ndarray, weights: np.ndarray, size: int) -> np.ndarray:
+    return np.bincount(idx, weights=weights, minlength=size).astype(np.int64)
+
+
+def load_aggregates() -> Aggregates:
+    if not AGGREGATES_FILE.exists():
+        return Aggregates()
+
+    with np.load(AGGREGATES_FILE) as data:
+        # Written before categories had ids; rebuilt from scratch
+        if "categories" in data.files:
+            return Aggregates()
+        return Aggregates(
+            last_change=int(data["last_change"]),
+            day0=int(data["day0"]),
+            daily_seconds=data["daily_seconds"],
+            daily_counts=data["daily_counts"],
+            category_seconds=data["category_seconds"],
+            category_counts=data["category_counts"],
+            hourly_seconds=data["hourly_seconds"],
+        )
+
+
+def save_aggregates(aggregates: Aggregates) -> None:
+    AGGREGATES_FILE.parent.mkdir(exist_ok=True)
+
+    tmp = AGGREGATES_FILE.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        np.savez(
+            f,
+            last_change=aggregates.last_change,
+            day0=aggregates.day0,
+            daily_seconds=aggregates.daily_seconds,
+            daily_counts=aggregates.daily_counts,
+            category_seconds=aggregates.category_seconds,
+            category_counts=aggregates.category_counts,
+            hourly_seconds=aggregates.hourly_seconds,
+        )
+    os.replace(tmp, AGGREGATES_FILE)
+
+
+def _columns(rows: list[tuple]) -> AggregateColumns:
+    table = np.array(rows, dtype=np.int64).reshape(-1, 3)
+    return table[:, 0], table[:, 1], table[:, 2]
+
+
+def _read_delta(since_change: int | None) -> tuple[int, np.ndarray, AggregateColumns | None, AggregateColumns]:
+    """Collect the rows needed to bring the aggregates up to date.
+
+    Returns the latest change-log position, category names by id, the
+    rows to retract (as they were when `since_change` was current) and the
+    rows to add. When the log cannot say what changed (`since_change` is
+    None, the log has not reached it because the database was replaced,
+    or a 'reset' entry follows it) the rows to retract are None and every
+    row is returned, archives included, to be counted from scratch. All
+    of it is read in one transaction so the parts agree.
+    """
+    query = Query(SessionFilter(), DB_PATH)
+    batches = query._batches()
+    try:
+        conn, schemas = next(batches)
+        last_change = conn.execute("SELECT coalesce(max(seq), 0) FROM main.session_changes").fetchone()[0]
+        names = query._names(conn, "categories")
+        if since_change is not None and since_change <= last_change:
+            changes = conn.execute(
+                f"SELECT session_id, op, {AGGREGATE_COLUMNS} FROM main.session_changes WHERE seq > ? ORDER BY seq",
+                (since_change,),
+            ).fetchall()
+            if all(op != "reset" for _, op, *_ in changes):
+                # Only the first change of each row describes what was counted before
+                first_changes = {}
+                for change in changes:
+                    first_changes.setdefault(change[0], change)
+                retract = [change[2:] for change in first_changes.values() if change[1] != "insert"]
+
+                ids = list(first_changes)
+                add = []
+                for i in range(0, len(ids), ID_CHUNK):
+                    chunk = ids[i:i + ID_CHUNK]
+                    placeholders = ", ".join("?" * len(chunk))
+                    sql = f"SELECT {AGGREGATE_COLUMNS} FROM main.sessions WHERE id IN ({placeholders})"
+                    add.extend(conn.execute(sql, chunk))
+                return last_change, names, _columns(retract), _columns(add)
+
+        parts = []
+        for conn, schemas in chain([(conn, schemas)], batches):
+            sql, params = query._sessions_sql(schemas, AGGREGATE_COLUMNS)
+            parts.append(read_int_columns(conn.execute(sql, params), 3))
+        return last_change, names, None, tuple(np.concatenate(column) for column in zip(*parts))
+    finally:
+        batches.close()
+
+
+def refresh_aggregates() -> Aggregates:
+    """Load the persisted aggregates and apply only the sessions changed since."""
+    if not DB_PATH.exists():
+        return Aggregates()
+    aggregates = load_aggregates()
+    last_change, names, retract, add = _read_delta(aggregates.last_change)
+
+    if retract is None:
+        aggregates = Aggregates()
+
+    if aggregates.last_change != last_change:
+        if retract is not None:
+            aggregates.apply(retract, sign=-1)
+        aggregates.apply(add)
+        aggregates.last_change = last_change
+        save_aggregates(aggregates)
+
+    aggregates.category_names = names
+    return aggregates
+
+
+def get_aggregates(session_filter: SessionFilter | None = None) -> Aggregates:
+    """Aggregates over the filtered sessions.
+
+    The unfiltered view is the persisted, incrementally refreshed one;
+    filtered views are computed from only the matching rows, taken from
+    the snapshot file while it is current. Everything is read with
+    sqlite3, so drawing charts in the terminal never loads SQLAlchemy.
+    """
+    if session_filter is None or session_filter.is_empty():
+        return refresh_aggregates()
+
+    aggregates = Aggregates()
+    snapshot = open_snapshot()
+    if snapshot is not None:
+        aggregates.apply(snapshot.aggregate_columns(session_filter))
+        aggregates.category_names = snapshot.strings["category"][:]
+    elif DB_PATH.exists():
+        query = Query(session_filter, DB_PATH)
+        aggregates.apply(query.aggregate_columns())
+        aggregates.category_names = query.category_names()
+    return aggregates
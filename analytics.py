@@ -1,324 +1,315 @@
+from dataclasses import dataclass, field
 from pathlib import Path
-from datetime import datetime, timedelta
-from collections import defaultdict
+from datetime import datetime
 import matplotlib
 matplotlib.use('Agg')
-import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from matplotlib.gridspec import GridSpec
 import numpy as np
-from models import StudySession
+from aggregates import Aggregates
+from timeseries import TREND_WINDOWS, choose_resolution, ewma, lttb, resample, rolling_mean
 
 CHARTS_DIR = Path(__file__).parent / "data" / "charts"
 CHARTS_DIR.mkdir(parents=True, exist_ok=True)
 
+# name -> (file format, dpi); vector formats ignore dpi
+OUTPUT_FORMATS = {
+    "png": ("png", 150),
+    "preview": ("png", 60),
+    "svg": ("svg", None),
+    "pdf": ("pdf", None),
+}
+
+CATEGORY_COLORS = ['#2E86AB', '#A23B72', '#F18F01', '#06A77D', '#C73E1D', '#6A4C93', '#E63946', '#06FFA5']
+HEATMAP_CMAP = matplotlib.colormaps['YlGn']
+WEEKDAY_LABELS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+SERIES_LABELS = {"day": "Daily Hours", "week": "Weekly Hours", "month": "Monthly Hours", "year": "Yearly Hours"}
+
 
 def get_timestamp() -> str:
     return datetime.now().strftime("%Y%m%d_%H%M%S")
 
 
-def generate_time_series(sessions: list[StudySession]) -> Path:
-    by_date = defaultdict(int)
-    for s in sessions:
-        date = s.start_time.date()
-        by_date[date] += s.duration_seconds / 3600
+def format_date_range(aggregates: Aggregates) -> str:
+    min_date, max_date = (d.item() for d in aggregates.day_range())
+    return f"{min_date.strftime('%b %d')} - {max_date.strftime('%b %d, %Y')}"
+
+
+@dataclass
+class ChartTemplate:
+    """A styled figure kept alive between renders.
+
+    Axes, labels, colormaps and colorbars are built once; each render only
+    swaps the data artists. Layout is computed on the first render and
+    reused afterwards.
+    """
+
+    fig: Figure
+    panels: list[tuple[object, dict]] = field(default_factory=list)
+    laid_out: bool = False
+    save_kwargs: dict = field(default_factory=dict)
 
-    if not by_date:
-        return None
 
-    dates = sorted(by_date.keys())
-    hours = [by_date[d] for d in dates]
+_templates: dict[str, ChartTemplate] = {}
 
-    fig, ax = plt.subplots(figsize=(12, 6))
-    ax.plot(dates, hours, marker='o', linewidth=2, markersize=6, label='Daily Hours', color='#2E86AB')
 
-    if len(dates) >= 3:
-        x_numeric = np.arange(len(dates))
-        z = np.polyfit(x_numeric, hours, 1)
-        p = np.poly1d(z)
-        ax.plot(dates, p(x_numeric), "--", linewidth=2, label='Trend', color='#C73E1D', alpha=0.7)
+def _setup_time_series(ax, compact: bool = False) -> dict:
+    line, = ax.plot([], [], marker='o', linewidth=2, markersize=6, label='Daily Hours', color='#2E86AB')
+    trend, = ax.plot([], [], "--", linewidth=2, label='Average', color='#C73E1D', alpha=0.7)
+    smooth, = ax.plot([], [], ":", linewidth=2, label='EWMA', color='#F18F01', alpha=0.8)
 
+    ax.xaxis_date()
     ax.set_xlabel('Date')
     ax.set_ylabel('Hours')
     ax.set_title('Study Sessions Over Time')
     ax.grid(True, alpha=0.3)
     ax.legend(loc='best')
     ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
-    plt.xticks(rotation=45, ha='right')
-    plt.tight_layout()
-
-    output = CHARTS_DIR / f"time_series_{get_timestamp()}.png"
-    plt.savefig(output, dpi=150)
-    plt.close()
-    return output
+    ax.tick_params(axis='x', rotation=45)
+    return {"line": line, "trend": trend, "smooth": smooth, "right_align": not compact}
+
+
+def _update_time_series(ax, artists: dict, aggregates: Aggregates) -> None:
+    # Every day in the range, empty ones included, so buckets and trends see the gaps
+    first, last = aggregates.day_range()
+    start = int(first.astype(np.int64)) - aggregates.day0
+    end = int(last.astype(np.int64)) - aggregates.day0 + 1
+    days = np.arange(first, last + 1)
+
+    resolution = choose_resolution(first, last, finest="day")
+    starts, seconds = resample(days, aggregates.daily_seconds[start:end], resolution)
+    hours = seconds / 3600
+    window = TREND_WINDOWS[resolution]
+
+    # Long ranges are thinned to a bounded number of points that keep the peaks
+    shown = lttb(hours)
+    x = mdates.date2num(starts[shown])
+    artists["line"].set_data(x, hours[shown])
+    artists["line"].set_marker('o' if len(shown) <= 60 else '')
+    artists["line"].set_label(SERIES_LABELS[resolution])
+
+    visible = len(hours) >= 3
+    artists["trend"].set_data(x, rolling_mean(hours, window)[shown])
+    artists["trend"].set_label(f"{window}-{resolution} average")
+    artists["smooth"].set_data(x, ewma(hours, window)[shown])
+    artists["smooth"].set_label(f"EWMA ({window} {resolution}s)")
+    artists["trend"].set_visible(visible)
+    artists["smooth"].set_visible(visible)
+    ax.legend(loc='best')
 
+    ax.relim(visible_only=True)
+    ax.autoscale_view()
 
-def generate_category_breakdown(sessions: list[StudySession]) -> Path:
-    by_category = defaultdict(int)
-    for s in sessions:
-        by_category[s.category] += s.duration_seconds / 3600
+    if artists["right_align"]:
+        for label in ax.get_xticklabels():
+            label.set_horizontalalignment('right')
 
-    if not by_category:
-        return None
 
-    categories = list(by_category.keys())
-    hours = list(by_category.values())
-    total_hours = sum(hours)
+def _setup_category_breakdown(ax, compact: bool = False) -> dict:
+    ax.set_xlabel('Category')
+    ax.set_ylabel('Hours')
+    ax.grid(True, alpha=0.3, axis='y')
+    ax.tick_params(axis='x', rotation=45)
+    return {"bars": None, "labels": [], "fontsize": 8 if compact else 9, "right_align": not compact}
 
-    sorted_data = sorted(zip(categories, hours), key=lambda x: x[1], reverse=True)
-    categories, hours = zip(*sorted_data)
 
-    colors = ['#2E86AB', '#A23B72', '#F18F01', '#06A77D', '#C73E1D', '#6A4C93', '#E63946', '#06FFA5']
-    bar_colors = [colors[i % len(colors)] for i in range(len(categories))]
+def _update_category_breakdown(ax, artists: dict, aggregates: Aggregates) -> None:
+    # The number of bars follows the number of categories, so they are redrawn
+    if artists["bars"] is not None:
+        artists["bars"].remove()
+    for text in artists["labels"]:
+        text.remove()
 
-    min_date = min(s.start_time.date() for s in sessions)
-    max_date = max(s.start_time.date() for s in sessions)
-    date_range = f"{min_date.strftime('%b %d')} - {max_date.strftime('%b %d, %Y')}"
+    categories, seconds = zip(*aggregates.category_totals())
+    hours = [s / 3600 for s in seconds]
+    total_hours = sum(hours)
+    bar_colors = [CATEGORY_COLORS[i % len(CATEGORY_COLORS)] for i in range(len(categories))]
 
-    fig, ax = plt.subplots(figsize=(10, 6))
     bars = ax.bar(categories, hours, color=bar_colors, alpha=0.8, edgecolor='black', linewidth=1.2)
-
+    labels = []
     for bar in bars:
         height = bar.get_height()
-        percentage = (height / total_hours) * 100
-        ax.text(bar.get_x() + bar.get_width() / 2., height,
-               f'({percentage:.0f}%)',
-               ha='center', va='bottom', fontsize=9)
+        percentage = (height / total_hours) * 100 if total_hours else 0
+        labels.append(ax.text(bar.get_x() + bar.get_width() / 2., height,
+                              f'({percentage:.0f}%)',
+                              ha='center', va='bottom', fontsize=artists["fontsize"]))
 
-    ax.set_xlabel('Category')
-    ax.set_ylabel('Hours')
-    ax.set_title(f'Study Time by Category: {date_range}')
-    ax.grid(True, alpha=0.3, axis='y')
-    plt.xticks(rotation=45, ha='right')
-    plt.tight_layout()
+    artists["bars"] = bars
+    artists["labels"] = labels
+    ax.set_title(f'Study Time by Category: {format_date_range(aggregates)}')
+    ax.relim()
+    ax.autoscale_view()
 
-    output = CHARTS_DIR / f"category_breakdown_{get_timestamp()}.png"
-    plt.savefig(output, dpi=150)
-    plt.close()
-    return output
+    if artists["right_align"]:
+        for label in ax.get_xticklabels():
+            label.set_horizontalalignment('right')
 
 
-def generate_heatmap(sessions: list[StudySession]) -> Path:
-    by_date = defaultdict(float)
-    for s in sessions:
-        date = s.start_time.date()
-        by_date[date] += s.duration_seconds / 3600
+def _setup_heatmap(ax, compact: bool = False) -> dict:
+    im = ax.imshow(np.zeros((7, 1)), aspect='auto', cmap=HEATMAP_CMAP, interpolation='nearest')
 
-    if not by_date:
-        return None
+    ax.set_yticks(range(7))
+    ax.set_yticklabels(WEEKDAY_LABELS)
+    ax.set_xticks([])
+    ax.set_title('Study Activity Heatmap')
+    ax.grid(False)
 
-    min_date = min(by_date.keys())
-    max_date = max(by_date.keys())
+    if compact:
+        ax.figure.colorbar(im, ax=ax, label='Hours', fraction=0.046, pad=0.04)
+    else:
+        ax.figure.colorbar(im, ax=ax, label='Hours')
+    return {"image": im}
 
-    start_date = min_date - timedelta(days=min_date.weekday())
-    end_date = max_date + timedelta(days=(6 - max_date.weekday()))
 
-    weeks = []
-    current = start_date
-    while current <= end_date:
-        week = []
-        for _ in range(7):
-            week.append(by_date.get(current, 0))
-            current += timedelta(days=1)
-        weeks.append(week)
+def _update_heatmap(ax, artists: dict, aggregates: Aggregates) -> None:
+    data = aggregates.heatmap_grid() / 3600
+    im = artists["image"]
+    im.set_data(data)
+    im.set_extent((-0.5, data.shape[1] - 0.5, 6.5, -0.5))
+    im.set_clim(data.min(), data.max())
 
-    data = list(zip(*weeks))
 
-    fig, ax = plt.subplots(figsize=(14, 4))
-    im = ax.imshow(data, aspect='auto', cmap='YlGn', interpolation='nearest')
+def _setup_time_of_day(ax, compact: bool = False) -> dict:
+    bars = ax.bar(range(24), np.zeros(24), color='#06A77D', alpha=0.8, edgecolor='black', linewidth=1)
 
-    ax.set_yticks(range(7))
-    ax.set_yticklabels(['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'])
-    ax.set_xticks([])
-    ax.set_title('Study Activity Heatmap')
+    step = 4 if compact else 2
+    ax.set_xlabel('Hour of Day')
+    ax.set_ylabel('Total Hours' if compact else 'Total Hours Studied')
+    ax.set_title('Study Time by Hour of Day')
+    ax.set_xticks(range(0, 24, step))
+    ax.set_xticklabels([f'{h:02d}:00' for h in range(0, 24, step)])
+    ax.grid(True, alpha=0.3, axis='y')
+    return {"bars": bars}
 
-    plt.colorbar(im, ax=ax, label='Hours')
-    plt.tight_layout()
 
-    output = CHARTS_DIR / f"heatmap_{get_timestamp()}.png"
-    plt.savefig(output, dpi=150)
-    plt.close()
-    return output
+def _update_time_of_day(ax, artists: dict, aggregates: Aggregates) -> None:
+    for bar, seconds in zip(artists["bars"], aggregates.hourly_seconds):
+        bar.set_height(seconds / 3600)
+    ax.relim()
+    ax.autoscale_view()
 
 
-def generate_time_of_day(sessions: list[StudySession]) -> Path:
-    by_hour = defaultdict(int)
-    for s in sessions:
-        hour = s.start_time.hour
-        by_hour[hour] += s.duration_seconds / 3600
+PANELS = {
+    "time_series": (_setup_time_series, _update_time_series, (12, 6)),
+    "category_breakdown": (_setup_category_breakdown, _update_category_breakdown, (10, 6)),
+    "heatmap": (_setup_heatmap, _update_heatmap, (14, 4)),
+    "time_of_day": (_setup_time_of_day, _update_time_of_day, (12, 6)),
+}
 
-    if not by_hour:
-        return None
+CHART_KINDS = [*PANELS, "dashboard"]
 
-    hours = list(range(24))
-    values = [by_hour.get(h, 0) for h in hours]
 
-    fig, ax = plt.subplots(figsize=(12, 6))
-    bars = ax.bar(hours, values, color='#06A77D', alpha=0.8, edgecolor='black', linewidth=1)
+def _build_template(kind: str) -> ChartTemplate:
+    if kind == "dashboard":
+        fig = Figure(figsize=(20, 11))
+        FigureCanvasAgg(fig)
+        gs = GridSpec(2, 3, figure=fig, hspace=0.4, wspace=0.3)
+        slots = {
+            "time_series": gs[0, :],
+            "category_breakdown": gs[1, 0],
+            "heatmap": gs[1, 1],
+            "time_of_day": gs[1, 2],
+        }
+        template = ChartTemplate(fig)
+        for name, slot in slots.items():
+            ax = fig.add_subplot(slot)
+            setup, _, _ = PANELS[name]
+            template.panels.append((ax, setup(ax, compact=True) | {"kind": name}))
+        return template
 
-    ax.set_xlabel('Hour of Day')
-    ax.set_ylabel('Total Hours Studied')
-    ax.set_title('Study Time by Hour of Day')
-    ax.set_xticks(range(0, 24, 2))
-    ax.set_xticklabels([f'{h:02d}:00' for h in range(0, 24, 2)])
-    ax.grid(True, alpha=0.3, axis='y')
-    plt.tight_layout()
+    setup, _, figsize = PANELS[kind]
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    return ChartTemplate(fig, [(ax, setup(ax) | {"kind": kind})])
+
+
+def get_template(kind: str) -> ChartTemplate:
+    if kind not in _templates:
+        _templates[kind] = _build_template(kind)
+    return _templates[kind]
+
+
+def clear_templates() -> None:
+    _templates.clear()
 
-    output = CHARTS_DIR / f"time_of_day_{get_timestamp()}.png"
-    plt.savefig(output, dpi=150)
-    plt.close()
-    return output
 
+def render_chart(kind: str, aggregates: Aggregates, target, output_format: str = "png") -> None:
+    """Draw one chart kind from `aggregates` into a path or binary file object."""
+    template = get_template(kind)
 
-def generate_dashboard(sessions: list[StudySession]) -> Path:
-    if not sessions:
+    for ax, artists in template.panels:
+        _, update, _ = PANELS[artists["kind"]]
+        update(ax, artists, aggregates)
+
+    if not template.laid_out:
+        if kind == "dashboard":
+            renderer = template.fig.canvas.get_renderer()
+            bbox = template.fig.get_tightbbox(renderer).padded(0.1)
+            template.save_kwargs = {"bbox_inches": bbox}
+        else:
+            template.fig.tight_layout()
+        template.laid_out = True
+
+    file_format, dpi = OUTPUT_FORMATS[output_format]
+    template.fig.savefig(target, format=file_format, dpi=dpi, **template.save_kwargs)
+
+
+def generate_chart(kind: str, aggregates: Aggregates, output_format: str = "png") -> Path:
+    if aggregates.is_empty:
         return None
 
-    fig = plt.figure(figsize=(20, 11))
-    gs = GridSpec(2, 3, figure=fig, hspace=0.4, wspace=0.3)
-
-    ax_time_series = fig.add_subplot(gs[0, :])
-    ax_category = fig.add_subplot(gs[1, 0])
-    ax_heatmap = fig.add_subplot(gs[1, 1])
-    ax_time_of_day = fig.add_subplot(gs[1, 2])
-
-    by_date = defaultdict(int)
-    for s in sessions:
-        date = s.start_time.date()
-        by_date[date] += s.duration_seconds / 3600
-
-    if by_date:
-        dates = sorted(by_date.keys())
-        hours = [by_date[d] for d in dates]
-
-        ax_time_series.plot(dates, hours, marker='o', linewidth=2, markersize=6, label='Daily Hours', color='#2E86AB')
-
-        if len(dates) >= 3:
-            x_numeric = np.arange(len(dates))
-            z = np.polyfit(x_numeric, hours, 1)
-            p = np.poly1d(z)
-            ax_time_series.plot(dates, p(x_numeric), "--", linewidth=2, label='Trend', color='#C73E1D', alpha=0.7)
-
-        ax_time_series.set_xlabel('Date')
-        ax_time_series.set_ylabel('Hours')
-        ax_time_series.set_title('Study Sessions Over Time')
-        ax_time_series.grid(True, alpha=0.3)
-        ax_time_series.legend(loc='best')
-        ax_time_series.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
-        ax_time_series.tick_params(axis='x', rotation=45)
-
-    by_category = defaultdict(int)
-    for s in sessions:
-        by_category[s.category] += s.duration_seconds / 3600
-
-    if by_category:
-        categories = list(by_category.keys())
-        cat_hours = list(by_category.values())
-        total_hours = sum(cat_hours)
-
-        sorted_data = sorted(zip(categories, cat_hours), key=lambda x: x[1], reverse=True)
-        categories, cat_hours = zip(*sorted_data)
-
-        colors = ['#2E86AB', '#A23B72', '#F18F01', '#06A77D', '#C73E1D', '#6A4C93', '#E63946', '#06FFA5']
-        bar_colors = [colors[i % len(colors)] for i in range(len(categories))]
-
-        min_date = min(s.start_time.date() for s in sessions)
-        max_date = max(s.start_time.date() for s in sessions)
-        date_range = f"{min_date.strftime('%b %d')} - {max_date.strftime('%b %d, %Y')}"
-
-        bars = ax_category.bar(categories, cat_hours, color=bar_colors, alpha=0.8, edgecolor='black', linewidth=1.2)
-
-        for bar in bars:
-            height = bar.get_height()
-            percentage = (height / total_hours) * 100
-            ax_category.text(bar.get_x() + bar.get_width() / 2., height,
-                           f'({percentage:.0f}%)',
-                           ha='center', va='bottom', fontsize=8)
-
-        ax_category.set_xlabel('Category')
-        ax_category.set_ylabel('Hours')
-        ax_category.set_title(f'Study Time by Category: {date_range}')
-        ax_category.grid(True, alpha=0.3, axis='y')
-        ax_category.tick_params(axis='x', rotation=45)
-
-    by_date_heat = defaultdict(float)
-    for s in sessions:
-        date = s.start_time.date()
-        by_date_heat[date] += s.duration_seconds / 3600
-
-    if by_date_heat:
-        min_date = min(by_date_heat.keys())
-        max_date = max(by_date_heat.keys())
-
-        start_date = min_date - timedelta(days=min_date.weekday())
-        end_date = max_date + timedelta(days=(6 - max_date.weekday()))
-
-        weeks = []
-        current = start_date
-        while current <= end_date:
-            week = []
-            for _ in range(7):
-                week.append(by_date_heat.get(current, 0))
-                current += timedelta(days=1)
-            weeks.append(week)
-
-        data = list(zip(*weeks))
-
-        im = ax_heatmap.imshow(data, aspect='auto', cmap='YlGn', interpolation='nearest')
-
-        ax_heatmap.set_yticks(range(7))
-        ax_heatmap.set_yticklabels(['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'])
-        ax_heatmap.set_xticks([])
-        ax_heatmap.set_title('Study Activity Heatmap')
-        ax_heatmap.grid(False)
-
-        plt.colorbar(im, ax=ax_heatmap, label='Hours', fraction=0.046, pad=0.04)
-
-    by_hour = defaultdict(int)
-    for s in sessions:
-        hour = s.start_time.hour
-        by_hour[hour] += s.duration_seconds / 3600
-
-    if by_hour:
-        hours_day = list(range(24))
-        values = [by_hour.get(h, 0) for h in hours_day]
-
-        ax_time_of_day.bar(hours_day, values, color='#06A77D', alpha=0.8, edgecolor='black', linewidth=1)
-
-        ax_time_of_day.set_xlabel('Hour of Day')
-        ax_time_of_day.set_ylabel('Total Hours')
-        ax_time_of_day.set_title('Study Time by Hour of Day')
-        ax_time_of_day.set_xticks(range(0, 24, 4))
-        ax_time_of_day.set_xticklabels([f'{h:02d}:00' for h in range(0, 24, 4)])
-        ax_time_of_day.grid(True, alpha=0.3, axis='y')
-
-    output = CHARTS_DIR / f"dashboard_{get_timestamp()}.png"
-    plt.savefig(output, dpi=150, bbox_inches='tight')
-    plt.close()
+    file_format, _ = OUTPUT_FORMATS[output_format]
+    output = CHARTS_DIR / f"{kind}_{get_timestamp()}.{file_format}"
+    render_chart(kind, aggregates, output, output_format)
     return output
 
 
-def generate_all_charts(sessions: list[StudySession], dashboard_only: bool = False) -> list[Path]:
+def generate_time_series(aggregates: Aggregates, output_format: str = "png") -> Path:
+    return generate_chart("time_series", aggregates, output_format)
+
+
+def generate_category_breakdown(aggregates: Aggregates, output_format: str = "png") -> Path:
+    return generate_chart("category_breakdown", aggregates, output_format)
+
+
+def generate_heatmap(aggregates: Aggregates, output_format: str = "png") -> Path:
+    return generate_chart("heatmap", aggregates, output_format)
+
+
+def generate_time_of_day(aggregates: Aggregates, output_format: str = "png") -> Path:
+    return generate_chart("time_of_day", aggregates, output_format)
+
+
+def generate_dashboard(aggregates: Aggregates, output_format: str = "png") -> Path:
+    return generate_chart("dashboard", aggregates, output_format)
+
+
+def generate_all_charts(
+    aggregates: Aggregates, dashboard_only: bool = False, output_format: str = "png"
+) -> list[Path]:
     charts = []
 
     if dashboard_only:
-        chart = generate_dashboard(sessions)
+        chart = generate_dashboard(aggregates, output_format)
         if chart:
             charts.append(chart)
     else:
-        chart = generate_time_series(sessions)
+        chart = generate_time_series(aggregates, output_format)
         if chart:
             charts.append(chart)
 
-        chart = generate_category_breakdown(sessions)
+        chart = generate_category_breakdown(aggregates, output_format)
         if chart:
             charts.append(chart)
 
-        chart = generate_heatmap(sessions)
+        chart = generate_heatmap(aggregates, output_format)
         if chart:
             charts.append(chart)
 
-        chart = generate_time_of_day(sessions)
+        chart = generate_time_of_day(aggregates, output_format)
         if chart:
             charts.append(chart)
 
@@ -0,0 +1,180 @@
+"""Online backups of the database and its archives.
+
+Each database is copied with SQLite's backup API a few pages at a time,
+pausing between steps, so a running timer can still write while a large
+database is copied. The copies are bundled into one compressed tarball
+per backup, named by time, so a restore brings back the main database
+and the archives as they were at the same moment.
+"""
+import os
+import shutil
+import sqlite3
+import tarfile
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+import paths
+
+DB_PATH = Path(paths.DB_PATH)
+ARCHIVE_DIR = Path(paths.ARCHIVE_DIR)
+BACKUP_DIR = Path(paths.DATA_DIR) / "backups"
+
+DB_NAME = "cybersyn.db"
+# Pages copied per step; 256 pages is 1 MB at the default page size
+STEP_PAGES = 256
+STEP_PAUSE = 0.01
+DEFAULT_KEEP = 10
+
+
+def _copy(source: Path, target: Path, pages: int = STEP_PAGES) -> None:
+    """Copy a live database with the backup API, releasing its lock between steps."""
+    src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst, pages=pages, progress=lambda status, remaining, total: time.sleep(STEP_PAUSE))
+    finally:
+        dst.close()
+        src.close()
+
+
+def _verify(path: Path) -> None:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        problems = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+        if problems != ["ok"]:
+            raise ValueError(f"{path.name} failed the integrity check: {'; '.join(problems[:5])}")
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sessions'").fetchone():
+            raise ValueError(f"{path.name} has no sessions table")
+    except sqlite3.DatabaseError as e:
+        raise ValueError(f"{path.name} is not a readable database: {e}") from e
+    finally:
+        conn.close()
+
+
+def _last_change(conn: sqlite3.Connection) -> int:
+    """The last change-log position handed out, counting entries dropped since."""
+    last = 0
+    for sql in (
+        "SELECT max(seq) FROM session_changes",
+        "SELECT seq FROM sqlite_sequence WHERE name = 'session_changes'",
+    ):
+        try:
+            row = conn.execute(sql).fetchone()
+        except sqlite3.OperationalError:
+            # From before the change log, or its AUTOINCREMENT, existed
+            continue
+        if row and row[0] is not None:
+            last = max(last, row[0])
+    return last
+
+
+def list_backups() -> list[Path]:
+    """Backups in BACKUP_DIR, oldest first."""
+    return sorted(BACKUP_DIR.glob("cybersyn-*.tar.gz"), key=lambda path: (path.stat().st_mtime_ns, path.name))
+
+
+def prune_backups(keep: int) -> list[Path]:
+    """Delete all but the newest `keep` backups; returns the deleted paths."""
+    backups = list_backups()
+    removed = backups[:max(0, len(backups) - keep)]
+    for path in removed:
+        path.unlink()
+    return removed
+
+
+def create_backup(keep: int = DEFAULT_KEEP, pages: int = STEP_PAGES) -> Path:
+    """Write a compressed backup of the database and archives, then apply retention."""
+    if not DB_PATH.exists():
+        raise ValueError(f"No database at {DB_PATH}")
+
+    BACKUP_DIR.mkdir(parents=True, exist_ok=True)
+    name = f"cybersyn-{datetime.now():%Y%m%d-%H%M%S}"
+    output = BACKUP_DIR / f"{name}.tar.gz"
+    suffix = 1
+    while output.exists():
+        suffix += 1
+        output = BACKUP_DIR / f"{name}-{suffix}.tar.gz"
+
+    with tempfile.TemporaryDirectory(dir=BACKUP_DIR) as tmp:
+        tmp = Path(tmp)
+        members = [(DB_PATH, DB_NAME)] + [
+            (path, f"archive/{path.name}") for path in sorted(ARCHIVE_DIR.glob("*.db"))
+        ]
+        partial = tmp / output.name
+        with tarfile.open(partial, "w:gz") as tar:
+            for source, arcname in members:
+                copy = tmp / source.name
+                _copy(source, copy, pages)
+                tar.add(copy, arcname=arcname)
+                copy.unlink()
+        os.replace(partial, output)
+
+    prune_backups(keep)
+    return output
+
+
+def read_backup(path: Path, directory: Path) -> list[str]:
+    """Unpack a backup into `directory` and check every database in it.
+
+    Returns the member names; raises ValueError if the backup is unusable.
+    """
+    try:
+        with tarfile.open(path, "r:gz") as tar:
+            names = [m.name for m in tar.getmembers()]
+            valid = {DB_NAME} | {n for n in names if n.startswith("archive/") and n.endswith(".db") and n.count("/") == 1}
+            if DB_NAME not in names or set(names) - valid:
+                raise ValueError(f"{path.name} is not a cybersyn backup")
+            tar.extractall(directory, filter="data")
+    except (tarfile.TarError, OSError, EOFError) as e:
+        raise ValueError(f"Cannot read {path.name}: {e}") from e
+
+    for name in names:
+        _verify(directory / name)
+    return names
+
+
+def restore_backup(path: Path, pages: int = STEP_PAGES) -> Path:
+    """Replace the database and archives with the contents of a backup.
+
+    The backup is unpacked and checked before anything is touched, and
+    the current data is backed up first; returns that safety backup. The
+    main database is overwritten through the backup API rather than by
+    renaming files, so SQLite's locking and journal stay consistent for
+    any process that has it open.
+    """
+    BACKUP_DIR.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=BACKUP_DIR) as tmp:
+        tmp = Path(tmp)
+        names = read_backup(path, tmp)
+        safety = create_backup(keep=len(list_backups()) + 1, pages=pages)
+
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            replaced_change = _last_change(conn)
+        finally:
+            conn.close()
+        _copy(tmp / DB_NAME, DB_PATH, pages)
+
+        ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+        restored = {Path(name).name for name in names if name != DB_NAME}
+        for stale in ARCHIVE_DIR.glob("*.db"):
+            if stale.name not in restored:
+                stale.unlink()
+        for name in restored:
+            shutil.move(tmp / "archive" / name, ARCHIVE_DIR / name)
+
+    # Cached aggregates describe the data that was just replaced. The backup's
+    # log usually stops short of the one it replaced, so the reset goes after
+    # both and positions that consumers remember are never handed out again.
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        with conn:
+            seq = max(replaced_change, _last_change(conn)) + 1
+            conn.execute("INSERT INTO session_changes (seq, session_id, op) VALUES (?, 0, 'reset')", (seq,))
+    except sqlite3.OperationalError:
+        # Backup from before the change log existed; migrations add it
+        pass
+    finally:
+        conn.close()
+    return safety
@@ -0,0 +1,95 @@
+"""Run `doctor` over sessions from timers that ran side by side.
+
+    uv run check_doctor.py
+
+Two named timers are started, paused and stopped on a fake clock with
+their sessions overlapping, as happens whenever several timers run at
+once. `doctor` must find nothing while they run and after they stop.
+A manual session added on top of them is then reported as an overlap,
+`--fix` moves it, and the next check comes back clean. Everything is
+written to a temporary data directory.
+"""
+import tempfile
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+import typer
+import paths
+
+
+def use_data_dir(tmp: str) -> None:
+    """Point every module that keeps data at `tmp`; runs before any of them is imported."""
+    paths.DATA_DIR = tmp
+    paths.DB_PATH = str(Path(tmp) / "cybersyn.db")
+    paths.ARCHIVE_DIR = str(Path(tmp) / "archive")
+    paths.AGGREGATES_FILE = str(Path(tmp) / "aggregates.npz")
+    import config
+    import state
+
+    config.CONFIG_FILE = Path(tmp) / "config.json"
+    state.STATE_FILE = Path(tmp) / "state.json"
+    state.LOCK_FILE = Path(tmp) / "state.lock"
+
+
+def _overlaps(checkup) -> list:
+    return [issue for issue in checkup.issues if issue.kind == "overlap"]
+
+
+def check_concurrent_timers() -> None:
+    from clock import FakeClock
+    from database import save_session
+    from doctor import apply_fixes, run_checks
+    from models import StudySession
+    from timer import pause_session, resume_session, start_session, stop_session
+
+    # Yesterday morning, so the manual session can move later within its day
+    clock = FakeClock(datetime.combine(date.today() - timedelta(days=1), time(9)))
+    start_session("Lecture recording", "Physics", 3, timer_id="lecture", clock=clock)
+    clock.advance(600)
+    start_session("Problem set", "Math", 3, timer_id="problems", clock=clock)
+    clock.advance(900)
+    pause_session("lecture", clock=clock)
+    clock.advance(300)
+    resume_session("lecture", clock=clock)
+    clock.advance(600)
+
+    checkup = run_checks(now=int(clock.now().timestamp()))
+    assert checkup.checked == 2, f"two sessions checked, got {checkup.checked}"
+    assert not checkup.issues, f"running timers reported: {checkup.issues}"
+
+    lecture = stop_session("lecture", clock=clock)
+    clock.advance(1200)
+    stop_session("problems", clock=clock)
+    checkup = run_checks(now=int(clock.now().timestamp()))
+    assert not checkup.issues, f"concurrent timer sessions reported: {checkup.issues}"
+
+    # A manual entry inside the lecture overlaps both timed sessions
+    manual_start = lecture.start_time + timedelta(minutes=5)
+    save_session(StudySession(
+        task="Reading",
+        category="Physics",
+        start_time=manual_start,
+        end_time=manual_start + timedelta(minutes=20),
+        duration_seconds=1200,
+        mode="manual",
+        school_week=3,
+    ))
+    checkup = run_checks(now=int(clock.now().timestamp()))
+    overlaps = _overlaps(checkup)
+    assert len(overlaps) == 1 and overlaps[0].fixable, f"manual overlap reported once and fixable: {overlaps}"
+    assert len(checkup.issues) == 1, f"only the manual overlap reported: {checkup.issues}"
+
+    apply_fixes(checkup)
+    checkup = run_checks(now=int(clock.now().timestamp()))
+    assert not checkup.issues, f"issues left after --fix: {checkup.issues}"
+
+
+def main():
+    """Check that doctor accepts sessions from concurrent timers"""
+    with tempfile.TemporaryDirectory() as tmp:
+        use_data_dir(tmp)
+        check_concurrent_timers()
+        typer.echo("concurrent timers: ok")
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,149 @@
+"""Deliver queued hook events to a local HTTP server and check what arrives.
+
+    uv run check_hooks.py
+
+A stand-in collector runs on 127.0.0.1 with `http.server` and records
+every POST. The queue lives in a temporary directory, events are added
+to it directly (so no background worker is started), and `deliver_due`
+is called with explicit times, so backoff is checked without waiting.
+Covers a successful delivery, retries with backoff while the collector
+fails, and splitting a long queue into batches.
+"""
+import json
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import typer
+import hooks
+from config import Hook
+
+
+class Collector(ThreadingHTTPServer):
+    """Counts POSTs and records the events of those it accepts; answers with `status`."""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), CollectorHandler)
+        self.status = 200
+        self.requests = 0
+        self.batches: list[list[dict]] = []
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/events"
+
+
+class CollectorHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests += 1
+        if self.server.status == 200:
+            self.server.batches.append(body["events"])
+        self.send_response(self.server.status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _queue(count: int, name: str = "session.stopped") -> list[int]:
+    conn = hooks._connect()
+    try:
+        return [
+            conn.execute(
+                "INSERT INTO events (created_at, name, data) VALUES (?, ?, ?)",
+                (time.time(), name, json.dumps({"n": i})),
+            ).lastrowid
+            for i in range(count)
+        ]
+    finally:
+        conn.close()
+
+
+def _cursor(hook: Hook) -> tuple[int, int, float, str | None]:
+    conn = hooks._connect()
+    try:
+        return conn.execute(
+            "SELECT last_id, attempts, next_attempt, last_error FROM cursors WHERE hook = ?", (hook.key,)
+        ).fetchone()
+    finally:
+        conn.close()
+
+
+def _queued() -> int:
+    conn = hooks._connect()
+    try:
+        return conn.execute("SELECT count(*) FROM events").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def check_success(collector: Collector, hook: Hook) -> None:
+    ids = _queue(3)
+    assert hooks.deliver_due([hook], now=time.time()) == 3, "three events delivered"
+    assert len(collector.batches) == 1, f"one POST, got {len(collector.batches)}"
+    assert [event["id"] for event in collector.batches[0]] == ids, "events arrive in order"
+    assert [event["data"]["n"] for event in collector.batches[0]] == [0, 1, 2], "payloads arrive intact"
+    assert _cursor(hook)[:2] == (ids[-1], 0), "cursor moves past the batch"
+    assert _queued() == 0, "delivered events are pruned"
+
+
+def check_backoff(collector: Collector, hook: Hook) -> None:
+    ids = _queue(2)
+    now = time.time()
+    collector.status = 503
+    for attempt in range(1, 4):
+        assert hooks.deliver_due([hook], now=now) == 0, "nothing delivered while the collector fails"
+        last_id, attempts, next_attempt, error = _cursor(hook)
+        expected = hooks.BACKOFF_BASE * 2 ** (attempt - 1)
+        assert attempts == attempt, f"attempt {attempt} counted, got {attempts}"
+        delay = next_attempt - now
+        assert 0.9 * expected <= delay <= 1.1 * expected, f"retry {delay:.1f}s after failure {attempt}"
+        assert error == "HTTP 503", f"error recorded, got {error!r}"
+        assert last_id == ids[0] - 1, "cursor stays put"
+        requests = collector.requests
+        assert hooks.deliver_due([hook], now=now + 0.5 * expected) == 0
+        assert collector.requests == requests, "no request before the retry is due"
+        now = next_attempt
+
+    collector.status = 200
+    sent = len(collector.batches)
+    assert hooks.deliver_due([hook], now=now) == 2, "queued events delivered once the collector is back"
+    assert [event["id"] for event in collector.batches[sent]] == ids, "missed events arrive in order"
+    assert _cursor(hook)[1:] == (0, 0, None), "backoff cleared after a success"
+    assert _queued() == 0
+
+
+def check_batching(collector: Collector, hook: Hook) -> None:
+    count = 2 * hooks.BATCH_SIZE + hooks.BATCH_SIZE // 2
+    ids = _queue(count)
+    sent = len(collector.batches)
+    assert hooks.deliver_due([hook], now=time.time()) == count, f"{count} events delivered"
+    batches = collector.batches[sent:]
+    sizes = [len(batch) for batch in batches]
+    assert sizes == [hooks.BATCH_SIZE, hooks.BATCH_SIZE, hooks.BATCH_SIZE // 2], f"batch sizes {sizes}"
+    assert [event["id"] for batch in batches for event in batch] == ids, "batches cover the queue in order"
+    assert _queued() == 0
+
+
+def main():
+    """Check hook delivery against a stand-in HTTP collector"""
+    collector = Collector()
+    threading.Thread(target=collector.serve_forever, daemon=True).start()
+    hook = Hook(url=collector.url)
+    with tempfile.TemporaryDirectory() as tmp:
+        hooks.DATA_DIR = Path(tmp)
+        hooks.QUEUE_PATH = hooks.DATA_DIR / "hooks.db"
+        hooks.LOCK_FILE = hooks.DATA_DIR / "hooks.lock"
+        try:
+            for check in (check_success, check_backoff, check_batching):
+                check(collector, hook)
+                typer.echo(f"{check.__name__[len('check_'):]}: ok")
+        finally:
+            collector.shutdown()
+
+
+if __name__ == "__main__":
+    typer.run(main)
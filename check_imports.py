@@ -0,0 +1,91 @@
+"""Check that the terminal charts and totals never import SQLAlchemy.
+
+    uv run check_imports.py
+
+A temporary data directory is filled with a few hundred sessions, then
+`stats`, `stats --plot`, `stats --detailed` and `dashboard --tty` each
+run in a fresh interpreter with `-X importtime`, once reading the
+database and once reading a snapshot. Those commands read through
+sqlite3 and NumPy only, so any `sqlalchemy` module in the import log
+fails the check. Wall-clock times are printed for comparison.
+"""
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+import typer
+from check_doctor import use_data_dir
+
+COMMANDS = [
+    ["stats"],
+    ["stats", "--plot"],
+    ["stats", "--detailed"],
+    ["dashboard", "--tty"],
+]
+
+# Runs in the child: redirect the data directory before cli is imported
+CHILD = (
+    "import sys; from check_doctor import use_data_dir; use_data_dir(sys.argv[1]); "
+    "sys.argv = ['cybersyn', *sys.argv[2:]]; from cli import app; app(prog_name='cybersyn')"
+)
+
+
+def _fill(sessions: int) -> None:
+    from database import save_session
+    from models import StudySession
+
+    rng = random.Random(1)
+    start = datetime.now().replace(minute=0, second=0, microsecond=0) - timedelta(days=120)
+    for _ in range(sessions):
+        start += timedelta(minutes=rng.randint(30, 600))
+        duration = rng.randint(10, 90) * 60
+        save_session(StudySession(
+            task=rng.choice(["Reading", "Problem set", "Lecture notes", "Flashcards"]),
+            category=rng.choice(["Math", "Physics", "History"]),
+            start_time=start,
+            end_time=start + timedelta(seconds=duration),
+            duration_seconds=duration,
+            mode=rng.choice(["manual", "timer", "pomodoro"]),
+            school_week=rng.randint(1, 15),
+        ))
+
+
+def _run(tmp: str, args: list[str]) -> tuple[float, list[str]]:
+    """Run one command; return its wall time and the modules it imported."""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD, tmp, *args],
+        cwd=Path(__file__).parent,
+        capture_output=True,
+        text=True,
+    )
+    seconds = time.perf_counter() - started
+    assert result.returncode == 0, f"{' '.join(args)} failed:\n{result.stderr[-2000:]}"
+    modules = [
+        line.rsplit("|", 1)[1].strip()
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:") and "|" in line
+    ]
+    return seconds, modules
+
+
+def main(sessions: int = typer.Option(500, help="Sessions to add before running the commands")):
+    """Check that terminal stats and charts run without importing SQLAlchemy"""
+    with tempfile.TemporaryDirectory() as tmp:
+        use_data_dir(tmp)
+        _fill(sessions)
+        for source in ("database", "snapshot"):
+            if source == "snapshot":
+                _run(tmp, ["snapshot"])
+            for args in COMMANDS:
+                seconds, modules = _run(tmp, args)
+                loaded = sorted({name for name in modules if name.split(".")[0] == "sqlalchemy"})
+                assert not loaded, f"{' '.join(args)} imported {', '.join(loaded[:5])}"
+                typer.echo(f"{' '.join(args)} ({source}): {seconds:.2f}s, {len(modules)} modules: ok")
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -1,18 +1,16 @@
+import completion
+
+# Tab completion of tasks and categories is answered from the vocabulary
+# cache before anything below is imported
+completion.serve_if_requested()
+
+import sys
 import typer
-import time
 import subprocess
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import List, Optional
 from pathlib import Path
-from timer import (
-    start_session,
-    pause_session,
-    resume_session,
-    stop_session,
-    get_current_status,
-)
-from database import get_session, get_all_sessions, delete_session, save_session
-from models import StudySession
+from models import StudySession, SessionFilter
 from notify import (
     notify_session_started,
     notify_session_paused,
@@ -20,74 +18,169 @@ from notify import (
     notify_session_stopped,
     notify_pomodoro_work_end,
     notify_pomodoro_break_end,
+    notify_goal_reached,
 )
-from pomodoro import get_phase_remaining, should_transition, transition_phase
-from state import save_state
-from stats import get_total_time, get_time_by_category, get_sessions_last_n_days, get_session_count
-from analytics import generate_all_charts
+from stats import WEEKDAY_NAMES, format_duration
 from config import load_config, save_config
+from clock import SYSTEM_CLOCK
+
+
+def maintain_if_due(result, **kwargs) -> None:
+    """After any command, run `maintain` once the configured number of writes is reached."""
+    every = load_config().maintain_every
+    if every <= 0:
+        return
+    from maintain import run_if_due
+
+    try:
+        report = run_if_due(every)
+    except Exception as e:
+        # The command itself succeeded; a busy or unreadable database can wait for next time
+        typer.echo(f"Automatic maintenance skipped: {e}", err=True)
+        return
+    if report:
+        freed = report.before.size - report.after.size
+        typer.echo(f"Database maintained ({freed / 1024:.0f} KB reclaimed)", err=True)
+
+
+# Commands import the database, timer and aggregate modules themselves, so
+# --help and completion do not pay for SQLAlchemy, NumPy or opening the
+# database
+
+app = typer.Typer(help="Cybersyn - Study tracker and timer", result_callback=maintain_if_due)
+category_app = typer.Typer(help="List and merge categories")
+app.add_typer(category_app, name="category")
+goal_app = typer.Typer(help="Set and track per-category study goals")
+app.add_typer(goal_app, name="goal")
+hook_app = typer.Typer(help="Send session events to commands and webhooks")
+app.add_typer(hook_app, name="hook")
+sync_app = typer.Typer(help="Exchange session changes with other installs through changeset files")
+app.add_typer(sync_app, name="sync")
+
+# Filter options shared by every command that reads sessions
+SINCE_OPTION = typer.Option(None, "--since", help="Only sessions on or after this date (YYYY-MM-DD)")
+UNTIL_OPTION = typer.Option(None, "--until", help="Only sessions on or before this date (YYYY-MM-DD)")
+CATEGORY_FILTER_OPTION = typer.Option(
+    None, "--category", "-c", help="Only sessions in this category", autocompletion=completion.complete_category
+)
+MODE_FILTER_OPTION = typer.Option(None, "--mode", "-m", help="Only sessions with this mode")
+WEEK_FILTER_OPTION = typer.Option(None, "--week", "-w", help="Only sessions in this school week")
+TIMER_ID_OPTION = typer.Option(None, "--id", help="Timer to act on; needed when several are running")
+
+
+def parse_date(value: str, option: str) -> datetime:
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        typer.echo(f"Error: {option} must be in YYYY-MM-DD format", err=True)
+        raise typer.Exit(1)
+
+
+def build_filter(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    category: Optional[str] = None,
+    mode: Optional[str] = None,
+    week: Optional[int] = None,
+) -> SessionFilter:
+    return SessionFilter(
+        since=parse_date(since, "--since") if since else None,
+        # --until is inclusive of the whole day
+        until=parse_date(until, "--until") + timedelta(days=1) if until else None,
+        category=category,
+        mode=mode,
+        school_week=week,
+    )
+
 
-app = typer.Typer(help="Cybersyn - Study tracker and timer")
+def announce_goals(before: list) -> None:
+    """Notify about goals reached since `before` was read."""
+    from goals import get_goal_progress, newly_reached
 
-def format_duration(seconds: int) -> str:
-    hours = seconds // 3600
-    minutes = (seconds % 3600) // 60
-    secs = seconds % 60
-    if hours > 0:
-        return f"{hours}h {minutes}m"
-    if minutes > 0:
-        return f"{minutes}m {secs}s"
-    return f"{secs}s"
+    after = get_goal_progress(load_config().goals, datetime.now().date())
+    for goal in newly_reached(before, after):
+        notify_goal_reached(goal.category, goal.hours, goal.period)
+        typer.echo(f"Goal reached: {goal.category} {goal.hours:g}h this {goal.period}")
+
+
+def print_goals(progress: list) -> None:
+    from goals import progress_bar
+
+    for p in progress:
+        target = f"{format_duration(p.seconds)} / {p.goal.hours:g}h per {p.goal.period}"
+        mark = "  done" if p.reached else ""
+        typer.echo(f"  {p.goal.category[:20]:<20} {progress_bar(p)} {target}{mark}")
 
 
 @app.command()
 def start(
-    task: str,
-    category: str = typer.Option(..., "--category", "-c", help="Study category/class"),
+    task: str = typer.Argument(..., autocompletion=completion.complete_task),
+    category: str = typer.Option(
+        ..., "--category", "-c", help="Study category/class", autocompletion=completion.complete_category
+    ),
     week: int = typer.Option(..., "--week", "-w", help="School week number"),
     pomodoro: bool = typer.Option(False, "--pomodoro", "-p", help="Use pomodoro mode"),
+    timer_id: Optional[str] = typer.Option(
+        None, "--id", help="Name for this timer, to run several at once (defaults to the session id)"
+    ),
 ):
     """Start a new study session"""
+    from timer import start_session, get_current_status
+    from pomodoro import get_current_phase, get_phase_remaining, emit_phase
+    from daemon import daemon_running
+
     try:
         mode = "pomodoro" if pomodoro else "stopwatch"
-        session = start_session(task, category, week, mode)
+        timer_id, session = start_session(task, category, week, mode, timer_id)
+        completion.record_use(task, category)
         notify_session_started(task, mode)
         typer.echo(f"Started {mode} session: {task}")
-        typer.echo(f"Category: {category} | Week: {week}")
+        typer.echo(f"Category: {category} | Week: {week} | Timer: {timer_id}")
         typer.echo("\nTimer running... (Ctrl+C to detach)")
 
+        cfg = load_config().pomodoro
+        last_phase = None
+
         try:
             while True:
-                result = get_current_status()
+                result = get_current_status(timer_id)
                 if not result:
                     break
                 state, elapsed = result
 
                 if mode == "pomodoro":
-                    if should_transition(state):
-                        state, next_phase = transition_phase(state)
-                        save_state(state)
-
-                        if next_phase == "work":
-                            notify_pomodoro_break_end()
-                            typer.echo(f"\n\nBreak over! Starting work session {state.pomodoro_cycle + 1}")
-                        elif next_phase == "short_break":
-                            notify_pomodoro_work_end()
+                    phase = get_current_phase(state, cfg)
+
+                    if last_phase is not None and phase.index != last_phase.index:
+                        # A running daemon sends the notifications for every timer
+                        notify = not daemon_running()
+                        if notify:
+                            emit_phase(timer_id, state, phase)
+                        if phase.name == "work":
+                            if notify:
+                                notify_pomodoro_break_end()
+                            typer.echo(f"\n\nBreak over! Starting work session {phase.cycle + 1}")
+                        elif phase.name == "short_break":
+                            if notify:
+                                notify_pomodoro_work_end()
                             typer.echo("\n\nWork session complete! Time for a short break.")
-                        elif next_phase == "long_break":
-                            notify_pomodoro_work_end()
+                        elif phase.name == "long_break":
+                            if notify:
+                                notify_pomodoro_work_end()
                             typer.echo("\n\nWork session complete! Time for a long break.")
+                    last_phase = phase
 
-                    remaining = get_phase_remaining(state)
-                    phase_display = state.pomodoro_phase.replace("_", " ").title()
+                    remaining = get_phase_remaining(state, cfg)
+                    phase_display = phase.name.replace("_", " ").title()
                     typer.echo(f"\r⏱  {phase_display}: {format_duration(remaining)} | Total: {format_duration(elapsed)}", nl=False)
                 else:
                     typer.echo(f"\r⏱  {format_duration(elapsed)}", nl=False)
 
-                time.sleep(1)
+                SYSTEM_CLOCK.sleep(1)
         except KeyboardInterrupt:
             typer.echo("\n\nTimer detached. Session still running in background.")
             typer.echo("Use 'cybersyn status' to check, 'cybersyn pause' to pause, or 'cybersyn stop' to end.")
+            typer.echo(f"Add '--id {timer_id}' to pick this timer while others are running.")
 
     except RuntimeError as e:
         typer.echo(f"Error: {e}", err=True)
@@ -95,10 +188,12 @@ def start(
 
 
 @app.command()
-def pause():
+def pause(timer_id: Optional[str] = TIMER_ID_OPTION):
     """Pause the current timer"""
+    from timer import pause_session
+
     try:
-        session_id, elapsed = pause_session()
+        session_id, elapsed = pause_session(timer_id)
         duration_str = format_duration(elapsed)
         notify_session_paused(duration_str)
         typer.echo(f"Timer paused at {duration_str}")
@@ -109,10 +204,12 @@ def pause():
 
 
 @app.command()
-def resume():
+def resume(timer_id: Optional[str] = TIMER_ID_OPTION):
     """Resume the paused timer"""
+    from timer import resume_session
+
     try:
-        session_id, elapsed = resume_session()
+        session_id, elapsed = resume_session(timer_id)
         notify_session_resumed()
         typer.echo(f"Timer resumed from {format_duration(elapsed)}")
     except RuntimeError as e:
@@ -121,16 +218,21 @@ def resume():
 
 
 @app.command()
-def stop():
+def stop(timer_id: Optional[str] = TIMER_ID_OPTION):
     """Stop the current session"""
+    from timer import stop_session
+    from goals import get_goal_progress
+
     try:
-        session = stop_session()
+        before = get_goal_progress(load_config().goals, datetime.now().date())
+        session = stop_session(timer_id)
         duration_str = format_duration(session.duration_seconds)
         notify_session_stopped(session.task, duration_str)
         typer.echo(f"Session stopped: {session.task}")
         typer.echo(f"Total time: {duration_str}")
         if session.paused_seconds > 0:
             typer.echo(f"Paused time: {format_duration(session.paused_seconds)}")
+        announce_goals(before)
     except RuntimeError as e:
         typer.echo(f"Error: {e}", err=True)
         raise typer.Exit(1)
@@ -138,47 +240,123 @@ def stop():
 
 @app.command()
 def status():
-    """Show current timer status"""
-    result = get_current_status()
-    if not result:
+    """Show the status of every running timer"""
+    from timer import get_running_timers
+    from database import get_session
+    from pomodoro import get_current_phase, get_phase_remaining
+    from goals import get_goal_progress
+
+    timers = get_running_timers()
+    cfg = load_config()
+    if not timers:
         typer.echo("No active session")
-        return
 
-    state, elapsed = result
-    session = get_session(state.session_id)
+    live = {}
+    for i, (timer_id, state, elapsed) in enumerate(timers):
+        session = get_session(state.session_id)
+        if i:
+            typer.echo("")
+        if len(timers) > 1:
+            typer.echo(f"Timer: {timer_id}")
+
+        if not session:
+            typer.echo("Error: Session not found")
+            continue
+
+        typer.echo(f"Task: {session.task}")
+        typer.echo(f"Category: {session.category} | Week: {session.school_week}")
+        typer.echo(f"Mode: {session.mode}")
+
+        if session.mode == "pomodoro":
+            phase = get_current_phase(state, cfg.pomodoro)
+            remaining = get_phase_remaining(state, cfg.pomodoro)
+            phase_display = phase.name.replace("_", " ").title()
+            typer.echo(f"Phase: {phase_display} ({format_duration(remaining)} remaining)")
+            typer.echo(f"Cycle: {phase.cycle + 1}")
+
+        live[session.category] = live.get(session.category, 0) + int(elapsed)
+        typer.echo(f"Elapsed: {format_duration(elapsed)}")
+        if state.is_paused:
+            typer.echo("Status: PAUSED")
+        else:
+            typer.echo("Status: RUNNING")
+
+    if cfg.goals:
+        typer.echo("")
+        typer.echo("Goals:")
+        print_goals(get_goal_progress(cfg.goals, datetime.now().date(), live))
 
-    if not session:
-        typer.echo("Error: Session not found")
-        return
 
-    typer.echo(f"Task: {session.task}")
-    typer.echo(f"Category: {session.category} | Week: {session.school_week}")
-    typer.echo(f"Mode: {session.mode}")
+@app.command()
+def daemon():
+    """Send pomodoro notifications for all running timers from one background loop"""
+    from daemon import run_daemon
 
-    if session.mode == "pomodoro" and state.pomodoro_phase:
-        remaining = get_phase_remaining(state)
-        phase_display = state.pomodoro_phase.replace("_", " ").title()
-        typer.echo(f"Phase: {phase_display} ({format_duration(remaining)} remaining)")
-        typer.echo(f"Cycle: {state.pomodoro_cycle + 1}")
+    def report(timer_id, task, phase):
+        phase_display = phase.name.replace("_", " ").title()
+        typer.echo(f"{datetime.now():%H:%M:%S}  {timer_id} ({task}): {phase_display}")
 
-    typer.echo(f"Elapsed: {format_duration(elapsed)}")
-    if state.is_paused:
-        typer.echo("Status: PAUSED")
-    else:
-        typer.echo("Status: RUNNING")
+    typer.echo("Serving pomodoro notifications (Ctrl+C to stop)")
+    try:
+        run_daemon(on_phase=report)
+    except KeyboardInterrupt:
+        typer.echo("\nStopped")
 
 
 @app.command()
-def list(limit: int = typer.Option(10, "--limit", "-n", help="Number of sessions to show")):
+def serve(
+    port: int = typer.Option(8765, "--port", "-p", help="Port on 127.0.0.1"),
+    socket_path: Optional[Path] = typer.Option(None, "--socket", help="Listen on this Unix socket instead"),
+    verbose: bool = typer.Option(False, "--verbose", "-v", help="Log every request"),
+):
+    """Serve status, stats and charts as JSON and images on a local HTTP endpoint"""
+    from server import make_server
+
+    try:
+        server = make_server(port, socket_path, quiet=not verbose)
+    except OSError as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+
+    where = f"unix:{socket_path}" if socket_path else f"http://127.0.0.1:{port}"
+    typer.echo(f"Serving /status, /stats and /charts/<kind> on {where} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        typer.echo("\nStopped")
+    finally:
+        server.server_close()
+        if socket_path and socket_path.is_socket():
+            socket_path.unlink()
+
+
+@app.command()
+def watch():
+    """Full-screen live view of the timer and today's totals"""
+    from watch import run_watch
+
+    run_watch()
+
+
+@app.command()
+def list(
+    limit: int = typer.Option(10, "--limit", "-n", help="Number of sessions to show"),
+    since: Optional[str] = SINCE_OPTION,
+    until: Optional[str] = UNTIL_OPTION,
+    category: Optional[str] = CATEGORY_FILTER_OPTION,
+    mode: Optional[str] = MODE_FILTER_OPTION,
+    week: Optional[int] = WEEK_FILTER_OPTION,
+):
     """List recent study sessions"""
-    sessions = get_all_sessions()
+    from database import get_sessions
+
+    session_filter = build_filter(since, until, category, mode, week)
+    sessions = get_sessions(session_filter, limit=limit)
 
     if not sessions:
         typer.echo("No sessions found")
         return
 
-    sessions = sessions[:limit]
-
     typer.echo(f"\nShowing last {len(sessions)} sessions:\n")
     typer.echo(f"{'ID':<5} {'Date':<12} {'Task':<30} {'Category':<15} {'Duration':<10} {'Mode':<10}")
     typer.echo("-" * 90)
@@ -191,12 +369,63 @@ def list(limit: int = typer.Option(10, "--limit", "-n", help="Number of sessions
         typer.echo(f"{s.id:<5} {date_str:<12} {task_str:<30} {category_str:<15} {duration_str:<10} {s.mode:<10}")
 
 
+@app.command()
+def search(
+    query: Optional[str] = typer.Argument(None, help='Words to find in task or category; "a phrase", prefix*, OR, NOT'),
+    limit: int = typer.Option(20, "--limit", "-n", help="Results per page"),
+    page: int = typer.Option(1, "--page", "-p", min=1, help="Page of results to show"),
+    rebuild: bool = typer.Option(False, "--rebuild", help="Rebuild the search index from all sessions"),
+    since: Optional[str] = SINCE_OPTION,
+    until: Optional[str] = UNTIL_OPTION,
+    category: Optional[str] = CATEGORY_FILTER_OPTION,
+    mode: Optional[str] = MODE_FILTER_OPTION,
+    week: Optional[int] = WEEK_FILTER_OPTION,
+):
+    """Full-text search over session tasks and categories"""
+    from sqlalchemy.exc import OperationalError
+    from database import search_sessions, rebuild_search_index
+
+    if rebuild:
+        count = rebuild_search_index()
+        typer.echo(f"Search index rebuilt ({count} sessions)")
+    if not query:
+        if not rebuild:
+            typer.echo("Error: QUERY is required unless --rebuild is given", err=True)
+            raise typer.Exit(1)
+        return
+
+    session_filter = build_filter(since, until, category, mode, week)
+    try:
+        total, sessions = search_sessions(query, session_filter, limit=limit, offset=(page - 1) * limit)
+    except OperationalError as e:
+        typer.echo(f"Error: invalid search query: {e.orig}", err=True)
+        raise typer.Exit(1)
+
+    if not sessions:
+        typer.echo("No matching sessions" if not total else f"No results on page {page} ({total} matches)")
+        return
+
+    pages = (total + limit - 1) // limit
+    typer.echo(f"\n{total} matching sessions (page {page} of {pages}):\n")
+    typer.echo(f"{'ID':<5} {'Date':<12} {'Task':<30} {'Category':<15} {'Duration':<10} {'Mode':<10}")
+    typer.echo("-" * 90)
+
+    for s in sessions:
+        date_str = s.start_time.strftime("%Y-%m-%d")
+        task_str = s.task[:28] + ".." if len(s.task) > 30 else s.task
+        category_str = s.category[:13] + ".." if len(s.category) > 15 else s.category
+        duration_str = format_duration(s.duration_seconds)
+        typer.echo(f"{s.id:<5} {date_str:<12} {task_str:<30} {category_str:<15} {duration_str:<10} {s.mode:<10}")
+
+
 @app.command()
 def delete(
     session_id: int = typer.Argument(..., help="Session ID to delete"),
     force: bool = typer.Option(False, "--force", "-f", help="Skip confirmation prompt"),
 ):
     """Delete a session permanently"""
+    from database import get_session, delete_session
+
     session = get_session(session_id)
 
     if not session:
@@ -227,23 +456,211 @@ def delete(
         raise typer.Exit(1)
 
 
+@app.command()
+def edit(
+    session_id: int = typer.Argument(..., help="Session ID to edit"),
+    task: Optional[str] = typer.Option(None, "--task", "-t", help="New task", autocompletion=completion.complete_task),
+    category: Optional[str] = typer.Option(
+        None, "--category", "-c", help="New category", autocompletion=completion.complete_category
+    ),
+    mode: Optional[str] = typer.Option(None, "--mode", "-m", help="New mode"),
+    week: Optional[int] = typer.Option(None, "--week", "-w", help="New school week number"),
+    duration: Optional[int] = typer.Option(None, "--duration", "-d", help="New duration in minutes"),
+    date: Optional[str] = typer.Option(None, "--date", help="Move to this date (YYYY-MM-DD), keeping the time of day"),
+):
+    """Change fields of a single session"""
+    from database import get_session, update_session
+    from timer import get_running_timers
+
+    session = get_session(session_id)
+    if not session:
+        typer.echo(f"Error: Session {session_id} not found", err=True)
+        raise typer.Exit(1)
+
+    changes = {}
+    if task is not None:
+        changes["task"] = task
+    if category is not None:
+        changes["category"] = category
+    if mode is not None:
+        changes["mode"] = mode
+    if week is not None:
+        changes["school_week"] = week
+
+    start_time = session.start_time
+    duration_seconds = session.duration_seconds
+    if date is not None:
+        day = parse_date(date, "--date")
+        start_time = datetime.combine(day.date(), start_time.time())
+        changes["start_time"] = start_time
+    if duration is not None:
+        if duration <= 0:
+            typer.echo("Error: Duration must be greater than 0", err=True)
+            raise typer.Exit(1)
+        duration_seconds = duration * 60
+        changes["duration_seconds"] = duration_seconds
+    if (date is not None or duration is not None) and session.end_time:
+        changes["end_time"] = start_time + timedelta(seconds=duration_seconds + session.paused_seconds)
+
+    if not changes:
+        typer.echo("Nothing to change; pass at least one option")
+        return
+
+    running = {state.session_id for _, state, _ in get_running_timers()}
+    if session_id in running and ({"start_time", "duration_seconds"} & changes.keys()):
+        typer.echo("Error: Stop the running timer before changing its date or duration", err=True)
+        raise typer.Exit(1)
+
+    update_session(session_id, **changes)
+    if task is not None or category is not None:
+        completion.rebuild()
+
+    updated = get_session(session_id)
+    typer.echo(f"Updated session #{session_id}")
+    typer.echo(f"Task: {updated.task}")
+    typer.echo(f"Category: {updated.category} | Week: {updated.school_week}")
+    typer.echo(f"Date: {updated.start_time.strftime('%Y-%m-%d %H:%M')}")
+    typer.echo(f"Duration: {format_duration(updated.duration_seconds)}")
+    typer.echo(f"Mode: {updated.mode}")
+
+
+def parse_assignments(pairs: List[str], option: str, keys: dict) -> dict:
+    """Turn `key=value` strings into a dict, renaming keys via `keys`."""
+    values = {}
+    for pair in pairs:
+        key, sep, value = pair.partition("=")
+        key = key.strip()
+        if not sep or key not in keys:
+            typer.echo(f"Error: {option} takes key=value with key one of {', '.join(keys)}", err=True)
+            raise typer.Exit(1)
+        values[keys[key]] = value
+    if "school_week" in values:
+        try:
+            values["school_week"] = int(values["school_week"])
+        except ValueError:
+            typer.echo(f"Error: week in {option} must be a number", err=True)
+            raise typer.Exit(1)
+    return values
+
+
+@app.command("bulk-update")
+def bulk_update(
+    where: List[str] = typer.Option(
+        ..., "--where", help="Condition key=value (task, category, mode, week, since, until); repeatable"
+    ),
+    set_values: List[str] = typer.Option(
+        ..., "--set", help="Change key=value (task, category, mode, week); repeatable"
+    ),
+    dry_run: bool = typer.Option(False, "--dry-run", help="Only count the sessions that would change"),
+    force: bool = typer.Option(False, "--force", "-f", help="Skip confirmation prompt"),
+):
+    """Change fields of every session matching all conditions in one statement"""
+    from database import update_sessions
+
+    conditions = parse_assignments(
+        where, "--where",
+        {"task": "task", "category": "category", "mode": "mode", "week": "school_week", "since": "since", "until": "until"},
+    )
+    changes = parse_assignments(
+        set_values, "--set", {"task": "task", "category": "category", "mode": "mode", "week": "school_week"}
+    )
+    session_filter = build_filter(
+        conditions.get("since"), conditions.get("until"), conditions.get("category"), conditions.get("mode"),
+        conditions.get("school_week"),
+    )
+    session_filter.task = conditions.get("task")
+
+    matching = update_sessions(session_filter, changes, dry_run=True)
+    summary = ", ".join(f"{key}={value}" for key, value in changes.items())
+    if dry_run or not matching:
+        typer.echo(f"{matching} sessions match; would set {summary}")
+        return
+
+    if not force:
+        confirm = typer.confirm(f"Set {summary} on {matching} sessions?")
+        if not confirm:
+            typer.echo("Update cancelled")
+            return
+
+    changed = update_sessions(session_filter, changes)
+    if "task" in changes or "category" in changes:
+        completion.rebuild()
+    typer.echo(f"Updated {changed} sessions")
+
+
+def print_detailed_stats(details) -> None:
+    def plural(n: int) -> str:
+        return f"{n} day" if n == 1 else f"{n} days"
+
+    typer.echo("\nStreaks:")
+    typer.echo(f"  Current: {plural(details.current_streak)}")
+    end = details.longest_streak_start + timedelta(days=details.longest_streak - 1)
+    typer.echo(f"  Longest: {plural(details.longest_streak)} ({details.longest_streak_start} - {end})")
+    typer.echo(f"  Active days: {details.active_days} of {details.span_days}")
+
+    typer.echo("\nSession length:")
+    typer.echo(
+        f"  Median: {format_duration(int(details.median_seconds))} | "
+        f"p90: {format_duration(int(details.p90_seconds))} | "
+        f"Longest: {format_duration(details.longest_seconds)}"
+    )
+
+    typer.echo("\nSession length by category (median / p90):")
+    for name, sessions, _, median, p90 in details.by_category:
+        typer.echo(f"  {name}: {format_duration(int(median))} / {format_duration(int(p90))} ({sessions} sessions)")
+
+    typer.echo("\nBy weekday:")
+    peak = max(details.weekday_seconds) or 1
+    for name, seconds, sessions in zip(WEEKDAY_NAMES, details.weekday_seconds, details.weekday_counts):
+        bar = "█" * round(seconds / peak * 20)
+        share = seconds / details.total_seconds * 100 if details.total_seconds else 0
+        typer.echo(f"  {name} {bar:<20} {share:5.1f}%  {format_duration(seconds)} ({sessions} sessions)")
+
+
 @app.command()
 def stats(
     days: Optional[int] = typer.Option(None, "--days", "-d", help="Limit to last N days"),
+    plot: bool = typer.Option(False, "--plot", help="Draw terminal charts below the totals"),
+    detailed: bool = typer.Option(
+        False, "--detailed", help="Add streaks, session length percentiles and a weekday breakdown"
+    ),
+    since: Optional[str] = SINCE_OPTION,
+    until: Optional[str] = UNTIL_OPTION,
+    category: Optional[str] = CATEGORY_FILTER_OPTION,
+    mode: Optional[str] = MODE_FILTER_OPTION,
+    week: Optional[int] = WEEK_FILTER_OPTION,
 ):
     """Display study statistics"""
-    sessions = get_all_sessions()
+    session_filter = build_filter(since, until, category, mode, week)
+    if days:
+        session_filter.since = max(session_filter.since or datetime.min, datetime.now() - timedelta(days=days))
 
-    if not sessions:
+    # Read with sqlite3 as columns or sums; no per-session objects are built
+    from query import DB_PATH, Query
+    from snapshot import open_snapshot
+
+    if not DB_PATH.exists():
         typer.echo("No sessions found")
         return
-
-    if days:
-        sessions = get_sessions_last_n_days(sessions, days)
-
-    total = get_total_time(sessions)
-    count = get_session_count(sessions)
-    by_category = get_time_by_category(sessions)
+    snapshot = open_snapshot()
+    if detailed:
+        from distribution import get_detailed_stats
+
+        columns = snapshot.to_numpy(session_filter) if snapshot else Query(session_filter).to_numpy()
+        details = get_detailed_stats(columns, SYSTEM_CLOCK.now().date())
+        if details is None:
+            typer.echo("No sessions found")
+            return
+        total, count = details.total_seconds, details.sessions
+        by_category = {name: seconds for name, _, seconds, _, _ in details.by_category}
+    else:
+        if snapshot is not None:
+            count, total, by_category = snapshot.totals(session_filter)
+        else:
+            count, total, by_category = Query(session_filter).totals()
+        if not count:
+            typer.echo("No sessions found")
+            return
 
     typer.echo(f"\nSessions: {count}")
     typer.echo(f"Total: {format_duration(total)}")
@@ -251,15 +668,38 @@ def stats(
     for cat, time in sorted(by_category.items(), key=lambda x: x[1], reverse=True):
         typer.echo(f"  {cat}: {format_duration(time)}")
 
+    if detailed:
+        print_detailed_stats(details)
+
+    if plot:
+        from aggregates import get_aggregates
+        from termcharts import render_dashboard
+
+        typer.echo("")
+        typer.echo(render_dashboard(get_aggregates(session_filter), color=sys.stdout.isatty()))
+
 
 @app.command()
 def charts(
-    dashboard: bool = typer.Option(False, "--dashboard", "-d", help="Generate dashboard view only")
+    dashboard: bool = typer.Option(False, "--dashboard", "-d", help="Generate dashboard view only"),
+    output_format: str = typer.Option("png", "--format", "-f", help="Output format: png, preview, svg, pdf"),
+    since: Optional[str] = SINCE_OPTION,
+    until: Optional[str] = UNTIL_OPTION,
+    category: Optional[str] = CATEGORY_FILTER_OPTION,
+    mode: Optional[str] = MODE_FILTER_OPTION,
+    week: Optional[int] = WEEK_FILTER_OPTION,
 ):
     """Generate visualization charts"""
-    sessions = get_all_sessions()
+    from aggregates import get_aggregates
+    from analytics import generate_all_charts, OUTPUT_FORMATS
 
-    if not sessions:
+    if output_format not in OUTPUT_FORMATS:
+        typer.echo(f"Error: Format must be one of: {', '.join(OUTPUT_FORMATS)}", err=True)
+        raise typer.Exit(1)
+
+    aggregates = get_aggregates(build_filter(since, until, category, mode, week))
+
+    if aggregates.is_empty:
         typer.echo("No sessions found")
         return
 
@@ -268,7 +708,7 @@ def charts(
     else:
         typer.echo("Generating charts...")
 
-    chart_files = generate_all_charts(sessions, dashboard_only=dashboard)
+    chart_files = generate_all_charts(aggregates, dashboard_only=dashboard, output_format=output_format)
 
     if chart_files:
         typer.echo(f"\nGenerated {len(chart_files)} chart{'s' if len(chart_files) > 1 else ''}:")
@@ -278,16 +718,57 @@ def charts(
         typer.echo("No charts generated")
 
 
+@app.command()
+def dashboard(
+    tty: bool = typer.Option(False, "--tty", help="Draw in the terminal instead of writing an image"),
+    output_format: str = typer.Option("png", "--format", "-f", help="Output format: png, preview, svg, pdf"),
+    since: Optional[str] = SINCE_OPTION,
+    until: Optional[str] = UNTIL_OPTION,
+    category: Optional[str] = CATEGORY_FILTER_OPTION,
+    mode: Optional[str] = MODE_FILTER_OPTION,
+    week: Optional[int] = WEEK_FILTER_OPTION,
+):
+    """Show the combined dashboard"""
+    from aggregates import get_aggregates
+
+    aggregates = get_aggregates(build_filter(since, until, category, mode, week))
+
+    if aggregates.is_empty:
+        typer.echo("No sessions found")
+        return
+
+    if tty:
+        from termcharts import render_dashboard
+
+        typer.echo(render_dashboard(aggregates, color=sys.stdout.isatty()))
+        return
+
+    from analytics import generate_dashboard, OUTPUT_FORMATS
+
+    if output_format not in OUTPUT_FORMATS:
+        typer.echo(f"Error: Format must be one of: {', '.join(OUTPUT_FORMATS)}", err=True)
+        raise typer.Exit(1)
+
+    typer.echo(f"Generated dashboard: {generate_dashboard(aggregates, output_format)}")
+
+
 @app.command()
 def show():
     """Open chart viewer"""
+    from analytics import OUTPUT_FORMATS
+
     charts_dir = Path(__file__).parent / "data" / "charts"
+    extensions = {f".{file_format}" for file_format, _ in OUTPUT_FORMATS.values()}
 
-    if not charts_dir.exists() or not any(charts_dir.glob("*.png")):
+    if not charts_dir.exists():
         typer.echo("No charts found. Run 'cybersyn charts' first.")
         return
 
-    chart_files = sorted(charts_dir.glob("*.png"), key=lambda p: p.stat().st_mtime, reverse=True)
+    chart_files = sorted(
+        (p for p in charts_dir.iterdir() if p.suffix in extensions),
+        key=lambda p: p.stat().st_mtime,
+        reverse=True,
+    )
 
     if not chart_files:
         typer.echo("No charts found. Run 'cybersyn charts' first.")
@@ -306,11 +787,20 @@ def show():
 
 
 @app.command()
-def export(output: str = typer.Argument("sessions.csv")):
+def export(
+    output: str = typer.Argument("sessions.csv"),
+    since: Optional[str] = SINCE_OPTION,
+    until: Optional[str] = UNTIL_OPTION,
+    category: Optional[str] = CATEGORY_FILTER_OPTION,
+    mode: Optional[str] = MODE_FILTER_OPTION,
+    week: Optional[int] = WEEK_FILTER_OPTION,
+):
     """Export sessions to CSV"""
     import csv
 
-    sessions = get_all_sessions()
+    from database import get_sessions
+
+    sessions = get_sessions(build_filter(since, until, category, mode, week))
 
     if not sessions:
         typer.echo("No sessions to export")
@@ -336,16 +826,235 @@ def export(output: str = typer.Argument("sessions.csv")):
     typer.echo(f"Exported {len(sessions)} sessions to {output}")
 
 
+@app.command()
+def archive(
+    before: str = typer.Option(..., "--before", help="Archive sessions that started before this date (YYYY-MM-DD)"),
+    force: bool = typer.Option(False, "--force", "-f", help="Skip confirmation prompt"),
+):
+    """Move old sessions into per-year archive files"""
+    from database import archive_sessions, ARCHIVE_DIR
+
+    cutoff = parse_date(before, "--before")
+    if not force:
+        confirm = typer.confirm(f"Move sessions from before {cutoff:%Y-%m-%d} to {ARCHIVE_DIR}?")
+        if not confirm:
+            typer.echo("Archiving cancelled")
+            return
+
+    moved = archive_sessions(cutoff)
+    if not moved:
+        typer.echo("No sessions to archive")
+        return
+
+    for year, count in moved.items():
+        typer.echo(f"  {year}: {count} sessions -> {ARCHIVE_DIR / f'{year}.db'}")
+    typer.echo(f"Archived {sum(moved.values())} sessions")
+
+
+@app.command()
+def backup(
+    keep: int = typer.Option(10, "--keep", "-k", min=1, help="Number of backups to keep"),
+    step: int = typer.Option(256, "--step", min=1, help="Database pages copied per step"),
+):
+    """Back up the database and archives while the timer keeps running"""
+    from backup import create_backup, BACKUP_DIR
+
+    try:
+        output = create_backup(keep, step)
+    except ValueError as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+
+    typer.echo(f"Backup written to {output} ({output.stat().st_size / 1024:.0f} KB)")
+    typer.echo(f"Keeping the newest {keep} backups in {BACKUP_DIR}")
+
+
+@app.command()
+def restore(
+    backup_file: Optional[Path] = typer.Argument(None, help="Backup to restore; lists backups if omitted"),
+    force: bool = typer.Option(False, "--force", "-f", help="Skip confirmation prompt"),
+):
+    """Replace the database and archives with a backup"""
+    from backup import list_backups, restore_backup, BACKUP_DIR
+    from timer import get_running_timers
+
+    if backup_file is None:
+        backups = list_backups()
+        if not backups:
+            typer.echo(f"No backups in {BACKUP_DIR}")
+            return
+        for path in reversed(backups):
+            typer.echo(f"{path.name:<35} {path.stat().st_size / 1024:>8.0f} KB")
+        return
+
+    if not backup_file.exists() and (BACKUP_DIR / backup_file).exists():
+        backup_file = BACKUP_DIR / backup_file
+    if not backup_file.exists():
+        typer.echo(f"Error: {backup_file} not found", err=True)
+        raise typer.Exit(1)
+
+    if get_running_timers():
+        typer.echo("Error: Stop all running timers before restoring", err=True)
+        raise typer.Exit(1)
+
+    if not force:
+        confirm = typer.confirm(f"Replace all sessions and archives with {backup_file.name}?")
+        if not confirm:
+            typer.echo("Restore cancelled")
+            return
+
+    try:
+        safety = restore_backup(backup_file)
+    except ValueError as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+    completion.rebuild()
+
+    typer.echo(f"Restored {backup_file.name}")
+    typer.echo(f"The previous data was saved to {safety}")
+
+
+def format_size(size: int) -> str:
+    return f"{size / 1024 / 1024:.1f} MB" if size >= 1024 * 1024 else f"{size / 1024:.0f} KB"
+
+
+@app.command()
+def maintain(
+    every: Optional[int] = typer.Option(
+        None, "--every", min=0, help="Also run automatically after this many session writes (0 turns it off)"
+    ),
+    step: int = typer.Option(256, "--step", min=1, help="Free pages returned per step"),
+):
+    """Reclaim free space, refresh query statistics and report the file size"""
+    import sqlite3
+    from maintain import run_maintenance
+
+    if every is not None:
+        cfg = load_config()
+        cfg.maintain_every = every
+        save_config(cfg)
+        typer.echo(f"Automatic maintenance: {f'every {every} writes' if every else 'off'}")
+        return
+
+    try:
+        report = run_maintenance(step)
+    except (ValueError, sqlite3.Error) as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+
+    before, after = report.before, report.after
+    typer.echo(f"{'':<14} {'Before':>12} {'After':>12}")
+    typer.echo(f"{'File size':<14} {format_size(before.size):>12} {format_size(after.size):>12}")
+    typer.echo(f"{'Pages':<14} {before.page_count:>12} {after.page_count:>12}")
+    typer.echo(f"{'Free pages':<14} {before.free_pages:>12} {after.free_pages:>12}")
+    typer.echo(f"{'Auto-vacuum':<14} {before.auto_vacuum:>12} {after.auto_vacuum:>12}")
+    typer.echo("")
+    if report.converted:
+        typer.echo("Switched to incremental auto-vacuum (one-off full VACUUM)")
+    if report.analyzed == "analyze":
+        typer.echo("Query statistics collected with ANALYZE")
+    else:
+        typer.echo("Query statistics refreshed with PRAGMA optimize")
+    if report.pruned:
+        typer.echo(f"Pruned {report.pruned} change-log entries")
+    typer.echo(f"Done in {report.seconds:.1f}s")
+
+
+@app.command()
+def snapshot(
+    force: bool = typer.Option(False, "--force", "-f", help="Rebuild even if the snapshot is current"),
+    remove: bool = typer.Option(False, "--remove", help="Delete the snapshot file"),
+):
+    """Write a columnar snapshot that stats and charts read instead of the database"""
+    import sqlite3
+    import time
+    from snapshot import SNAPSHOT_FILE, build_snapshot, open_snapshot
+
+    if remove:
+        SNAPSHOT_FILE.unlink(missing_ok=True)
+        typer.echo("Snapshot removed")
+        return
+    current = open_snapshot()
+    if current is not None and not force:
+        typer.echo(f"Snapshot is current: {len(current)} sessions, {format_size(SNAPSHOT_FILE.stat().st_size)}")
+        return
+
+    started = time.monotonic()
+    try:
+        rows = build_snapshot()
+    except (FileNotFoundError, sqlite3.Error) as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+    typer.echo(f"Wrote {SNAPSHOT_FILE}: {rows} sessions, {format_size(SNAPSHOT_FILE.stat().st_size)}")
+    typer.echo(f"Done in {time.monotonic() - started:.1f}s")
+
+
+@app.command()
+def doctor(
+    fix: bool = typer.Option(False, "--fix", help="Apply the automatic fixes"),
+    force: bool = typer.Option(False, "--force", "-f", help="Skip confirmation prompt"),
+    limit: int = typer.Option(5, "--limit", "-n", help="Issues shown per kind (0 for all)"),
+):
+    """Check sessions for overlaps, duplicates, bad durations and orphaned timers"""
+    from doctor import KINDS, run_checks, apply_fixes
+
+    checkup = run_checks()
+    typer.echo(f"Checked {checkup.checked} sessions")
+    if not checkup.issues:
+        typer.echo("No problems found")
+        return
+
+    for kind, label in KINDS.items():
+        issues = [issue for issue in checkup.issues if issue.kind == kind]
+        if not issues:
+            continue
+        fixable = sum(issue.fixable for issue in issues)
+        typer.echo("")
+        typer.echo(f"{label}: {len(issues)}" + (f" ({fixable} fixable)" if fixable else ""))
+        shown = issues if limit <= 0 else issues[:limit]
+        for issue in shown:
+            typer.echo(f"  #{issue.session_id:<6} {issue.detail}")
+        if len(shown) < len(issues):
+            typer.echo(f"  ... and {len(issues) - len(shown)} more")
+
+    typer.echo("")
+    if not checkup.fix_count:
+        typer.echo("Nothing can be fixed automatically")
+        return
+    if not fix:
+        typer.echo(f"Run with --fix to apply {checkup.fix_count} fixes")
+        return
+
+    if not force:
+        confirm = typer.confirm(f"Apply {checkup.fix_count} fixes?")
+        if not confirm:
+            typer.echo("No changes made")
+            return
+
+    apply_fixes(checkup)
+    if checkup.deletes:
+        completion.rebuild()
+    typer.echo(
+        f"Deleted {len(checkup.deletes)} sessions, updated {len(checkup.updates)},"
+        f" dropped {len(checkup.stale_timers)} timers"
+    )
+
+
 @app.command()
 def add(
-    task: str,
-    category: str = typer.Option(..., "--category", "-c", help="Study category/class"),
+    task: str = typer.Argument(..., autocompletion=completion.complete_task),
+    category: str = typer.Option(
+        ..., "--category", "-c", help="Study category/class", autocompletion=completion.complete_category
+    ),
     week: int = typer.Option(..., "--week", "-w", help="School week number"),
     duration: int = typer.Option(..., "--duration", "-d", help="Duration in minutes"),
     date: Optional[str] = typer.Option(None, "--date", help="Date in YYYY-MM-DD format (defaults to today)"),
     mode: str = typer.Option("manual", "--mode", "-m", help="Mode type"),
 ):
     """Manually add a completed study session"""
+    from database import save_session
+    from goals import get_goal_progress
+
     if duration <= 0:
         typer.echo("Error: Duration must be greater than 0", err=True)
         raise typer.Exit(1)
@@ -377,7 +1086,9 @@ def add(
         school_week=week,
     )
 
+    before = get_goal_progress(load_config().goals, datetime.now().date())
     session_id = save_session(session)
+    completion.record_use(task, category, start_time.timestamp())
 
     typer.echo(f"Added session #{session_id}")
     typer.echo(f"Task: {task}")
@@ -385,6 +1096,7 @@ def add(
     typer.echo(f"Date: {start_time.strftime('%Y-%m-%d')}")
     typer.echo(f"Duration: {format_duration(duration_seconds)}")
     typer.echo(f"Mode: {mode}")
+    announce_goals(before)
 
 
 @app.command()
@@ -397,30 +1109,298 @@ def config(
 ):
     """Configure pomodoro settings"""
     cfg = load_config()
+    pomodoro = cfg.pomodoro
 
     if show or (work is None and short_break is None and long_break is None and sessions is None):
         typer.echo("Current pomodoro configuration:")
-        typer.echo(f"  Work duration: {cfg.work_minutes} minutes")
-        typer.echo(f"  Short break: {cfg.short_break_minutes} minutes")
-        typer.echo(f"  Long break: {cfg.long_break_minutes} minutes")
-        typer.echo(f"  Sessions until long break: {cfg.sessions_until_long_break}")
+        typer.echo(f"  Work duration: {pomodoro.work_minutes} minutes")
+        typer.echo(f"  Short break: {pomodoro.short_break_minutes} minutes")
+        typer.echo(f"  Long break: {pomodoro.long_break_minutes} minutes")
+        typer.echo(f"  Sessions until long break: {pomodoro.sessions_until_long_break}")
         return
 
     if work is not None:
-        cfg.work_minutes = work
+        pomodoro.work_minutes = work
     if short_break is not None:
-        cfg.short_break_minutes = short_break
+        pomodoro.short_break_minutes = short_break
     if long_break is not None:
-        cfg.long_break_minutes = long_break
+        pomodoro.long_break_minutes = long_break
     if sessions is not None:
-        cfg.sessions_until_long_break = sessions
+        pomodoro.sessions_until_long_break = sessions
 
     save_config(cfg)
     typer.echo("Pomodoro configuration updated:")
-    typer.echo(f"  Work duration: {cfg.work_minutes} minutes")
-    typer.echo(f"  Short break: {cfg.short_break_minutes} minutes")
-    typer.echo(f"  Long break: {cfg.long_break_minutes} minutes")
-    typer.echo(f"  Sessions until long break: {cfg.sessions_until_long_break}")
+    typer.echo(f"  Work duration: {pomodoro.work_minutes} minutes")
+    typer.echo(f"  Short break: {pomodoro.short_break_minutes} minutes")
+    typer.echo(f"  Long break: {pomodoro.long_break_minutes} minutes")
+    typer.echo(f"  Sessions until long break: {pomodoro.sessions_until_long_break}")
+
+
+@category_app.command("list")
+def category_list():
+    """List categories with their session counts (archives included) and aliases"""
+    from database import get_category_counts
+
+    rows = get_category_counts()
+    if not rows:
+        typer.echo("No categories yet")
+        return
+
+    typer.echo(f"{'Category':<25} {'Sessions':>8}  Aliases")
+    typer.echo("-" * 60)
+    for name, count, aliases in rows:
+        typer.echo(f"{name:<25} {count:>8}  {', '.join(aliases)}")
+
+
+@category_app.command("merge")
+def category_merge(
+    source: str = typer.Argument(..., help="Category to merge away", autocompletion=completion.complete_category),
+    target: str = typer.Argument(
+        ..., help="Category to merge into (created if new)", autocompletion=completion.complete_category
+    ),
+    force: bool = typer.Option(False, "--force", "-f", help="Skip confirmation prompt"),
+):
+    """Move every session of SOURCE into TARGET and keep SOURCE as an alias"""
+    from database import merge_categories
+
+    if not force:
+        confirm = typer.confirm(f"Merge '{source}' into '{target}'?")
+        if not confirm:
+            typer.echo("Merge cancelled")
+            return
+
+    try:
+        moved = merge_categories(source, target)
+    except ValueError as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+    completion.rebuild()
+
+    typer.echo(f"Merged '{source}' into '{target}' ({moved} sessions moved)")
+    typer.echo(f"'{source}' is now an alias; new sessions using it are filed under '{target}'")
+
+
+@goal_app.command("list")
+def goal_list():
+    """Show every goal with its progress this day or week"""
+    from goals import get_goal_progress
+
+    cfg = load_config()
+    if not cfg.goals:
+        typer.echo("No goals set")
+        return
+    print_goals(get_goal_progress(cfg.goals, datetime.now().date()))
+
+
+@goal_app.command("set")
+def goal_set(
+    category: str = typer.Argument(..., autocompletion=completion.complete_category),
+    hours: float = typer.Argument(..., help="Target hours per period"),
+    per: str = typer.Option("week", "--per", "-p", help="Period: day or week (Monday to Sunday)"),
+):
+    """Set the goal for a category, replacing any goal for the same period"""
+    from config import Goal
+
+    if per not in ("day", "week"):
+        typer.echo("Error: --per must be 'day' or 'week'", err=True)
+        raise typer.Exit(1)
+    if hours <= 0:
+        typer.echo("Error: Hours must be greater than 0", err=True)
+        raise typer.Exit(1)
+
+    cfg = load_config()
+    cfg.goals = [g for g in cfg.goals if (g.category, g.period) != (category, per)]
+    cfg.goals.append(Goal(category=category, hours=hours, period=per))
+    save_config(cfg)
+    typer.echo(f"Goal set: {category} {hours:g}h per {per}")
+
+
+@goal_app.command("remove")
+def goal_remove(
+    category: str = typer.Argument(..., autocompletion=completion.complete_category),
+    per: Optional[str] = typer.Option(None, "--per", "-p", help="Only remove the day or week goal"),
+):
+    """Remove the goals for a category"""
+    cfg = load_config()
+    kept = [g for g in cfg.goals if g.category != category or (per is not None and g.period != per)]
+    if len(kept) == len(cfg.goals):
+        typer.echo(f"Error: No goal for '{category}'", err=True)
+        raise typer.Exit(1)
+    cfg.goals = kept
+    save_config(cfg)
+    typer.echo(f"Removed {'the ' + per + ' goal' if per else 'goals'} for {category}")
+
+
+@hook_app.command("list")
+def hook_list():
+    """Show configured hooks and what is waiting to be delivered"""
+    from hooks import pending
+
+    cfg = load_config()
+    if not cfg.hooks:
+        typer.echo("No hooks. Add one with 'cybersyn hook add --url URL' or '--command CMD'.")
+        return
+    status = pending(cfg.hooks)
+    for index, hook in enumerate(cfg.hooks, 1):
+        waiting, attempts, next_attempt, last_error = status[hook.key]
+        events = ", ".join(hook.events) if hook.events else "all events"
+        typer.echo(f"{index}. {hook.url or hook.command}  ({events})")
+        if attempts:
+            retry = datetime.fromtimestamp(next_attempt).strftime("%H:%M:%S")
+            typer.echo(f"   {waiting} waiting, {attempts} failed attempts, retry at {retry}: {last_error}")
+        elif waiting:
+            typer.echo(f"   {waiting} waiting")
+
+
+@hook_app.command("add")
+def hook_add(
+    command: Optional[str] = typer.Option(None, "--command", help="Shell command; gets events as JSON lines on stdin"),
+    url: Optional[str] = typer.Option(None, "--url", help="URL to POST batches of events to as JSON"),
+    events: List[str] = typer.Option([], "--event", "-e", help="Only send this event (repeatable; default all)"),
+):
+    """Add a hook"""
+    from config import Hook
+    from hooks import EVENTS, start_cursor
+
+    if (command is None) == (url is None):
+        typer.echo("Error: Give exactly one of --command or --url", err=True)
+        raise typer.Exit(1)
+    if url is not None and not url.startswith(("http://", "https://")):
+        typer.echo("Error: --url must be an http:// or https:// URL", err=True)
+        raise typer.Exit(1)
+    unknown = [e for e in events if e not in EVENTS]
+    if unknown:
+        typer.echo(f"Error: Unknown event {', '.join(unknown)}. Events: {', '.join(EVENTS)}", err=True)
+        raise typer.Exit(1)
+
+    cfg = load_config()
+    hook = Hook(command=command, url=url, events=events)
+    if any(h.key == hook.key for h in cfg.hooks):
+        typer.echo(f"Error: Hook already exists: {url or command}", err=True)
+        raise typer.Exit(1)
+    start_cursor(hook)
+    cfg.hooks.append(hook)
+    save_config(cfg)
+    typer.echo(f"Added hook {len(cfg.hooks)}: {url or command}")
+
+
+@hook_app.command("remove")
+def hook_remove(index: int = typer.Argument(..., help="Number shown by 'hook list'")):
+    """Remove a hook; events not yet sent to it are dropped"""
+    from hooks import forget
+
+    cfg = load_config()
+    if not 1 <= index <= len(cfg.hooks):
+        typer.echo(f"Error: No hook {index}", err=True)
+        raise typer.Exit(1)
+    hook = cfg.hooks.pop(index - 1)
+    save_config(cfg)
+    forget(hook.key, cfg.hooks)
+    typer.echo(f"Removed hook: {hook.url or hook.command}")
+
+
+@hook_app.command("deliver")
+def hook_deliver(
+    force: bool = typer.Option(False, "--force", "-f", help="Retry hooks that are backing off now"),
+):
+    """Deliver waiting events in the foreground"""
+    from hooks import deliver, pending
+
+    cfg = load_config()
+    delivered = deliver(cfg.hooks, force)
+    typer.echo(f"Delivered {delivered} events")
+    status = pending(cfg.hooks)
+    for hook in cfg.hooks:
+        waiting, _, _, last_error = status[hook.key]
+        if waiting:
+            typer.echo(f"  {hook.url or hook.command}: {waiting} still waiting ({last_error or 'backing off'})")
+
+
+@hook_app.command("test")
+def hook_test():
+    """Send a hook.test event to every hook and wait for the result"""
+    from hooks import emit, deliver, pending
+
+    cfg = load_config()
+    if not cfg.hooks:
+        typer.echo("No hooks configured")
+        return
+    emit("hook.test", {"sent_at": datetime.now().isoformat()}, cfg.hooks)
+    deliver(cfg.hooks, force=True)
+    status = pending(cfg.hooks)
+    failed = False
+    for hook in cfg.hooks:
+        if not hook.wants("hook.test"):
+            continue
+        waiting, _, _, last_error = status[hook.key]
+        if waiting:
+            failed = True
+            typer.echo(f"FAILED {hook.url or hook.command}: {last_error}")
+        else:
+            typer.echo(f"ok     {hook.url or hook.command}")
+    if failed:
+        raise typer.Exit(1)
+
+
+@sync_app.command("export")
+def sync_export(directory: Path = typer.Argument(..., help="Folder to write the changeset to, e.g. a shared one")):
+    """Write the changes made here since the last export"""
+    from sync import export_changes
+
+    try:
+        result = export_changes(directory)
+    except ValueError as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+    if result.path is None:
+        typer.echo("No changes to export")
+        return
+    typer.echo(f"Wrote {result.records} changes to {result.path} ({format_size(result.path.stat().st_size)})")
+
+
+@sync_app.command("apply")
+def sync_apply(
+    paths: List[Path] = typer.Argument(..., help="Changeset files, or folders to read every changeset from"),
+    force: bool = typer.Option(False, "--force", "-f", help="Apply even if earlier changes from a device are missing"),
+):
+    """Apply changes exported by other installs"""
+    from sync import apply_changes
+
+    try:
+        result = apply_changes(paths, force)
+    except ValueError as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+    if not result.files:
+        typer.echo("Already up to date")
+        return
+    completion.rebuild()
+    typer.echo(f"Applied {result.files} changeset{'s' if result.files != 1 else ''}: {result.applied} changes")
+    if result.skipped:
+        typer.echo(f"Kept {result.skipped} local sessions that were as new or newer")
+    if result.matched:
+        typer.echo(f"Recognised {result.matched} sessions that were already here")
+
+
+@sync_app.command("status")
+def sync_status():
+    """Show this device and how far other devices have been applied"""
+    from sync import sync_status as get_sync_status
+
+    try:
+        status = get_sync_status()
+    except ValueError as e:
+        typer.echo(f"Error: {e}", err=True)
+        raise typer.Exit(1)
+    if status.device is None:
+        typer.echo(f"Not synced yet; the first export sends all {status.pending} sessions")
+        return
+    typer.echo(f"Device: {status.device}")
+    typer.echo(f"Exported through change {status.exported_seq}; about {status.pending} changes not exported yet")
+    for device, seq in status.peers.items():
+        typer.echo(f"  {device}: applied through change {seq}")
+    if not status.peers:
+        typer.echo("No changes from other devices applied yet")
 
 
 if __name__ == "__main__":
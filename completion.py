@@ -0,0 +1,273 @@
+"""Shell completion of task and category names, served from a cache file.
+
+The shell runs the whole program on every Tab press, so the completion
+path only uses modules the interpreter has already loaded at startup:
+no SQLAlchemy, no database, not even json or re. Names are kept in
+data/completion.cache (marshal format) with a use count and last-use
+time; `record_use` updates it when a session is started or added, and
+`rebuild` refills it from the database when it is missing, unreadable or
+after categories are merged.
+"""
+import marshal
+import os
+import sys
+import time
+from paths import DATA_DIR, DB_PATH
+
+VOCABULARY_FILE = os.path.join(DATA_DIR, "completion.cache")
+
+MAX_TASKS = 500
+MAX_CATEGORIES = 200
+# A use counts half as much after this many days
+HALF_LIFE_DAYS = 14
+
+CATEGORY_OPTIONS = {"--category", "-c"}
+# Options of the commands taking a task argument that consume a value,
+# needed to tell the task apart from option values
+TASK_COMMANDS = {
+    "start": {"--category", "-c", "--week", "-w", "--id"},
+    "add": {"--category", "-c", "--week", "-w", "--duration", "-d", "--date", "--mode", "-m"},
+}
+
+
+def _empty() -> dict:
+    return {"tasks": {}, "categories": {}}
+
+
+def load_vocabulary() -> dict:
+    try:
+        with open(VOCABULARY_FILE, "rb") as f:
+            return marshal.load(f)
+    # marshal data from another Python version is rejected the same way
+    except (OSError, EOFError, ValueError, TypeError):
+        return rebuild()
+
+
+def save_vocabulary(vocabulary: dict) -> None:
+    os.makedirs(DATA_DIR, exist_ok=True)
+    tmp = VOCABULARY_FILE + ".tmp"
+    with open(tmp, "wb") as f:
+        marshal.dump(vocabulary, f)
+    os.replace(tmp, VOCABULARY_FILE)
+
+
+def _score(count: int, last_used: float, now: float) -> float:
+    return count * 0.5 ** ((now - last_used) / (HALF_LIFE_DAYS * 86400))
+
+
+def _trim(entries: dict, limit: int, now: float) -> dict:
+    if len(entries) <= limit:
+        return entries
+    ranked = sorted(entries.items(), key=lambda item: _score(item[1][0], item[1][1], now), reverse=True)
+    return dict(ranked[:limit])
+
+
+def rebuild() -> dict:
+    """Refill the cache from the sessions table; returns the new vocabulary."""
+    import sqlite3
+
+    vocabulary = _empty()
+    if os.path.exists(DB_PATH):
+        conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+        try:
+            # The bare c.name comes from the row holding max(start_time)
+            tasks = conn.execute(
+                """
+                SELECT s.task, count(*), max(s.start_time), c.name
+                FROM sessions s JOIN categories c ON c.id = s.category_id
+                GROUP BY s.task
+                """
+            ).fetchall()
+            categories = conn.execute(
+                """
+                SELECT c.name, count(s.id), coalesce(max(s.start_time), 0)
+                FROM categories c LEFT JOIN sessions s ON s.category_id = c.id
+                GROUP BY c.id
+                """
+            ).fetchall()
+        except sqlite3.OperationalError:
+            # Schema not created or migrated yet
+            tasks, categories = [], []
+        finally:
+            conn.close()
+
+        now = time.time()
+        vocabulary["tasks"] = _trim(
+            {task: [count, last_used, category] for task, count, last_used, category in tasks}, MAX_TASKS, now
+        )
+        vocabulary["categories"] = _trim(
+            {name: [count, last_used] for name, count, last_used in categories}, MAX_CATEGORIES, now
+        )
+
+    save_vocabulary(vocabulary)
+    return vocabulary
+
+
+def record_use(task: str, category: str, when: float | None = None) -> None:
+    """Count one more use of a task and category."""
+    when = when or time.time()
+    vocabulary = load_vocabulary()
+
+    count, last_used, _ = vocabulary["tasks"].get(task, [0, 0, None])
+    vocabulary["tasks"][task] = [count + 1, max(last_used, when), category]
+    count, last_used = vocabulary["categories"].get(category, [0, 0])
+    vocabulary["categories"][category] = [count + 1, max(last_used, when)]
+
+    vocabulary["tasks"] = _trim(vocabulary["tasks"], MAX_TASKS, when)
+    vocabulary["categories"] = _trim(vocabulary["categories"], MAX_CATEGORIES, when)
+    save_vocabulary(vocabulary)
+
+
+def suggest(kind: str, incomplete: str, category: str | None = None) -> list[str]:
+    """Cached names starting with `incomplete`, most frequent and recent first.
+
+    For tasks, those last used in `category` are listed before the rest.
+    """
+    now = time.time()
+    prefix = incomplete.casefold()
+    entries = load_vocabulary()[kind]
+    matches = [(name, entry) for name, entry in entries.items() if name.casefold().startswith(prefix)]
+    matches.sort(
+        key=lambda item: (
+            category is not None and len(item[1]) > 2 and item[1][2] == category,
+            _score(item[1][0], item[1][1], now),
+        ),
+        reverse=True,
+    )
+    return [name for name, _ in matches]
+
+
+def complete_task(incomplete: str) -> list[str]:
+    return suggest("tasks", incomplete)
+
+
+def complete_category(incomplete: str) -> list[str]:
+    return suggest("categories", incomplete)
+
+
+def _split(line: str) -> list[str]:
+    """Split a command line like a POSIX shell, keeping an unterminated quoted word.
+
+    A small stand-in for shlex.split, which would import re.
+    """
+    words = []
+    word = None
+    quote = None
+    chars = iter(line)
+    for ch in chars:
+        if quote:
+            if ch == quote:
+                quote = None
+            elif ch == "\\" and quote == '"':
+                word += next(chars, "")
+            else:
+                word += ch
+        elif ch in " \t\n":
+            if word is not None:
+                words.append(word)
+                word = None
+        else:
+            word = word or ""
+            if ch in "'\"":
+                quote = ch
+            elif ch == "\\":
+                word += next(chars, "")
+            else:
+                word += ch
+    if word is not None:
+        words.append(word)
+    return words
+
+
+def _completion_request() -> tuple[str, list[str], str] | None:
+    """Shell, preceding words and the word being completed, as sent by Typer's scripts."""
+    shell = next(
+        (
+            value.removeprefix("complete_")
+            for key, value in os.environ.items()
+            if key.startswith("_") and key.endswith("_COMPLETE") and value.startswith("complete_")
+        ),
+        None,
+    )
+    if shell == "bash":
+        words = _split(os.environ.get("COMP_WORDS", ""))
+        cword = int(os.environ.get("COMP_CWORD", "0"))
+        return shell, words[1:cword], words[cword] if cword < len(words) else ""
+    if shell in ("zsh", "fish"):
+        line = os.environ.get("_TYPER_COMPLETE_ARGS", "")
+        args = _split(line)[1:]
+        if args and not line.endswith(" "):
+            return shell, args[:-1], args[-1]
+        return shell, args, ""
+    return None
+
+
+def _target(args: list[str], incomplete: str) -> tuple[str, str | None] | None:
+    """What the word being completed names: ("tasks", category) or ("categories", None)."""
+    if incomplete.startswith("-"):
+        return None
+    if args and args[-1] in CATEGORY_OPTIONS:
+        return "categories", None
+    if args[:2] == ["category", "merge"]:
+        positional = [a for a in args[2:] if not a.startswith("-")]
+        return ("categories", None) if len(positional) < 2 else None
+    if args and args[0] in TASK_COMMANDS:
+        takes_value = TASK_COMMANDS[args[0]]
+        category = None
+        words = iter(args[1:])
+        for word in words:
+            if word in takes_value:
+                value = next(words, None)
+                if value is None:
+                    # Completing this option's value, e.g. a week number
+                    return None
+                if word in CATEGORY_OPTIONS:
+                    category = value
+            elif not word.startswith("-"):
+                # The task is already given
+                return None
+        return "tasks", category
+    return None
+
+
+def _format(shell: str, values: list[str]) -> str:
+    if shell == "zsh":
+        if not values:
+            return "_files"
+
+        def escape(s: str) -> str:
+            return (
+                s.replace('"', '""')
+                .replace("'", "''")
+                .replace("$", "\\$")
+                .replace("`", "\\`")
+                .replace(":", r"\\:")
+            )
+
+        lines = "\n".join(f'"{escape(value)}"' for value in values)
+        return f"_arguments '*: :(({lines}))'"
+    return "\n".join(values)
+
+
+def serve_if_requested() -> None:
+    """Answer a task or category completion request and exit.
+
+    Anything else (commands, options, other values) returns without output
+    and is left to Typer's completion.
+    """
+    request = _completion_request()
+    if request is None:
+        return
+    shell, args, incomplete = request
+    target = _target(args, incomplete)
+    if target is None:
+        return
+
+    kind, category = target
+    values = suggest(kind, incomplete, category)
+    if shell == "fish" and os.environ.get("_TYPER_COMPLETE_FISH_ACTION") == "is-args":
+        sys.exit(0 if values else 1)
+
+    sys.stdout.write(_format(shell, values))
+    sys.stdout.flush()
+    sys.exit(0)
@@ -1,5 +1,6 @@
 import json
 from pathlib import Path
+from typing import Literal
 from pydantic import BaseModel
 
 CONFIG_FILE = Path(__file__).parent / "data" / "config.json"
@@ -10,6 +11,33 @@ DEFAULT_LONG_BREAK_MINUTES = 15
 DEFAULT_SESSIONS_UNTIL_LONG = 4
 
 
+class Goal(BaseModel):
+    """Target study time for one category per day or per week (Monday to Sunday)."""
+
+    category: str
+    hours: float
+    period: Literal["day", "week"] = "week"
+
+
+class Hook(BaseModel):
+    """A shell command or URL that receives events in batches.
+
+    Commands get one JSON event per line on stdin; URLs get a POST with
+    {"events": [...]}. An empty `events` list subscribes to every event.
+    """
+
+    command: str | None = None
+    url: str | None = None
+    events: list[str] = []
+
+    @property
+    def key(self) -> str:
+        return f"command:{self.command}" if self.command else f"url:{self.url}"
+
+    def wants(self, event: str) -> bool:
+        return not self.events or event in self.events
+
+
 class PomodoroConfig(BaseModel):
     work_minutes: int = DEFAULT_WORK_MINUTES
     short_break_minutes: int = DEFAULT_SHORT_BREAK_MINUTES
@@ -17,17 +45,32 @@ class PomodoroConfig(BaseModel):
     sessions_until_long_break: int = DEFAULT_SESSIONS_UNTIL_LONG
 
 
-def load_config() -> PomodoroConfig:
+class Config(BaseModel):
+    """Everything in config.json, one section per feature."""
+
+    pomodoro: PomodoroConfig = PomodoroConfig()
+    goals: list[Goal] = []
+    # Run `maintain` after this many session writes; 0 turns it off
+    maintain_every: int = 0
+    hooks: list[Hook] = []
+
+
+def load_config() -> Config:
     if not CONFIG_FILE.exists():
-        return PomodoroConfig()
+        return Config()
 
     with open(CONFIG_FILE, "r") as f:
         data = json.load(f)
 
-    return PomodoroConfig(**data)
+    # Older files keep the pomodoro settings at the top level
+    pomodoro = {key: data.pop(key) for key in list(data) if key in PomodoroConfig.model_fields}
+    if pomodoro and "pomodoro" not in data:
+        data["pomodoro"] = pomodoro
+
+    return Config(**data)
 
 
-def save_config(config: PomodoroConfig) -> None:
+def save_config(config: Config) -> None:
     CONFIG_FILE.parent.mkdir(exist_ok=True)
 
     with open(CONFIG_FILE, "w") as f:
@@ -0,0 +1,95 @@
+"""One background loop sending pomodoro notifications for every running timer.
+
+    cybersyn daemon
+
+Phase ends of all timers sit in a single PhaseScheduler heap. The loop
+sleeps until the earliest one, waking at least every POLL_SECONDS to
+stat the state file for started, paused or stopped timers. While it
+runs, `start` leaves phase notifications to it.
+"""
+import os
+import signal
+import sys
+import time
+from pathlib import Path
+from clock import Clock, SYSTEM_CLOCK
+from config import load_config
+from database import get_session
+from notify import notify_pomodoro_work_end, notify_pomodoro_break_end
+from pomodoro import PhaseScheduler, emit_phase
+from hooks import kick, next_retry
+from state import load_timers, get_state_version
+
+PID_FILE = Path(__file__).parent / "data" / "daemon.pid"
+POLL_SECONDS = 1.0
+# How often to look for hook deliveries whose retry has come due
+HOOK_CHECK_SECONDS = 30.0
+
+
+def daemon_running() -> bool:
+    try:
+        pid = int(PID_FILE.read_text())
+        os.kill(pid, 0)
+    except (FileNotFoundError, ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        # Exists but belongs to someone else
+        return True
+    return True
+
+
+def announce(task: str | None, phase_name: str) -> None:
+    if phase_name == "work":
+        notify_pomodoro_break_end(task)
+    else:
+        notify_pomodoro_work_end(task)
+
+
+def run_daemon(clock: Clock = SYSTEM_CLOCK, on_phase=None) -> None:
+    """Serve phase notifications until interrupted.
+
+    `on_phase(timer_id, task, phase)` is called for each phase change,
+    e.g. to print it.
+    """
+    PID_FILE.parent.mkdir(exist_ok=True)
+    PID_FILE.write_text(str(os.getpid()))
+    # Leave through the finally below on `kill` as well as Ctrl+C
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    scheduler = PhaseScheduler()
+    version = -1
+    tasks: dict[int, str] = {}
+    hooks_checked = 0.0
+    try:
+        while True:
+            current = get_state_version()
+            if current != version:
+                version = current
+                cfg = load_config()
+                scheduler.cfg = cfg.pomodoro
+                scheduler.load(load_timers(), clock)
+
+            for timer_id, state, phase in scheduler.pop_due(clock):
+                if state.session_id not in tasks:
+                    session = get_session(state.session_id)
+                    tasks[state.session_id] = session.task if session else None
+                task = tasks[state.session_id]
+                announce(task, phase.name)
+                emit_phase(timer_id, state, phase)
+                if on_phase:
+                    on_phase(timer_id, task, phase)
+
+            # A worker exits when delivery fails; restart it once a retry is due
+            if cfg.hooks and time.monotonic() - hooks_checked >= HOOK_CHECK_SECONDS:
+                hooks_checked = time.monotonic()
+                due = next_retry(cfg.hooks)
+                if due is not None and due <= time.time():
+                    kick()
+
+            wait = POLL_SECONDS
+            deadline = scheduler.next_deadline()
+            if deadline is not None:
+                wait = min(wait, max(0.0, (deadline - clock.now()).total_seconds()))
+            clock.sleep(wait)
+    finally:
+        if PID_FILE.exists() and PID_FILE.read_text() == str(os.getpid()):
+            PID_FILE.unlink()
@@ -1,44 +1,674 @@
+import sqlite3
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, DateTime
+from typing import Callable, Iterator
+from sqlalchemy import (
+    create_engine, event, inspect, Column, ForeignKey, Index, Integer, MetaData, String, Table,
+    bindparam, func, select, type_coerce, union_all, update,
+)
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.orm import declarative_base, sessionmaker
-from models import StudySession
+from sqlalchemy.types import TypeDecorator
+from models import StudySession, SessionFilter
+from filters import filter_terms
+import paths
 
-DATA_DIR = Path(__file__).parent / "data"
+DATA_DIR = Path(paths.DATA_DIR)
 DATA_DIR.mkdir(exist_ok=True)
-DB_PATH = DATA_DIR / "cybersyn.db"
+DB_PATH = Path(paths.DB_PATH)
+ARCHIVE_DIR = Path(paths.ARCHIVE_DIR)
 
 Base = declarative_base()
 
 
+class EpochDateTime(TypeDecorator):
+    """A datetime stored as integer seconds since the Unix epoch.
+
+    Timezone policy: the database holds UTC epoch seconds. Naive datetimes
+    coming in are taken to be local time, and values read back are naive
+    local datetimes, matching what the rest of the app gets from
+    datetime.now(). Sub-second precision is dropped.
+    """
+
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, int):
+            return value
+        return int(value.timestamp())
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return datetime.fromtimestamp(value)
+
+
+class CategoryDB(Base):
+    __tablename__ = "categories"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String, nullable=False, unique=True)
+
+
+class CategoryAliasDB(Base):
+    """Old names of merged categories, still accepted wherever a category is given."""
+
+    __tablename__ = "category_aliases"
+
+    name = Column(String, primary_key=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
+
+
+class ModeDB(Base):
+    __tablename__ = "modes"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String, nullable=False, unique=True)
+
+
 class SessionDB(Base):
     __tablename__ = "sessions"
+    __table_args__ = (
+        Index("ix_sessions_start_time", "start_time"),
+        Index("ix_sessions_category_start_time", "category_id", "start_time"),
+        # Ids of archived sessions must not be handed out again
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     task = Column(String, nullable=False)
-    category = Column(String, nullable=False)
-    start_time = Column(DateTime, nullable=False)
-    end_time = Column(DateTime, nullable=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
+    start_time = Column(EpochDateTime, nullable=False)
+    end_time = Column(EpochDateTime, nullable=True)
     duration_seconds = Column(Integer, default=0)
-    mode = Column(String, nullable=False)
+    mode_id = Column(Integer, ForeignKey("modes.id"), nullable=False)
     school_week = Column(Integer, nullable=False)
     paused_seconds = Column(Integer, default=0)
 
 
+class SessionChangeDB(Base):
+    """Row-level change log for `sessions`, written by triggers.
+
+    Updates and deletes carry the row's values from before the change so
+    consumers holding derived state can retract what they counted.
+    """
+
+    __tablename__ = "session_changes"
+    # seq is the position consumers remember; it must never be handed out twice
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(Integer, nullable=False, index=True)
+    op = Column(String, nullable=False)
+    start_time = Column(EpochDateTime, nullable=True)
+    category_id = Column(Integer, nullable=True)
+    duration_seconds = Column(Integer, nullable=True)
+
+
+class DailyTotalDB(Base):
+    """Seconds per category and local day, kept current by triggers on `sessions`.
+
+    Lets goal progress be read from at most seven rows instead of a scan.
+    Covers the main database only; archived days drop out.
+    """
+
+    __tablename__ = "daily_totals"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    category_id = Column(Integer, primary_key=True)
+    # Days since the epoch in local time
+    day = Column(Integer, primary_key=True)
+    seconds = Column(Integer, nullable=False, default=0)
+
+
+class PomodoroPhaseDB(Base):
+    """Wall-clock intervals spent in each pomodoro phase.
+
+    A phase interrupted by a pause is recorded as one row per unpaused stretch.
+    """
+
+    __tablename__ = "pomodoro_phases"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(Integer, nullable=False, index=True)
+    phase = Column(String, nullable=False)
+    cycle = Column(Integer, nullable=False)
+    start_time = Column(EpochDateTime, nullable=False)
+    end_time = Column(EpochDateTime, nullable=False)
+
+
+CHANGE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS sessions_log_insert AFTER INSERT ON sessions
+    BEGIN
+        INSERT INTO session_changes (session_id, op) VALUES (NEW.id, 'insert');
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS sessions_log_update AFTER UPDATE ON sessions
+    BEGIN
+        INSERT INTO session_changes (session_id, op, start_time, category_id, duration_seconds)
+        VALUES (OLD.id, 'update', OLD.start_time, OLD.category_id, OLD.duration_seconds);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS sessions_log_delete AFTER DELETE ON sessions
+    BEGIN
+        INSERT INTO session_changes (session_id, op, start_time, category_id, duration_seconds)
+        VALUES (OLD.id, 'delete', OLD.start_time, OLD.category_id, OLD.duration_seconds);
+    END
+    """,
+]
+
+LOCAL_DAY = "(CAST(strftime('%s', {row}.start_time, 'unixepoch', 'localtime') AS INTEGER) / 86400)"
+
+
+def _add_to_totals(row: str, sign: str = "") -> str:
+    return f"""
+        INSERT INTO daily_totals (category_id, day, seconds)
+        VALUES ({row}.category_id, {LOCAL_DAY.format(row=row)}, {sign}coalesce({row}.duration_seconds, 0))
+        ON CONFLICT (category_id, day) DO UPDATE SET seconds = seconds + excluded.seconds;
+    """
+
+
+TOTAL_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS sessions_totals_insert AFTER INSERT ON sessions
+    BEGIN
+        {_add_to_totals("NEW")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS sessions_totals_update
+    AFTER UPDATE OF start_time, category_id, duration_seconds ON sessions
+    BEGIN
+        {_add_to_totals("OLD", "-")}
+        {_add_to_totals("NEW")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS sessions_totals_delete AFTER DELETE ON sessions
+    BEGIN
+        {_add_to_totals("OLD", "-")}
+    END
+    """,
+]
+
+# Full-text index over task and category. It keeps its own copy of the
+# text, keyed by session id as rowid; prefix indexes make `word*`
+# queries of two and three characters index lookups.
+SEARCH_TABLE = """
+CREATE VIRTUAL TABLE {schema}.sessions_fts USING fts5(
+    task, category, prefix='2 3', tokenize='unicode61 remove_diacritics 2'
+)
+"""
+
+SEARCH_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS sessions_fts_insert AFTER INSERT ON sessions
+    BEGIN
+        INSERT INTO sessions_fts (rowid, task, category)
+        VALUES (NEW.id, NEW.task, (SELECT name FROM categories WHERE id = NEW.category_id));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS sessions_fts_update AFTER UPDATE OF id, task, category_id ON sessions
+    BEGIN
+        DELETE FROM sessions_fts WHERE rowid = OLD.id;
+        INSERT INTO sessions_fts (rowid, task, category)
+        VALUES (NEW.id, NEW.task, (SELECT name FROM categories WHERE id = NEW.category_id));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS sessions_fts_delete AFTER DELETE ON sessions
+    BEGIN
+        DELETE FROM sessions_fts WHERE rowid = OLD.id;
+    END
+    """,
+]
+
+
+def _search_table(schema: str | None = None) -> Table:
+    """Query-side view of a schema's FTS table.
+
+    Kept out of Base.metadata so create_all never creates it as an
+    ordinary table. The hidden column named after the table is the left
+    side of MATCH.
+    """
+    return Table(
+        "sessions_fts",
+        MetaData(),
+        Column("rowid", Integer),
+        Column("task", String),
+        Column("category", String),
+        Column("rank"),
+        Column("sessions_fts"),
+        schema=schema,
+    )
+
+
+# Sessions moved out by `archive_sessions`, one file per local year. Ids
+# in them still refer to the categories and modes of the main database.
+ARCHIVE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS {schema}.sessions (
+        id INTEGER NOT NULL PRIMARY KEY,
+        task VARCHAR NOT NULL,
+        category_id INTEGER NOT NULL,
+        start_time INTEGER NOT NULL,
+        end_time INTEGER,
+        duration_seconds INTEGER,
+        mode_id INTEGER NOT NULL,
+        school_week INTEGER NOT NULL,
+        paused_seconds INTEGER
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS {schema}.ix_sessions_start_time ON sessions (start_time)",
+    "CREATE INDEX IF NOT EXISTS {schema}.ix_sessions_category_start_time ON sessions (category_id, start_time)",
+    """
+    CREATE TABLE IF NOT EXISTS {schema}.pomodoro_phases (
+        id INTEGER NOT NULL PRIMARY KEY,
+        session_id INTEGER NOT NULL,
+        phase VARCHAR NOT NULL,
+        cycle INTEGER NOT NULL,
+        start_time INTEGER NOT NULL,
+        end_time INTEGER NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS {schema}.ix_pomodoro_phases_session_id ON pomodoro_phases (session_id)",
+]
+
+# SQLite IN () lists are capped by the host parameter limit
+ID_CHUNK = 500
+
+
+def _migrate_epoch_timestamps(conn) -> None:
+    """Rewrite DateTime text columns as INTEGER UTC epoch seconds.
+
+    The old values are naive local times; SQLite's 'utc' modifier converts
+    them using the local timezone rules in force at each date.
+    """
+    for trigger in ("sessions_log_insert", "sessions_log_update", "sessions_log_delete"):
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+    for index in ("ix_sessions_start_time", "ix_sessions_category_start_time"):
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index}")
+
+    conn.exec_driver_sql("ALTER TABLE sessions RENAME TO _sessions_old")
+    conn.exec_driver_sql(
+        """
+        CREATE TABLE sessions (
+            id INTEGER NOT NULL PRIMARY KEY,
+            task VARCHAR NOT NULL,
+            category VARCHAR NOT NULL,
+            start_time INTEGER NOT NULL,
+            end_time INTEGER,
+            duration_seconds INTEGER,
+            mode VARCHAR NOT NULL,
+            school_week INTEGER NOT NULL,
+            paused_seconds INTEGER
+        )
+        """
+    )
+    conn.exec_driver_sql(
+        """
+        INSERT INTO sessions
+        SELECT id, task, category,
+               CAST(strftime('%s', start_time, 'utc') AS INTEGER),
+               CAST(strftime('%s', end_time, 'utc') AS INTEGER),
+               duration_seconds, mode, school_week, paused_seconds
+        FROM _sessions_old
+        """
+    )
+    conn.exec_driver_sql("DROP TABLE _sessions_old")
+
+    if inspect(conn).has_table("session_changes"):
+        conn.exec_driver_sql(
+            "UPDATE session_changes SET start_time = CAST(strftime('%s', start_time, 'utc') AS INTEGER)"
+        )
+
+
+def _migrate_lookup_tables(conn) -> None:
+    """Move category and mode strings into lookup tables referenced by id.
+
+    Change-log before-images are converted too, so aggregates built from
+    the log keep retracting what they counted.
+    """
+    for trigger in (
+        "sessions_log_insert", "sessions_log_update", "sessions_log_delete",
+        "sessions_fts_insert", "sessions_fts_update", "sessions_fts_delete",
+    ):
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+    for index in ("ix_sessions_start_time", "ix_sessions_category_start_time"):
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index}")
+
+    has_changes = inspect(conn).has_table("session_changes")
+    conn.exec_driver_sql(
+        "CREATE TABLE categories (id INTEGER NOT NULL PRIMARY KEY, name VARCHAR NOT NULL UNIQUE)"
+    )
+    conn.exec_driver_sql(
+        """
+        CREATE TABLE category_aliases (
+            name VARCHAR NOT NULL PRIMARY KEY,
+            category_id INTEGER NOT NULL REFERENCES categories (id)
+        )
+        """
+    )
+    conn.exec_driver_sql("CREATE TABLE modes (id INTEGER NOT NULL PRIMARY KEY, name VARCHAR NOT NULL UNIQUE)")
+
+    # Categories that only survive in change-log before-images need ids as well
+    deleted_categories = (
+        "UNION SELECT category FROM session_changes WHERE category IS NOT NULL" if has_changes else ""
+    )
+    conn.exec_driver_sql(
+        f"INSERT INTO categories (name) SELECT DISTINCT category FROM sessions {deleted_categories} ORDER BY 1"
+    )
+    conn.exec_driver_sql("INSERT INTO modes (name) SELECT DISTINCT mode FROM sessions ORDER BY 1")
+
+    conn.exec_driver_sql("ALTER TABLE sessions RENAME TO _sessions_old")
+    conn.exec_driver_sql(
+        """
+        CREATE TABLE sessions (
+            id INTEGER NOT NULL PRIMARY KEY,
+            task VARCHAR NOT NULL,
+            category_id INTEGER NOT NULL REFERENCES categories (id),
+            start_time INTEGER NOT NULL,
+            end_time INTEGER,
+            duration_seconds INTEGER,
+            mode_id INTEGER NOT NULL REFERENCES modes (id),
+            school_week INTEGER NOT NULL,
+            paused_seconds INTEGER
+        )
+        """
+    )
+    conn.exec_driver_sql(
+        """
+        INSERT INTO sessions
+        SELECT s.id, s.task, c.id, s.start_time, s.end_time, s.duration_seconds, m.id, s.school_week, s.paused_seconds
+        FROM _sessions_old s
+        JOIN categories c ON c.name = s.category
+        JOIN modes m ON m.name = s.mode
+        """
+    )
+    conn.exec_driver_sql("DROP TABLE _sessions_old")
+
+    if has_changes:
+        conn.exec_driver_sql("ALTER TABLE session_changes RENAME TO _session_changes_old")
+        conn.exec_driver_sql(
+            """
+            CREATE TABLE session_changes (
+                seq INTEGER NOT NULL PRIMARY KEY,
+                session_id INTEGER NOT NULL,
+                op VARCHAR NOT NULL,
+                start_time INTEGER,
+                category_id INTEGER,
+                duration_seconds INTEGER
+            )
+            """
+        )
+        conn.exec_driver_sql(
+            """
+            INSERT INTO session_changes
+            SELECT o.seq, o.session_id, o.op, o.start_time, c.id, o.duration_seconds
+            FROM _session_changes_old o
+            LEFT JOIN categories c ON c.name = o.category
+            """
+        )
+        conn.exec_driver_sql("DROP TABLE _session_changes_old")
+        conn.exec_driver_sql("CREATE INDEX ix_session_changes_session_id ON session_changes (session_id)")
+
+
+def _migrate_daily_totals(conn) -> None:
+    """Create the per-day category totals and count the existing sessions into them."""
+    conn.exec_driver_sql(
+        """
+        CREATE TABLE daily_totals (
+            category_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            seconds INTEGER NOT NULL,
+            PRIMARY KEY (category_id, day)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.exec_driver_sql(
+        f"""
+        INSERT INTO daily_totals (category_id, day, seconds)
+        SELECT category_id, {LOCAL_DAY.format(row="sessions")}, sum(coalesce(duration_seconds, 0))
+        FROM sessions GROUP BY 1, 2
+        """
+    )
+
+
+def _migrate_change_log_autoincrement(conn) -> None:
+    """Rebuild session_changes with AUTOINCREMENT so sequence numbers are never reused."""
+    if not inspect(conn).has_table("session_changes"):
+        return
+    for trigger in ("sessions_log_insert", "sessions_log_update", "sessions_log_delete"):
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+
+    conn.exec_driver_sql("ALTER TABLE session_changes RENAME TO _session_changes_old")
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_session_changes_session_id")
+    conn.exec_driver_sql(
+        """
+        CREATE TABLE session_changes (
+            seq INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+            session_id INTEGER NOT NULL,
+            op VARCHAR NOT NULL,
+            start_time INTEGER,
+            category_id INTEGER,
+            duration_seconds INTEGER
+        )
+        """
+    )
+    # Copying the rows with their seq starts sqlite_sequence at the old maximum
+    conn.exec_driver_sql("INSERT INTO session_changes SELECT * FROM _session_changes_old")
+    conn.exec_driver_sql("DROP TABLE _session_changes_old")
+    conn.exec_driver_sql("CREATE INDEX ix_session_changes_session_id ON session_changes (session_id)")
+
+
+def _migrate_session_autoincrement(conn) -> None:
+    """Rebuild sessions with AUTOINCREMENT, numbering new rows after every archived id."""
+    for trigger in (
+        "sessions_log_insert", "sessions_log_update", "sessions_log_delete",
+        "sessions_fts_insert", "sessions_fts_update", "sessions_fts_delete",
+        "sessions_totals_insert", "sessions_totals_update", "sessions_totals_delete",
+    ):
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+    for index in ("ix_sessions_start_time", "ix_sessions_category_start_time"):
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index}")
+
+    conn.exec_driver_sql("ALTER TABLE sessions RENAME TO _sessions_old")
+    conn.exec_driver_sql(
+        """
+        CREATE TABLE sessions (
+            id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+            task VARCHAR NOT NULL,
+            category_id INTEGER NOT NULL REFERENCES categories (id),
+            start_time INTEGER NOT NULL,
+            end_time INTEGER,
+            duration_seconds INTEGER,
+            mode_id INTEGER NOT NULL REFERENCES modes (id),
+            school_week INTEGER NOT NULL,
+            paused_seconds INTEGER
+        )
+        """
+    )
+    conn.exec_driver_sql("INSERT INTO sessions SELECT * FROM _sessions_old")
+    conn.exec_driver_sql("DROP TABLE _sessions_old")
+
+    # ATTACH is refused inside the migration's transaction, so the archives
+    # are read on their own connections
+    archived_max = 0
+    for path in ARCHIVE_DIR.glob("*.db"):
+        archive = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            archived_max = max(archived_max, archive.execute("SELECT coalesce(max(id), 0) FROM sessions").fetchone()[0])
+        finally:
+            archive.close()
+    conn.exec_driver_sql(
+        "UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = 'sessions'", (archived_max,)
+    )
+    conn.exec_driver_sql(
+        """
+        INSERT INTO sqlite_sequence (name, seq)
+        SELECT 'sessions', ? WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'sessions')
+        """,
+        (archived_max,),
+    )
+
+
+# Applied in order to databases created by older versions; the schema
+# version is kept in PRAGMA user_version
+MIGRATIONS = [
+    _migrate_epoch_timestamps,
+    _migrate_lookup_tables,
+    _migrate_daily_totals,
+    _migrate_change_log_autoincrement,
+    _migrate_session_autoincrement,
+]
+
+
+def _fill_search_index(conn, schema: str = "main") -> None:
+    conn.exec_driver_sql(f"DELETE FROM {schema}.sessions_fts")
+    conn.exec_driver_sql(
+        f"""
+        INSERT INTO {schema}.sessions_fts (rowid, task, category)
+        SELECT s.id, s.task, c.name FROM {schema}.sessions s JOIN main.categories c ON c.id = s.category_id
+        """
+    )
+    conn.exec_driver_sql(f"INSERT INTO {schema}.sessions_fts (sessions_fts) VALUES ('optimize')")
+
+
+def _init_schema(engine) -> None:
+    with engine.begin() as conn:
+        is_new = not inspect(conn).has_table("sessions")
+        version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+        if is_new:
+            # Lets `maintain` return free pages without a full VACUUM
+            conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        else:
+            for migration in MIGRATIONS[version:]:
+                migration(conn)
+        conn.exec_driver_sql(f"PRAGMA user_version = {len(MIGRATIONS)}")
+
+    Base.metadata.create_all(engine)
+
+
 engine = create_engine(f"sqlite:///{DB_PATH}")
-Base.metadata.create_all(engine)
+
+
+# pysqlite only opens transactions before DML, so DDL would autocommit.
+# Take over BEGIN so migrations and multi-statement writes are atomic.
+@event.listens_for(engine, "connect")
+def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+
+
+@event.listens_for(engine, "begin")
+def _begin_transaction(conn):
+    conn.exec_driver_sql("BEGIN")
+
+
+_init_schema(engine)
+# create_all skips indexes added to tables that already exist, and
+# migrations that rebuild a table leave its indexes behind
+for table in Base.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(engine, checkfirst=True)
+with engine.begin() as conn:
+    for trigger in CHANGE_TRIGGERS + TOTAL_TRIGGERS:
+        conn.exec_driver_sql(trigger)
+    if not inspect(conn).has_table("sessions_fts"):
+        conn.exec_driver_sql(SEARCH_TABLE.format(schema="main"))
+        _fill_search_index(conn)
+    for trigger in SEARCH_TRIGGERS:
+        conn.exec_driver_sql(trigger)
 Session = sessionmaker(bind=engine)
+sessions_fts = _search_table()
+
+
+class Lookup:
+    """In-process id <-> name map for a dictionary table.
+
+    Loaded on first use and reloaded on a miss, so names added by another
+    process are picked up without querying the table for every row.
+    Aliases resolve to the id of the name they stand for.
+    """
+
+    def __init__(self, table, alias_table=None) -> None:
+        self.table = table
+        self.alias_table = alias_table
+        self.names: dict[int, str] = {}
+        self.ids: dict[str, int] = {}
+        self.loaded = False
+
+    def load(self) -> None:
+        with engine.begin() as conn:
+            self.names = dict(conn.execute(select(self.table.id, self.table.name)).all())
+            self.ids = {name: id for id, name in self.names.items()}
+            if self.alias_table is not None:
+                aliases = conn.execute(select(self.alias_table.name, self.alias_table.category_id)).all()
+                for name, id in aliases:
+                    self.ids.setdefault(name, id)
+        self.loaded = True
+
+    def invalidate(self) -> None:
+        self.loaded = False
+
+    def name_of(self, id: int) -> str:
+        if not self.loaded or id not in self.names:
+            self.load()
+        return self.names[id]
+
+    def id_of(self, name: str) -> int | None:
+        if not self.loaded or name not in self.ids:
+            self.load()
+        return self.ids.get(name)
+
+    def get_or_create(self, db, name: str) -> int:
+        """The id for `name`, inserting it within `db`'s transaction if new."""
+        id = self.id_of(name)
+        if id is None:
+            db.execute(insert(self.table).values(name=name).on_conflict_do_nothing())
+            id = db.scalar(select(self.table.id).where(self.table.name == name))
+            # The insert is not committed yet; reload on next use
+            self.invalidate()
+        return id
+
+    def all_names(self) -> dict[int, str]:
+        if not self.loaded:
+            self.load()
+        return self.names
+
+
+categories = Lookup(CategoryDB, CategoryAliasDB)
+modes = Lookup(ModeDB)
+
+
+def _to_model(s: SessionDB) -> StudySession:
+    return StudySession(
+        id=s.id,
+        task=s.task,
+        category=categories.name_of(s.category_id),
+        start_time=s.start_time,
+        end_time=s.end_time,
+        duration_seconds=s.duration_seconds,
+        mode=modes.name_of(s.mode_id),
+        school_week=s.school_week,
+        paused_seconds=s.paused_seconds,
+    )
 
 
 def save_session(session: StudySession) -> int:
     db = Session()
     db_session = SessionDB(
         task=session.task,
-        category=session.category,
+        category_id=categories.get_or_create(db, session.category),
         start_time=session.start_time,
         end_time=session.end_time,
         duration_seconds=session.duration_seconds,
-        mode=session.mode,
+        mode_id=modes.get_or_create(db, session.mode),
         school_week=session.school_week,
         paused_seconds=session.paused_seconds,
     )
@@ -49,16 +679,45 @@ def save_session(session: StudySession) -> int:
     return session_id
 
 
-def update_session(session_id: int, **kwargs) -> None:
+def save_pomodoro_phases(session_id: int, phases: list[tuple[str, int, datetime, datetime]]) -> None:
     db = Session()
-    db_session = db.query(SessionDB).filter(SessionDB.id == session_id).first()
-    if db_session:
-        for key, value in kwargs.items():
-            setattr(db_session, key, value)
-        db.commit()
+    db.add_all(
+        PomodoroPhaseDB(
+            session_id=session_id,
+            phase=phase,
+            cycle=cycle,
+            start_time=start_time,
+            end_time=end_time,
+        )
+        for phase, cycle, start_time, end_time in phases
+    )
+    db.commit()
     db.close()
 
 
+def _resolve_names(db, values: dict) -> dict:
+    """Replace category and mode names with their ids, creating new ones."""
+    values = dict(values)
+    if "category" in values:
+        values["category_id"] = categories.get_or_create(db, values.pop("category"))
+    if "mode" in values:
+        values["mode_id"] = modes.get_or_create(db, values.pop("mode"))
+    return values
+
+
+def update_session(session_id: int, **kwargs) -> bool:
+    """Set fields of one session; returns False if no such session exists."""
+    db = Session()
+    try:
+        if db.get(SessionDB, session_id) is None:
+            return False
+        db.execute(update(SessionDB).where(SessionDB.id == session_id).values(**_resolve_names(db, kwargs)))
+        db.commit()
+        return True
+    finally:
+        db.close()
+
+
 def delete_session(session_id: int) -> bool:
     db = Session()
     db_session = db.query(SessionDB).filter(SessionDB.id == session_id).first()
@@ -77,34 +736,446 @@ def get_session(session_id: int) -> StudySession | None:
     db.close()
     if not db_session:
         return None
-    return StudySession(
-        id=db_session.id,
-        task=db_session.task,
-        category=db_session.category,
-        start_time=db_session.start_time,
-        end_time=db_session.end_time,
-        duration_seconds=db_session.duration_seconds,
-        mode=db_session.mode,
-        school_week=db_session.school_week,
-        paused_seconds=db_session.paused_seconds,
-    )
+    return _to_model(db_session)
 
 
-def get_all_sessions() -> list[StudySession]:
+def get_category_counts() -> list[tuple[str, int, list[str]]]:
+    """Every category with its session count, archived sessions included, and aliases, by name."""
+    counts: dict[int, int] = {}
+    aliases: dict[int, list[str]] = {}
+    for batch, (db, tables) in enumerate(_batched_reads(archive_years())):
+        if batch == 0:
+            for name, category_id in db.execute(
+                select(CategoryAliasDB.name, CategoryAliasDB.category_id).order_by(CategoryAliasDB.name)
+            ):
+                aliases.setdefault(category_id, []).append(name)
+            rows = db.execute(select(CategoryDB.id, CategoryDB.name).order_by(CategoryDB.name)).all()
+        for table in tables:
+            for category_id, count in db.execute(
+                select(table.c.category_id, func.count()).group_by(table.c.category_id)
+            ):
+                counts[category_id] = counts.get(category_id, 0) + count
+    return [(name, counts.get(id, 0), aliases.get(id, [])) for id, name in rows]
+
+
+def get_category_seconds(category: str, first_day: int, last_day: int) -> int:
+    """Total seconds in `category` over local days first_day..last_day, from the daily totals."""
+    category_id = categories.id_of(category)
+    if category_id is None:
+        return 0
     db = Session()
-    db_sessions = db.query(SessionDB).order_by(SessionDB.start_time.desc()).all()
-    db.close()
-    return [
-        StudySession(
-            id=s.id,
-            task=s.task,
-            category=s.category,
-            start_time=s.start_time,
-            end_time=s.end_time,
-            duration_seconds=s.duration_seconds,
-            mode=s.mode,
-            school_week=s.school_week,
-            paused_seconds=s.paused_seconds,
+    try:
+        return db.scalar(
+            select(func.coalesce(func.sum(DailyTotalDB.seconds), 0)).where(
+                DailyTotalDB.category_id == category_id,
+                DailyTotalDB.day.between(first_day, last_day),
+            )
         )
-        for s in db_sessions
+    finally:
+        db.close()
+
+
+def archive_years() -> list[int]:
+    return sorted(int(path.stem) for path in ARCHIVE_DIR.glob("*.db") if path.stem.isdigit())
+
+
+def _archive_schema(year: int) -> str:
+    return f"archive_{year}"
+
+
+_archive_tables: dict[int, Table] = {}
+
+
+def _archive_table(year: int) -> Table:
+    """`sessions` in an attached archive, with the same column types."""
+    if year not in _archive_tables:
+        _archive_tables[year] = SessionDB.__table__.to_metadata(
+            MetaData(), schema=_archive_schema(year), referred_schema_fn=lambda *args: None
+        )
+    return _archive_tables[year]
+
+
+def _overlapping_years(session_filter: SessionFilter | None) -> list[int]:
+    """Archived years that can hold sessions matching the filter's date range."""
+    since = session_filter.since if session_filter else None
+    until = session_filter.until if session_filter else None
+    return [
+        year
+        for year in archive_years()
+        if (since is None or since < datetime(year + 1, 1, 1)) and (until is None or until > datetime(year, 1, 1))
     ]
+
+
+def _session_tables(years: list[int]) -> list[Table]:
+    return [SessionDB.__table__] + [_archive_table(year) for year in years]
+
+
+def _union(selects: list):
+    return selects[0] if len(selects) == 1 else union_all(*selects)
+
+
+@contextmanager
+def _session_with_archives(years: list[int]):
+    """A Session whose connection has the archives of `years` attached.
+
+    DETACH is refused inside a transaction, so attachments are adjusted on
+    the raw connection before the Session begins one. They stay with the
+    pooled connection until a later call needs a different set. SQLite
+    allows at most 10 attached databases by default, so callers pass at
+    most ATTACH_BATCH years.
+    """
+    with engine.connect() as conn:
+        raw = conn.connection.driver_connection
+        attached = conn.connection.info.setdefault("archives", set())
+        for year in attached - set(years):
+            raw.execute(f"DETACH DATABASE {_archive_schema(year)}")
+            attached.discard(year)
+        for year in set(years) - attached:
+            raw.execute(f"ATTACH DATABASE ? AS {_archive_schema(year)}", (str(ARCHIVE_DIR / f"{year}.db"),))
+            attached.add(year)
+
+        db = Session(bind=conn)
+        try:
+            yield db
+        finally:
+            db.close()
+
+
+def _year_batches(years: list[int]) -> list[list[int]]:
+    return [years[i:i + paths.ATTACH_BATCH] for i in range(0, len(years), paths.ATTACH_BATCH)]
+
+
+def _batched_reads(
+    years: list[int],
+    main_alone: bool = False,
+    stop: Callable[[list[int]], bool] | None = None,
+) -> Iterator[tuple]:
+    """Sessions and tables covering `sessions` and the archives of `years`, a batch at a time.
+
+    The first pair includes the main table, and its read transaction stays
+    open while later batches are read on other connections. Archives are
+    only written together with the main database, so every batch sees the
+    same data. With `main_alone` the main table is read by itself first;
+    `stop(years)` is asked before each further batch whether to end early.
+    """
+    batches = _year_batches(years)
+    first = [] if main_alone or not batches else batches.pop(0)
+    with _session_with_archives(first) as db:
+        yield db, _session_tables(first)
+        for batch in batches:
+            if stop is not None and stop(batch):
+                return
+            with _session_with_archives(batch) as more:
+                yield more, [_archive_table(year) for year in batch]
+
+
+def archive_sessions(before: datetime) -> dict[int, int]:
+    """Move sessions that started before `before` into per-year archive files.
+
+    Their pomodoro phases and search index entries move with them. The
+    change-log rows written by the deletes are dropped in the same
+    transaction, so derived aggregates keep counting archived sessions.
+    Each batch of ATTACH_BATCH years is one transaction. Returns the
+    number of sessions moved per year.
+    """
+    year_of = "CAST(strftime('%Y', start_time, 'unixepoch', 'localtime') AS INTEGER)"
+    movable = "start_time < :cutoff"
+    params = {"cutoff": int(before.timestamp())}
+
+    with engine.connect() as conn:
+        years = [
+            year for (year,) in conn.exec_driver_sql(f"SELECT DISTINCT {year_of} FROM sessions WHERE {movable}", params)
+        ]
+    if not years:
+        return {}
+
+    ARCHIVE_DIR.mkdir(exist_ok=True)
+    moved = {}
+    for batch in _year_batches(years):
+        with _session_with_archives(batch) as db:
+            conn = db.connection()
+            last_change = conn.scalar(select(func.coalesce(func.max(SessionChangeDB.seq), 0)))
+            for year in batch:
+                schema = _archive_schema(year)
+                for statement in ARCHIVE_SCHEMA:
+                    conn.exec_driver_sql(statement.format(schema=schema))
+                if not inspect(conn).has_table("sessions_fts", schema=schema):
+                    conn.exec_driver_sql(SEARCH_TABLE.format(schema=schema))
+
+                selected = f"SELECT id FROM main.sessions WHERE {movable} AND {year_of} = :year"
+                params_year = {**params, "year": year}
+                moved[year] = conn.exec_driver_sql(
+                    f"INSERT INTO {schema}.sessions SELECT * FROM main.sessions WHERE id IN ({selected})", params_year
+                ).rowcount
+                conn.exec_driver_sql(
+                    f"""
+                    INSERT INTO {schema}.pomodoro_phases (session_id, phase, cycle, start_time, end_time)
+                    SELECT session_id, phase, cycle, start_time, end_time
+                    FROM main.pomodoro_phases WHERE session_id IN ({selected})
+                    """,
+                    params_year,
+                )
+                conn.exec_driver_sql(
+                    f"""
+                    INSERT INTO {schema}.sessions_fts (rowid, task, category)
+                    SELECT s.id, s.task, c.name FROM main.sessions s JOIN main.categories c ON c.id = s.category_id
+                    WHERE s.id IN ({selected})
+                    """,
+                    params_year,
+                )
+                conn.exec_driver_sql(f"DELETE FROM main.pomodoro_phases WHERE session_id IN ({selected})", params_year)
+                conn.exec_driver_sql(f"DELETE FROM main.sessions WHERE id IN ({selected})", params_year)
+
+            conn.execute(SessionChangeDB.__table__.delete().where(SessionChangeDB.seq > last_change))
+            db.commit()
+    return moved
+
+
+def merge_categories(source: str, target: str) -> int:
+    """Fold category `source` into `target` and keep `source` as an alias.
+
+    `target` is created if it does not exist yet, which makes this a
+    rename. Sessions are moved with a single UPDATE, so the change log and
+    search index triggers see every moved row. Archives have no triggers;
+    if archived sessions move, a 'reset' entry in the change log makes
+    aggregates rebuild. Archives are updated ATTACH_BATCH years per
+    transaction, and `source` is only removed with the last batch, so an
+    interrupted merge can be run again. Returns the number moved.
+    """
+    categories.load()
+    source_id = categories.id_of(source)
+    if source_id is None:
+        raise ValueError(f"Category '{source}' not found.")
+    if categories.names[source_id] != source:
+        raise ValueError(f"'{source}' is already an alias of '{categories.names[source_id]}'.")
+
+    batches = _year_batches(archive_years()) or [[]]
+    moved = 0
+    try:
+        for batch in batches:
+            with _session_with_archives(batch) as db:
+                target_id = categories.get_or_create(db, target)
+                if target_id == source_id:
+                    raise ValueError("Cannot merge a category into itself.")
+
+                archived = 0
+                for year in batch:
+                    table = _archive_table(year)
+                    fts = _search_table(table.schema)
+                    moving = select(table.c.id).where(table.c.category_id == source_id)
+                    db.execute(update(fts).where(fts.c.rowid.in_(moving)).values(category=target))
+                    archived += db.execute(
+                        update(table).where(table.c.category_id == source_id).values(category_id=target_id)
+                    ).rowcount
+                if archived:
+                    db.add(SessionChangeDB(session_id=0, op="reset"))
+                moved += archived
+
+                if batch is batches[-1]:
+                    moved += db.execute(
+                        update(SessionDB).where(SessionDB.category_id == source_id).values(category_id=target_id)
+                    ).rowcount
+                    db.execute(
+                        update(CategoryAliasDB)
+                        .where(CategoryAliasDB.category_id == source_id)
+                        .values(category_id=target_id)
+                    )
+                    db.add(CategoryAliasDB(name=source, category_id=target_id))
+                    db.query(CategoryDB).filter(CategoryDB.id == source_id).delete()
+                db.commit()
+    finally:
+        categories.invalidate()
+    return moved
+
+
+# Fields bulk updates can set; times and durations are edited one session at a time
+BULK_FIELDS = {"task", "category", "mode", "school_week"}
+
+
+def update_sessions(session_filter: SessionFilter, values: dict, dry_run: bool = False) -> int:
+    """Set fields on every session matching the filter; returns how many match.
+
+    The main table gets one UPDATE, so the change log and search index
+    triggers keep aggregates and search in step. Archives the date range
+    reaches get the same UPDATE plus one on their search index, and a
+    'reset' entry if any archived row changed. The main table and the
+    first ATTACH_BATCH archive years commit in one transaction, further
+    years one batch per transaction. With `dry_run` the matches are only
+    counted.
+    """
+    unknown = set(values) - BULK_FIELDS
+    if unknown:
+        raise ValueError(f"Cannot bulk update {', '.join(sorted(unknown))}.")
+
+    years = _overlapping_years(session_filter)
+    if dry_run:
+        return sum(
+            db.scalar(select(func.count()).select_from(table).where(*compile_filter(session_filter, table)))
+            for db, tables in _batched_reads(years)
+            for table in tables
+        )
+
+    changed = 0
+    for i, batch in enumerate(_year_batches(years) or [[]]):
+        with _session_with_archives(batch) as db:
+            resolved = _resolve_names(db, values)
+            if i == 0:
+                changed += db.execute(
+                    update(SessionDB).where(*compile_filter(session_filter)).values(**resolved)
+                ).rowcount
+
+            archived = 0
+            searchable = {}
+            if "task" in values:
+                searchable["task"] = values["task"]
+            if "category" in values:
+                # An alias is indexed under the name it stands for
+                searchable["category"] = db.scalar(
+                    select(CategoryDB.name).where(CategoryDB.id == resolved["category_id"])
+                )
+            for year in batch:
+                table = _archive_table(year)
+                clauses = compile_filter(session_filter, table)
+                if searchable:
+                    fts = _search_table(table.schema)
+                    db.execute(
+                        update(fts).where(fts.c.rowid.in_(select(table.c.id).where(*clauses))).values(**searchable)
+                    )
+                archived += db.execute(update(table).where(*clauses).values(**resolved)).rowcount
+            if archived:
+                db.add(SessionChangeDB(session_id=0, op="reset"))
+            changed += archived
+            db.commit()
+    return changed
+
+
+def repair_sessions(deletes: list[int], updates: dict[int, dict]) -> None:
+    """Delete sessions and set fields on others, in one transaction.
+
+    Deletes go out in id chunks and updates as one executemany per set of
+    changed fields; the triggers keep the change log, search index and
+    daily totals in step. `updates` maps an id to raw column values.
+    """
+    t = SessionDB.__table__
+    groups: dict[tuple, list[dict]] = {}
+    for session_id, values in updates.items():
+        groups.setdefault(tuple(sorted(values)), []).append(
+            {"b_id": session_id, **{f"b_{k}": v for k, v in values.items()}}
+        )
+
+    with engine.begin() as conn:
+        for i in range(0, len(deletes), ID_CHUNK):
+            chunk = deletes[i:i + ID_CHUNK]
+            conn.execute(PomodoroPhaseDB.__table__.delete().where(PomodoroPhaseDB.session_id.in_(chunk)))
+            conn.execute(t.delete().where(t.c.id.in_(chunk)))
+        for fields, params in groups.items():
+            statement = update(t).where(t.c.id == bindparam("b_id")).values({k: bindparam(f"b_{k}") for k in fields})
+            conn.execute(statement, params)
+
+
+def compile_filter(session_filter: SessionFilter | None, table: Table | None = None) -> list:
+    """Translate a SessionFilter into WHERE clauses on `sessions` or an archived copy."""
+    c = (SessionDB.__table__ if table is None else table).c
+    clauses = []
+    for field, op, value in filter_terms(session_filter):
+        if field == "category":
+            names = union_all(
+                select(CategoryDB.id).where(CategoryDB.name == value),
+                select(CategoryAliasDB.category_id).where(CategoryAliasDB.name == value),
+            )
+            clauses.append(c.category_id.in_(names))
+        elif field == "mode":
+            clauses.append(c.mode_id.in_(select(ModeDB.id).where(ModeDB.name == value)))
+        elif field == "start_time":
+            start_time = type_coerce(c.start_time, Integer)
+            clauses.append(start_time >= value if op == ">=" else start_time < value)
+        else:
+            clauses.append(c[field] == value)
+    return clauses
+
+
+def get_sessions(session_filter: SessionFilter | None = None, limit: int | None = None) -> list[StudySession]:
+    """Matching sessions, newest first, including archives the date range reaches.
+
+    With a limit the main table is read first, then archives newest year
+    first, stopping once no older year can hold a session that would
+    make the cut.
+    """
+    rows = []
+
+    def enough(batch: list[int]) -> bool:
+        return limit is not None and len(rows) >= limit and rows[limit - 1].start_time >= datetime(batch[0] + 1, 1, 1)
+
+    years = sorted(_overlapping_years(session_filter), reverse=True)
+    for db, tables in _batched_reads(years, main_alone=limit is not None, stop=enough):
+        query = _union([select(table).where(*compile_filter(session_filter, table)) for table in tables])
+        rows.extend(db.execute(query.order_by(query.selected_columns.start_time.desc()).limit(limit)).all())
+        rows.sort(key=lambda row: row.start_time, reverse=True)
+        if limit is not None:
+            del rows[limit:]
+    return [_to_model(s) for s in rows]
+
+
+def search_sessions(
+    query: str,
+    session_filter: SessionFilter | None = None,
+    limit: int = 20,
+    offset: int = 0,
+) -> tuple[int, list[StudySession]]:
+    """Sessions whose task or category match an FTS5 query, best match first.
+
+    `query` uses FTS5 syntax: `word*` for prefixes, `"two words"` for
+    phrases, AND/OR/NOT, and `category:word` to search one column.
+    Archives the filter's date range reaches are searched too.
+    Returns the total number of matches along with the requested page.
+    Raises sqlalchemy.exc.OperationalError on a malformed query.
+    """
+    total, rows = 0, []
+    for db, tables in _batched_reads(_overlapping_years(session_filter)):
+        parts = []
+        for i, table in enumerate(tables):
+            fts = _search_table(table.schema)
+            # Materialized so the full-text query runs once; otherwise the
+            # planner may drive the join from a filter index and re-run MATCH
+            # per row
+            hits = (
+                select(fts.c.rowid, fts.c.rank)
+                .where(fts.c.sessions_fts.op("MATCH")(query))
+                .cte(f"hits_{i}")
+                .prefix_with("MATERIALIZED")
+            )
+            parts.append(
+                select(table, hits.c.rank)
+                .join(hits, hits.c.rowid == table.c.id)
+                .where(*compile_filter(session_filter, table))
+            )
+        matches = _union(parts).subquery()
+
+        # Every batch supplies its best offset + limit rows, each carrying the batch's match count
+        batch_rows = db.execute(
+            select(matches, func.count().over())
+            .order_by(matches.c.rank, matches.c.start_time.desc())
+            .limit(offset + limit)
+        ).all()
+        total += batch_rows[0][-1] if batch_rows else 0
+        rows.extend(batch_rows)
+
+    rows.sort(key=lambda row: (row.rank, -row.start_time.timestamp()))
+    return total, [_to_model(s) for s in rows[offset:offset + limit]]
+
+
+def rebuild_search_index() -> int:
+    """Repopulate the full-text indexes from `sessions` and the archives; returns the row count."""
+    total = 0
+    for i, batch in enumerate(_year_batches(archive_years()) or [[]]):
+        with _session_with_archives(batch) as db:
+            conn = db.connection()
+            for schema in (["main"] if i == 0 else []) + [_archive_schema(year) for year in batch]:
+                _fill_search_index(conn, schema)
+                total += conn.exec_driver_sql(f"SELECT count(*) FROM {schema}.sessions_fts").scalar()
+            db.commit()
+    return total
+
+
+def get_all_sessions() -> list[StudySession]:
+    return get_sessions()
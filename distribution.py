@@ -0,0 +1,107 @@
+"""Streaks, percentiles and weekday totals for `stats --detailed`.
+
+Kept apart from `stats` so the commands that only format durations do
+not import NumPy.
+"""
+from dataclasses import dataclass
+from datetime import date
+import numpy as np
+
+
+@dataclass
+class DetailedStats:
+    """Streak and distribution figures; durations in seconds, days as dates."""
+
+    sessions: int
+    total_seconds: int
+    active_days: int
+    span_days: int
+    current_streak: int
+    longest_streak: int
+    longest_streak_start: date
+    median_seconds: float
+    p90_seconds: float
+    longest_seconds: int
+    # (category, sessions, seconds, median, p90), largest total first
+    by_category: list[tuple[str, int, int, float, float]]
+    # Monday first
+    weekday_seconds: list[int]
+    weekday_counts: list[int]
+
+
+def _streaks(active, today: int) -> tuple[int, int, int]:
+    """Current streak, longest streak and its first day, from sorted unique day numbers.
+
+    The current streak still counts if the last active day was yesterday.
+    """
+    breaks = np.flatnonzero(np.diff(active) != 1)
+    starts = np.concatenate(([0], breaks + 1))
+    lengths = np.diff(np.concatenate((starts, [len(active)])))
+    longest = int(np.argmax(lengths))
+    current = int(lengths[-1]) if active[-1] >= today - 1 else 0
+    return current, int(lengths[longest]), int(active[starts[longest]])
+
+
+def _group_percentiles(groups, values, q: float):
+    """The q-th percentile (0-100) of `values` within each group, linearly interpolated.
+
+    Groups are small integer codes; one sort serves every group.
+    """
+    order = np.lexsort((values, groups))
+    sorted_values = values[order].astype(np.float64)
+    counts = np.bincount(groups)
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    position = (counts - 1) * q / 100
+    lo = np.floor(position).astype(np.int64)
+    hi = np.ceil(position).astype(np.int64)
+    low_values = sorted_values[offsets + lo]
+    return low_values + (sorted_values[offsets + hi] - low_values) * (position - lo)
+
+
+def get_detailed_stats(columns: dict, today: date) -> DetailedStats | None:
+    """Streaks, percentiles and weekday distribution from query columns.
+
+    `columns` is the dict returned by `Query.to_numpy()`, sorted by start
+    time. Everything is computed with array operations over day numbers
+    and durations, in time linear in the number of sessions plus one sort.
+    """
+    durations = columns["duration_seconds"]
+    if not len(durations):
+        return None
+
+    days = columns["start_time"].astype("datetime64[D]").astype(np.int64)
+    active = np.unique(days)
+    today_number = int(np.datetime64(today, "D").astype(np.int64))
+    current, longest, longest_start = _streaks(active, today_number)
+
+    median, p90 = np.percentile(durations, [50, 90])
+
+    # Group on the category ids; names are looked up once per category
+    _, first, groups = np.unique(columns["category_id"], return_index=True, return_inverse=True)
+    names = columns["category"][first]
+    counts = np.bincount(groups)
+    seconds = np.bincount(groups, weights=durations).astype(np.int64)
+    medians = _group_percentiles(groups, durations, 50)
+    p90s = _group_percentiles(groups, durations, 90)
+    by_category = [
+        (str(names[i]), int(counts[i]), int(seconds[i]), float(medians[i]), float(p90s[i]))
+        for i in np.argsort(-seconds, kind="stable")
+    ]
+
+    # Day 0 (1970-01-01) was a Thursday
+    weekdays = (days + 3) % 7
+    return DetailedStats(
+        sessions=len(durations),
+        total_seconds=int(durations.sum()),
+        active_days=len(active),
+        span_days=int(active[-1] - active[0] + 1),
+        current_streak=current,
+        longest_streak=longest,
+        longest_streak_start=np.datetime64(longest_start, "D").item(),
+        median_seconds=float(median),
+        p90_seconds=float(p90),
+        longest_seconds=int(durations.max()),
+        by_category=by_category,
+        weekday_seconds=np.bincount(weekdays, weights=durations, minlength=7).astype(np.int64).tolist(),
+        weekday_counts=np.bincount(weekdays, minlength=7).tolist(),
+    )
@@ -0,0 +1,289 @@
+"""Integrity checks over the sessions in the main database.
+
+Rows are read once with sqlite3, already in start-time order from the
+start_time index, straight into int64 columns, and each check is a
+vectorised pass over them. Duplicates share a start, so task names are
+only read for sessions whose start repeats, and the groups come from one
+lexsort over the key columns. Overlaps
+come from a sweep line: after sorting by start, a session overlaps an
+earlier one exactly when it starts before the latest end seen so far, so
+a running maximum over the end times finds every overlap in one pass
+instead of comparing all pairs. Several timers can run at once, so two
+timed sessions overlapping is normal use; only overlaps with a manual
+session are reported. Archived sessions are not checked.
+"""
+import heapq
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+import numpy as np
+from database import DB_PATH, ID_CHUNK, repair_sessions, modes
+from query import read_int_columns
+from state import load_timers, edit_timers
+
+# Longer sessions are reported as implausible, not changed
+MAX_SESSION_HOURS = 16
+# Allowed gap between end - start and duration + pauses, for rounding
+CLOCK_SLACK = 60
+# Stored in place of NULL end times (sessions still running)
+OPEN = np.iinfo(np.int64).min
+
+# Columns read for the checks: name and SQL over `sessions`; times are epoch seconds
+CHECK_COLUMNS = [
+    ("id", "id"),
+    ("category_id", "category_id"),
+    ("mode_id", "mode_id"),
+    ("start", "start_time"),
+    ("end", f"coalesce(end_time, {OPEN})"),
+    ("duration", "coalesce(duration_seconds, 0)"),
+    ("paused", "coalesce(paused_seconds, 0)"),
+    # The start in local time, for day boundaries
+    ("local_start", "CAST(strftime('%s', start_time, 'unixepoch', 'localtime') AS INTEGER)"),
+]
+
+KINDS = {
+    "duplicate": "Duplicate sessions",
+    "open": "Open sessions without a running timer",
+    "stale-timer": "Timers whose session is missing or finished",
+    "negative": "Negative durations",
+    "mismatch": "End times that disagree with the duration",
+    "implausible": "Implausible durations",
+    "overlap": "Sessions overlapping a manual session",
+}
+
+
+@dataclass
+class Issue:
+    kind: str
+    session_id: int
+    detail: str
+    fixable: bool = False
+
+
+@dataclass
+class Checkup:
+    checked: int = 0
+    issues: list[Issue] = field(default_factory=list)
+    # Planned fixes: sessions to delete, raw column values to set, timers to drop
+    deletes: list[int] = field(default_factory=list)
+    updates: dict[int, dict] = field(default_factory=dict)
+    stale_timers: list[str] = field(default_factory=list)
+
+    @property
+    def fix_count(self) -> int:
+        return len(self.deletes) + len(self.updates) + len(self.stale_timers)
+
+
+def _fmt(epoch: int) -> str:
+    return datetime.fromtimestamp(int(epoch)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _local_strings(epochs: np.ndarray, offsets: np.ndarray) -> list[str]:
+    """_fmt for many epochs at once, given their local UTC offsets."""
+    local = (epochs + offsets).astype("datetime64[s]")
+    return [text.replace("T", " ") for text in np.datetime_as_string(local).tolist()]
+
+
+def _read_columns(conn: sqlite3.Connection) -> dict[str, np.ndarray]:
+    """Every session in the main database as int64 columns, ordered by start time then id."""
+    select = ", ".join(expr for _, expr in CHECK_COLUMNS)
+    cursor = conn.execute(f"SELECT {select} FROM sessions ORDER BY start_time, id")
+    return dict(zip((name for name, _ in CHECK_COLUMNS), read_int_columns(cursor, len(CHECK_COLUMNS))))
+
+
+def _task_codes(conn: sqlite3.Connection, ids: np.ndarray) -> np.ndarray:
+    """A code per session in `ids`, equal exactly when the task names are."""
+    tasks = {}
+    id_list = ids.tolist()
+    for i in range(0, len(id_list), ID_CHUNK):
+        chunk = id_list[i:i + ID_CHUNK]
+        placeholders = ", ".join("?" * len(chunk))
+        tasks.update(conn.execute(f"SELECT id, task FROM sessions WHERE id IN ({placeholders})", chunk))
+    codes = {}
+    return np.array([codes.setdefault(tasks[id], len(codes)) for id in id_list], dtype=np.int64)
+
+
+def _find_duplicates(columns: dict[str, np.ndarray], task_code: np.ndarray, rows: np.ndarray):
+    """Rows among `rows` repeating an earlier session field for field, and the row each repeats.
+
+    A lexsort over the key columns puts equal sessions next to each other,
+    lowest id first, so the first of each run is the one kept.
+    """
+    if not len(rows):
+        return rows, rows
+    keys = [columns[name][rows] for name in ("start", "end", "category_id", "mode_id", "duration", "paused")]
+    keys.append(task_code)
+    # lexsort sorts by its last key first; ties fall back to the id
+    order = np.lexsort([columns["id"][rows]] + keys[::-1])
+    stacked = np.stack([key[order] for key in keys])
+    repeat = np.concatenate([[False], (stacked[:, 1:] == stacked[:, :-1]).all(axis=0)])
+    first = np.maximum.accumulate(np.where(repeat, 0, np.arange(len(order))))
+    sorted_rows = rows[order]
+    later, kept = sorted_rows[repeat], sorted_rows[first[repeat]]
+    by_row = np.argsort(later)
+    return later[by_row], kept[by_row]
+
+
+def _find_overlaps(start: np.ndarray, end: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Sweep over intervals sorted by start.
+
+    Returns the indices that start before an earlier interval has ended,
+    the index of the earlier interval reaching furthest for each, and the
+    running maximum end (the sweep line) at every index.
+    """
+    reach = np.maximum.accumulate(end)
+    # Last index that set the running maximum; the maximum only grows, so
+    # a running maximum over those indices tracks it
+    holder = np.maximum.accumulate(np.where(end == reach, np.arange(len(end)), 0))
+    later = np.flatnonzero(start[1:] < reach[:-1]) + 1
+    return later, holder[later - 1], reach
+
+
+def _shift_manual(
+    start: np.ndarray, end: np.ndarray, offset: np.ndarray, manual: np.ndarray, reach: np.ndarray, days: np.ndarray
+) -> dict[int, int]:
+    """New starts that move overlapping manual sessions to after the sessions before them.
+
+    Manual sessions carry a made-up noon start, so only their time of day
+    is moved, and only within the same local day. Each affected day is
+    swept again with a heap ordered by start: a moved session goes back
+    on the heap at its new start, so it is checked against whatever it
+    now comes after. Returns new starts by row index.
+    """
+    local_day = (start + offset) // 86400
+    shifts = {}
+    line = np.iinfo(np.int64).min
+    for day in days:
+        lo, hi = np.searchsorted(local_day, [day, day + 1])
+        # A session moved on an earlier day may now reach into this one
+        line = max(line, int(reach[lo - 1])) if lo else line
+        # Rows are sorted by start, which already makes a valid heap
+        heap = [(int(start[i]), i) for i in range(lo, hi)]
+        while heap:
+            s, i = heapq.heappop(heap)
+            if manual[i] and s < line and (line + offset[i]) // 86400 == day:
+                shifts[i] = line
+                heapq.heappush(heap, (line, i))
+                continue
+            line = max(line, s + int(end[i] - start[i]))
+    return shifts
+
+
+def run_checks(now: int | None = None) -> Checkup:
+    """Find problems and plan a fix for each one that has a safe fix."""
+    now = int(time.time()) if now is None else now
+    conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+    try:
+        # One read transaction, so the task names match the columns
+        conn.execute("BEGIN")
+        columns = _read_columns(conn)
+        start = columns["start"]
+        # Duplicates share a start, so only runs of equal starts need comparing
+        same = start[1:] == start[:-1]
+        candidates = np.flatnonzero(
+            (np.concatenate([[False], same]) | np.concatenate([same, [False]])) & (columns["end"] != OPEN)
+        )
+        task_code = _task_codes(conn, columns["id"][candidates])
+    finally:
+        conn.close()
+
+    ids = columns["id"]
+    checkup = Checkup(checked=len(ids))
+    timers = load_timers()
+    live = {state.session_id for state in timers.values()}
+
+    is_open = columns["end"] == OPEN
+    end = np.where(is_open, start, columns["end"])
+    duration, paused = columns["duration"], columns["paused"]
+    offset = columns["local_start"] - start
+    manual_id = modes.id_of("manual")
+    manual = columns["mode_id"] == manual_id if manual_id is not None else np.zeros(len(ids), bool)
+    issues, updates = checkup.issues, checkup.updates
+
+    duplicate = np.zeros(len(ids), dtype=bool)
+    copies, kept = _find_duplicates(columns, task_code, candidates)
+    duplicate[copies] = True
+    checkup.deletes.extend(ids[copies].tolist())
+    for session_id, first_id in zip(ids[copies].tolist(), ids[kept].tolist()):
+        issues.append(Issue("duplicate", session_id, f"same as #{first_id}", True))
+
+    for i in np.flatnonzero(is_open).tolist():
+        session_id, started = int(ids[i]), int(start[i])
+        if session_id in live:
+            end[i] = max(now, started)
+        else:
+            updates[session_id] = {"end_time": started, "duration_seconds": 0, "paused_seconds": 0}
+            issues.append(Issue("open", session_id, f"started {_fmt(started)}; will be closed with zero duration", True))
+
+    open_ids = set(ids[is_open].tolist())
+    for timer_id, state in timers.items():
+        if state.session_id not in open_ids:
+            checkup.stale_timers.append(timer_id)
+            issues.append(Issue("stale-timer", state.session_id, f"timer '{timer_id}'; will be dropped", True))
+
+    closed = ~is_open & ~duplicate
+    for i in np.flatnonzero(closed & ((duration < 0) | (paused < 0) | (end < start))).tolist():
+        session_id = int(ids[i])
+        if end[i] >= start[i]:
+            span = int(end[i] - start[i])
+            fixed_paused = min(max(int(paused[i]), 0), span)
+            values = {"duration_seconds": span - fixed_paused, "paused_seconds": fixed_paused}
+        else:
+            values = {"duration_seconds": max(int(duration[i]), 0), "paused_seconds": max(int(paused[i]), 0)}
+            values["end_time"] = int(start[i]) + values["duration_seconds"] + values["paused_seconds"]
+            end[i] = values["end_time"]
+        updates[session_id] = values
+        issues.append(Issue("negative", session_id, f"duration {duration[i]}s, paused {paused[i]}s", True))
+
+    consistent = closed & (duration >= 0) & (paused >= 0) & (end >= start)
+    gap = end - start - duration - paused
+    for i in np.flatnonzero(consistent & (np.abs(gap) > CLOCK_SLACK)).tolist():
+        session_id = int(ids[i])
+        updates[session_id] = {"end_time": int(start[i] + duration[i] + paused[i])}
+        end[i] = updates[session_id]["end_time"]
+        issues.append(Issue("mismatch", session_id, f"end is {gap[i]:+d}s from start + duration + pauses", True))
+
+    length = np.where(is_open, end - start, duration)
+    # Manual sessions added for today start at noon, possibly still ahead
+    future = (start > now + CLOCK_SLACK) & ~manual
+    for i in np.flatnonzero(~duplicate & ((length > MAX_SESSION_HOURS * 3600) | future)).tolist():
+        detail = "starts in the future" if future[i] else f"{length[i] / 3600:.1f} hours long"
+        issues.append(Issue("implausible", int(ids[i]), detail))
+
+    rows = np.flatnonzero(~duplicate)
+    later, earlier, reach = _find_overlaps(start[rows], end[rows])
+    overlapping_days = np.unique(((start + offset)[rows] // 86400)[later[manual[rows][later]]])
+    shifts = _shift_manual(start[rows], end[rows], offset[rows], manual[rows], reach, overlapping_days)
+    for k, new_start in shifts.items():
+        i = rows[k]
+        values = updates.setdefault(int(ids[i]), {})
+        values["start_time"] = new_start
+        values["end_time"] = new_start + int(end[i] - start[i])
+    # A timed session is only reported where it starts inside a manual one
+    # that is not being moved, found by a second sweep over those ends alone
+    settled = manual[rows].copy()
+    settled[list(shifts)] = False
+    timed_later, manual_earlier, _ = _find_overlaps(start[rows], np.where(settled, end[rows], OPEN))
+    after_manual = manual[rows][later]
+    later = np.concatenate([later[after_manual], timed_later[~manual[rows][timed_later]]])
+    earlier = np.concatenate([earlier[after_manual], manual_earlier[~manual[rows][timed_later]]])
+    order = np.argsort(later, kind="stable")
+    later, earlier = later[order], earlier[order]
+    # Formatted in bulk; there can be many overlaps
+    i, other = rows[later], rows[earlier]
+    starts_at = _local_strings(start[i], offset[i])
+    ends_at = _local_strings(end[other], offset[other])
+    for n, (k, j) in enumerate(zip(later.tolist(), earlier.tolist())):
+        note = f"; will move to {_fmt(shifts[k])}" if k in shifts else ""
+        detail = f"starts {starts_at[n]}, before #{ids[rows[j]]} ends at {ends_at[n]}{note}"
+        issues.append(Issue("overlap", int(ids[rows[k]]), detail, k in shifts))
+    return checkup
+
+
+def apply_fixes(checkup: Checkup) -> None:
+    repair_sessions(checkup.deletes, checkup.updates)
+    if checkup.stale_timers:
+        with edit_timers() as timers:
+            for timer_id in checkup.stale_timers:
+                timers.pop(timer_id, None)
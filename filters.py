@@ -0,0 +1,60 @@
+"""What a SessionFilter selects, shared by every reader of sessions.
+
+`filter_terms` is the one place the filter's fields become conditions.
+`database.compile_filter` turns them into SQLAlchemy clauses on
+`sessions` or an archived copy, `filter_sql` into a WHERE clause for the
+sqlite3 readers, and the snapshot evaluates the same terms on its
+arrays. Nothing is imported beyond the models, so the sqlite3 readers
+never load SQLAlchemy.
+"""
+from models import SessionFilter
+
+# Ids a category or mode name stands for; a category name also matches through its aliases
+_IDS_NAMED = {
+    "category": "SELECT id FROM categories WHERE name = :{param}"
+    " UNION ALL SELECT category_id FROM category_aliases WHERE name = :{param}",
+    "mode": "SELECT id FROM modes WHERE name = :{param}",
+}
+_OPERATORS = {">=": ">=", "<": "<", "==": "="}
+
+
+def filter_terms(session_filter: SessionFilter | None) -> list[tuple[str, str, object]]:
+    """(field, operator, value) conditions that all have to hold.
+
+    Times are UTC epoch seconds compared with `start_time`, `until`
+    exclusive. Category and mode stay names; a category name also matches
+    through its aliases, and an unknown name matches nothing.
+    """
+    if session_filter is None:
+        return []
+
+    f = session_filter
+    terms = []
+    if f.since is not None:
+        terms.append(("start_time", ">=", int(f.since.timestamp())))
+    if f.until is not None:
+        terms.append(("start_time", "<", int(f.until.timestamp())))
+    if f.category is not None:
+        terms.append(("category", "==", f.category))
+    if f.mode is not None:
+        terms.append(("mode", "==", f.mode))
+    if f.school_week is not None:
+        terms.append(("school_week", "==", f.school_week))
+    if f.task is not None:
+        terms.append(("task", "==", f.task))
+    return terms
+
+
+def filter_sql(session_filter: SessionFilter | None) -> tuple[str, dict]:
+    """The filter as an SQL condition on unqualified session columns, with named parameters."""
+    conditions, params = [], {}
+    for n, (field, op, value) in enumerate(filter_terms(session_filter)):
+        param = f"{field}_{n}"
+        params[param] = value
+        if field in _IDS_NAMED:
+            conditions.append(f"{field}_id IN ({_IDS_NAMED[field].format(param=param)})")
+        else:
+            conditions.append(f"{field} {_OPERATORS[op]} :{param}")
+    if not conditions:
+        return "1", {}
+    return " AND ".join(conditions), params
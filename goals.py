@@ -0,0 +1,57 @@
+"""Progress towards per-category goals set in the config.
+
+Recorded time comes from the trigger-maintained daily totals, so a
+goal costs one indexed read of at most seven rows however long the
+history is. Time on running timers is added on top by the caller.
+"""
+from datetime import date, timedelta
+from typing import NamedTuple
+from config import Goal
+from database import get_category_seconds
+
+EPOCH = date(1970, 1, 1)
+
+
+class GoalProgress(NamedTuple):
+    goal: Goal
+    seconds: int
+
+    @property
+    def target_seconds(self) -> int:
+        return int(self.goal.hours * 3600)
+
+    @property
+    def fraction(self) -> float:
+        return self.seconds / self.target_seconds if self.target_seconds else 1.0
+
+    @property
+    def reached(self) -> bool:
+        return self.seconds >= self.target_seconds
+
+
+def period_days(period: str, today: date) -> tuple[int, int]:
+    """First and last local day number of the day or week containing `today`."""
+    first = today - timedelta(days=today.weekday()) if period == "week" else today
+    last = first + timedelta(days=6) if period == "week" else today
+    return (first - EPOCH).days, (last - EPOCH).days
+
+
+def get_goal_progress(
+    goals: list[Goal], today: date, live: dict[str, int] | None = None
+) -> list[GoalProgress]:
+    """Recorded seconds this day or week for each goal, plus `live` seconds per category."""
+    live = live or {}
+    progress = []
+    for goal in goals:
+        recorded = get_category_seconds(goal.category, *period_days(goal.period, today))
+        progress.append(GoalProgress(goal, recorded + live.get(goal.category, 0)))
+    return progress
+
+
+def newly_reached(before: list[GoalProgress], after: list[GoalProgress]) -> list[Goal]:
+    return [a.goal for b, a in zip(before, after) if a.reached and not b.reached]
+
+
+def progress_bar(progress: GoalProgress, width: int = 20) -> str:
+    filled = min(width, int(progress.fraction * width))
+    return "█" * filled + "░" * (width - filled)
@@ -0,0 +1,294 @@
+"""Session and pomodoro events delivered to user commands and webhooks.
+
+`emit` appends an event to a small SQLite queue (data/hooks.db) and
+returns; it never waits on a hook. Delivery happens in a separate worker
+process that `emit` starts when none is running: for each configured
+hook it sends the events after that hook's cursor in batches, moves the
+cursor on success, and on failure backs off exponentially before trying
+that hook again. Events stay in the queue until every hook has them, so
+nothing is lost if a collector is down or the machine restarts; the
+daemon restarts the worker when a retry comes due.
+
+    python hooks.py        # deliver what is due, as the worker does
+"""
+import fcntl
+import json
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterator
+from config import Hook, load_config
+import paths
+
+DATA_DIR = Path(paths.DATA_DIR)
+QUEUE_PATH = DATA_DIR / "hooks.db"
+LOCK_FILE = DATA_DIR / "hooks.lock"
+
+EVENTS = ["session.started", "session.paused", "session.resumed", "session.stopped", "pomodoro.phase", "hook.test"]
+
+BATCH_SIZE = 100
+TIMEOUT_SECONDS = 10
+# Retry delays double from BACKOFF_BASE up to BACKOFF_MAX, with some jitter
+BACKOFF_BASE = 5.0
+BACKOFF_MAX = 3600.0
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at REAL NOT NULL,
+        name TEXT NOT NULL,
+        data TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS cursors (
+        hook TEXT PRIMARY KEY,
+        last_id INTEGER NOT NULL DEFAULT 0,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt REAL NOT NULL DEFAULT 0,
+        last_error TEXT
+    )
+    """,
+]
+
+
+class DeliveryError(Exception):
+    pass
+
+
+def _connect() -> sqlite3.Connection:
+    DATA_DIR.mkdir(exist_ok=True)
+    conn = sqlite3.connect(QUEUE_PATH, isolation_level=None, timeout=5)
+    # Readers never block the CLI appending an event
+    conn.execute("PRAGMA journal_mode = WAL")
+    for statement in SCHEMA:
+        conn.execute(statement)
+    return conn
+
+
+def emit(name: str, data: dict | Callable[[], dict], hooks: list[Hook] | None = None) -> None:
+    """Queue an event for every hook subscribed to it and make sure a worker delivers it.
+
+    `data` may be a function building the payload; it is only called when
+    some hook wants the event.
+    """
+    hooks = load_config().hooks if hooks is None else hooks
+    if not any(hook.wants(name) for hook in hooks):
+        return
+    if callable(data):
+        data = data()
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT INTO events (created_at, name, data) VALUES (?, ?, ?)", (time.time(), name, json.dumps(data))
+        )
+    finally:
+        conn.close()
+    kick()
+
+
+@contextmanager
+def _worker_lock(block: bool) -> Iterator[bool]:
+    """Hold the delivery lock; yields False if another worker has it and `block` is off."""
+    DATA_DIR.mkdir(exist_ok=True)
+    with open(LOCK_FILE, "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | (0 if block else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+
+
+def kick() -> None:
+    """Start a detached delivery worker unless one is already running."""
+    with _worker_lock(block=False) as free:
+        if not free:
+            return
+    subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve())],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def _send(hook: Hook, events: list[dict]) -> None:
+    if hook.command:
+        lines = "".join(json.dumps(event) + "\n" for event in events)
+        try:
+            result = subprocess.run(
+                hook.command, shell=True, input=lines, text=True, capture_output=True, timeout=TIMEOUT_SECONDS
+            )
+        except subprocess.TimeoutExpired:
+            raise DeliveryError(f"timed out after {TIMEOUT_SECONDS}s")
+        if result.returncode != 0:
+            stderr = result.stderr.strip()[:200]
+            raise DeliveryError(f"exit status {result.returncode}" + (f": {stderr}" if stderr else ""))
+        return
+
+    request = urllib.request.Request(
+        hook.url,
+        data=json.dumps({"events": events}).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=TIMEOUT_SECONDS) as response:
+            response.read()
+    except urllib.error.HTTPError as e:
+        raise DeliveryError(f"HTTP {e.code}")
+    except (urllib.error.URLError, OSError) as e:
+        raise DeliveryError(str(getattr(e, "reason", e)))
+
+
+def backoff(attempts: int) -> float:
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempts - 1))
+    return delay * random.uniform(0.9, 1.1)
+
+
+def _deliver_hook(conn: sqlite3.Connection, hook: Hook, now: float) -> int:
+    """Send everything due for one hook, a batch at a time; returns the events delivered."""
+    conn.execute("INSERT OR IGNORE INTO cursors (hook) VALUES (?)", (hook.key,))
+    last_id, attempts, next_attempt = conn.execute(
+        "SELECT last_id, attempts, next_attempt FROM cursors WHERE hook = ?", (hook.key,)
+    ).fetchone()
+    if next_attempt > now:
+        return 0
+
+    delivered = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, created_at, name, data FROM events WHERE id > ? ORDER BY id LIMIT ?", (last_id, BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            return delivered
+        batch = [
+            {"id": id, "event": name, "time": datetime.fromtimestamp(created_at).isoformat(), "data": json.loads(data)}
+            for id, created_at, name, data in rows
+            if hook.wants(name)
+        ]
+        try:
+            if batch:
+                _send(hook, batch)
+        except DeliveryError as e:
+            attempts += 1
+            conn.execute(
+                "UPDATE cursors SET attempts = ?, next_attempt = ?, last_error = ? WHERE hook = ?",
+                (attempts, now + backoff(attempts), str(e), hook.key),
+            )
+            return delivered
+        last_id = rows[-1][0]
+        attempts = 0
+        delivered += len(batch)
+        conn.execute(
+            "UPDATE cursors SET last_id = ?, attempts = 0, next_attempt = 0, last_error = NULL WHERE hook = ?",
+            (last_id, hook.key),
+        )
+
+
+def _prune(conn: sqlite3.Connection, hooks: list[Hook]) -> None:
+    """Drop events every configured hook has received."""
+    if not hooks:
+        conn.execute("DELETE FROM events")
+        return
+    keys = sorted({hook.key for hook in hooks})
+    placeholders = ", ".join("?" * len(keys))
+    conn.execute(
+        f"""
+        DELETE FROM events WHERE id <= (
+            SELECT CASE WHEN count(*) = ? THEN min(last_id) ELSE 0 END FROM cursors WHERE hook IN ({placeholders})
+        )
+        """,
+        (len(keys), *keys),
+    )
+
+
+def deliver_due(hooks: list[Hook] | None = None, now: float | None = None) -> int:
+    """One delivery pass over every hook not waiting out a backoff; returns the events delivered."""
+    hooks = load_config().hooks if hooks is None else hooks
+    now = time.time() if now is None else now
+    conn = _connect()
+    try:
+        delivered = sum(_deliver_hook(conn, hook, now) for hook in hooks)
+        _prune(conn, hooks)
+        return delivered
+    finally:
+        conn.close()
+
+
+def deliver(hooks: list[Hook] | None = None, force: bool = False) -> int:
+    """Deliver in the foreground, after any running worker; `force` skips backoff waits."""
+    with _worker_lock(block=True):
+        return deliver_due(hooks, now=float("inf") if force else None)
+
+
+def forget(key: str, hooks: list[Hook]) -> None:
+    """Drop a removed hook's cursor, and the events only it was still waiting for."""
+    conn = _connect()
+    try:
+        conn.execute("DELETE FROM cursors WHERE hook = ?", (key,))
+        _prune(conn, hooks)
+    finally:
+        conn.close()
+
+
+def pending(hooks: list[Hook] | None = None) -> dict[str, tuple[int, int, float, str | None]]:
+    """Per hook key: events waiting, failed attempts, next retry time and the last error."""
+    hooks = load_config().hooks if hooks is None else hooks
+    conn = _connect()
+    try:
+        result = {}
+        for hook in hooks:
+            row = conn.execute(
+                "SELECT last_id, attempts, next_attempt, last_error FROM cursors WHERE hook = ?", (hook.key,)
+            ).fetchone() or (0, 0, 0.0, None)
+            names = conn.execute("SELECT name FROM events WHERE id > ?", (row[0],)).fetchall()
+            result[hook.key] = (sum(hook.wants(name) for name, in names), *row[1:])
+        return result
+    finally:
+        conn.close()
+
+
+def next_retry(hooks: list[Hook]) -> float | None:
+    """Earliest time a hook with undelivered events may be retried, or None if nothing waits."""
+    times = [next_attempt for waiting, _, next_attempt, _ in pending(hooks).values() if waiting]
+    return min(times) if times else None
+
+
+def start_cursor(hook: Hook) -> None:
+    """Make a newly added hook start from the next event rather than from what is queued."""
+    conn = _connect()
+    try:
+        last = conn.execute("SELECT coalesce(max(id), 0) FROM events").fetchone()[0]
+        conn.execute("INSERT OR REPLACE INTO cursors (hook, last_id) VALUES (?, ?)", (hook.key, last))
+    finally:
+        conn.close()
+
+
+def run_worker() -> None:
+    """Deliver until nothing is due, then exit; retries are left to the next kick."""
+    while True:
+        with _worker_lock(block=False) as free:
+            if not free:
+                return
+            while deliver_due():
+                pass
+        # An event queued while the lock was held found it taken and started
+        # no worker; look once more now that it is free
+        due = next_retry(load_config().hooks)
+        if due is None or due > time.time():
+            return
+
+
+if __name__ == "__main__":
+    run_worker()
@@ -0,0 +1,200 @@
+"""Keeping the database file compact and its query statistics current.
+
+Deleted and rewritten rows leave free pages behind, and without ANALYZE
+the query planner guesses at index selectivity. `maintain` switches the
+database to incremental auto-vacuum (a one-off full VACUUM for databases
+created before it was the default), hands free pages back to the file
+system a bounded number of pages at a time, refreshes planner statistics
+and merges the search index. Each step is its own short transaction, so
+a timer can write in between.
+
+It also prunes the change log. Entries are dropped once every reader of
+the log has read past them: the chart aggregates (data/aggregates.npz)
+and sync's stamping of changed sessions. The newest entry they have read
+stays, so the log's position never moves back.
+
+Runs are logged in the `maintenance_runs` table with the change-log
+position at the time, which is how `run_if_due` counts writes since the
+last run. Like `backup`, this uses sqlite3 directly.
+"""
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+import paths
+
+DB_PATH = Path(paths.DB_PATH)
+AGGREGATES_FILE = Path(paths.AGGREGATES_FILE)
+
+# Free pages returned per incremental_vacuum step; 256 pages is 1 MB at the default page size
+STEP_PAGES = 256
+STEP_PAUSE = 0.01
+# Rows ANALYZE samples per index; approximate statistics are enough for the planner
+ANALYSIS_LIMIT = 1000
+AUTO_VACUUM_MODES = {0: "none", 1: "full", 2: "incremental"}
+
+LOG_TABLE = """
+CREATE TABLE IF NOT EXISTS maintenance_runs (
+    id INTEGER PRIMARY KEY,
+    run_at INTEGER NOT NULL,
+    change_seq INTEGER NOT NULL,
+    size_before INTEGER NOT NULL,
+    size_after INTEGER NOT NULL
+)
+"""
+
+
+@dataclass
+class FileStats:
+    page_size: int
+    page_count: int
+    free_pages: int
+    auto_vacuum: str
+
+    @property
+    def size(self) -> int:
+        return self.page_size * self.page_count
+
+
+@dataclass
+class MaintenanceReport:
+    before: FileStats
+    after: FileStats
+    # True when this run switched the database to incremental auto-vacuum
+    converted: bool
+    analyzed: str
+    seconds: float
+    # Change-log entries dropped because every reader had read past them
+    pruned: int = 0
+
+
+def _connect() -> sqlite3.Connection:
+    if not DB_PATH.exists():
+        raise ValueError(f"No database at {DB_PATH}")
+    # Autocommit, so each statement below is its own transaction
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout = 5000")
+    return conn
+
+
+def _pragma(conn: sqlite3.Connection, name: str) -> int:
+    return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+def file_stats(conn: sqlite3.Connection) -> FileStats:
+    return FileStats(
+        page_size=_pragma(conn, "page_size"),
+        page_count=_pragma(conn, "page_count"),
+        free_pages=_pragma(conn, "freelist_count"),
+        auto_vacuum=AUTO_VACUUM_MODES.get(_pragma(conn, "auto_vacuum"), "unknown"),
+    )
+
+
+def _change_seq(conn: sqlite3.Connection) -> int:
+    try:
+        return conn.execute("SELECT coalesce(max(seq), 0) FROM session_changes").fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+
+
+def _has_table(conn: sqlite3.Connection, name: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone() is not None
+
+
+def _aggregates_change() -> int | None:
+    """Change-log position the saved chart aggregates reflect, or None when there are none to keep up."""
+    if not AGGREGATES_FILE.exists():
+        return None
+    import numpy as np
+
+    try:
+        with np.load(AGGREGATES_FILE) as data:
+            return int(data["last_change"])
+    except (OSError, ValueError, KeyError):
+        # Unreadable aggregates are rebuilt from the sessions, not the log
+        return None
+
+
+def _consumed_change(conn: sqlite3.Connection) -> int:
+    """The lowest change-log position any reader of the log still needs entries after."""
+    positions = [_change_seq(conn)]
+    aggregates = _aggregates_change()
+    if aggregates is not None:
+        positions.append(aggregates)
+    if _has_table(conn, "sync_state"):
+        state = dict(conn.execute("SELECT key, value FROM sync_state").fetchall())
+        # Until sync is set up nothing is stamped from the log
+        if state.get("device") is not None:
+            positions.append(int(state.get("stamped_seq", 0)))
+    return min(positions)
+
+
+def prune_changes(conn: sqlite3.Connection) -> int:
+    """Drop change-log entries every reader has read past; returns how many."""
+    if not _has_table(conn, "session_changes"):
+        return 0
+    return conn.execute("DELETE FROM session_changes WHERE seq < ?", (_consumed_change(conn),)).rowcount
+
+
+def run_maintenance(step_pages: int = STEP_PAGES) -> MaintenanceReport:
+    started = time.monotonic()
+    conn = _connect()
+    try:
+        before = file_stats(conn)
+        # Pruned first, so the vacuum returns the freed pages
+        pruned = prune_changes(conn)
+
+        # Merging the search index rewrites it, so it goes before the vacuum
+        if _has_table(conn, "sessions_fts"):
+            conn.execute("INSERT INTO sessions_fts (sessions_fts) VALUES ('optimize')")
+
+        conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+        if _has_table(conn, "sqlite_stat1"):
+            # Re-analyzes only the tables whose statistics have gone stale
+            conn.execute("PRAGMA optimize").fetchall()
+            analyzed = "optimize"
+        else:
+            conn.execute("ANALYZE")
+            analyzed = "analyze"
+
+        converted = before.auto_vacuum != "incremental"
+        if converted:
+            # The mode of an existing database only changes with a full rebuild
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        else:
+            while _pragma(conn, "freelist_count"):
+                # executescript runs the pragma to completion; execute() stops after one page
+                conn.executescript(f"PRAGMA incremental_vacuum({step_pages});")
+                time.sleep(STEP_PAUSE)
+
+        after = file_stats(conn)
+        conn.execute(LOG_TABLE)
+        conn.execute(
+            "INSERT INTO maintenance_runs (run_at, change_seq, size_before, size_after) VALUES (?, ?, ?, ?)",
+            (int(time.time()), _change_seq(conn), before.size, after.size),
+        )
+    finally:
+        conn.close()
+    return MaintenanceReport(before, after, converted, analyzed, time.monotonic() - started, pruned)
+
+
+def writes_since_last_run() -> int:
+    """Session writes logged since the last maintenance run, or ever if it never ran."""
+    conn = _connect()
+    try:
+        current = _change_seq(conn)
+        if not _has_table(conn, "maintenance_runs"):
+            return current
+        last = conn.execute("SELECT change_seq FROM maintenance_runs ORDER BY id DESC LIMIT 1").fetchone()
+        # Archiving drops change-log entries, so the log can end before the last run's position
+        return current - last[0] if last and current >= last[0] else current
+    finally:
+        conn.close()
+
+
+def run_if_due(every: int) -> MaintenanceReport | None:
+    """Run maintenance once `every` session writes have been logged since the last run."""
+    if every <= 0 or not DB_PATH.exists() or writes_since_last_run() < every:
+        return None
+    return run_maintenance()
@@ -21,6 +21,27 @@ class TimerState(BaseModel):
     mode: str = "stopwatch"
     started_at: datetime | None = None
     paused_at: datetime | None = None
-    pomodoro_phase: str | None = None
-    pomodoro_cycle: int = 0
-    phase_started_at: datetime | None = None
+    # Total length of finished pauses
+    paused_seconds: float = 0.0
+    # Active seconds already written to the pomodoro phase log
+    phase_logged_seconds: float = 0.0
+
+
+class TimerStore(BaseModel):
+    """Every running timer, keyed by timer id."""
+
+    timers: dict[str, TimerState] = {}
+
+
+class SessionFilter(BaseModel):
+    """Which sessions a read command covers. `until` is exclusive."""
+
+    since: datetime | None = None
+    until: datetime | None = None
+    category: str | None = None
+    mode: str | None = None
+    school_week: int | None = None
+    task: str | None = None
+
+    def is_empty(self) -> bool:
+        return all(value is None for value in self.model_dump().values())
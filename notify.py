@@ -49,17 +49,25 @@ def notify_session_stopped(task: str, duration: str) -> None:
     )
 
 
-def notify_pomodoro_work_end() -> None:
+def notify_pomodoro_work_end(task: str | None = None) -> None:
     send_notification(
         "Cybersyn - Time for a Break!",
-        "Work session complete. Take a break.",
+        f"{task}: work session complete. Take a break." if task else "Work session complete. Take a break.",
         urgency="critical",
     )
 
 
-def notify_pomodoro_break_end() -> None:
+def notify_pomodoro_break_end(task: str | None = None) -> None:
     send_notification(
         "Cybersyn - Break Over",
-        "Time to get back to work!",
+        f"{task}: time to get back to work!" if task else "Time to get back to work!",
         urgency="critical",
     )
+
+
+def notify_goal_reached(category: str, hours: float, period: str) -> None:
+    send_notification(
+        "Cybersyn - Goal Reached",
+        f"{category}: {hours:g}h this {period}",
+        urgency="normal",
+    )
@@ -0,0 +1,14 @@
+"""Where cybersyn keeps its data.
+
+Only `os` is imported, so the completion path can use these without
+loading pathlib; other modules wrap them in `Path`. Importing this module
+creates nothing.
+"""
+import os
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+DB_PATH = os.path.join(DATA_DIR, "cybersyn.db")
+ARCHIVE_DIR = os.path.join(DATA_DIR, "archive")
+AGGREGATES_FILE = os.path.join(DATA_DIR, "aggregates.npz")
+# Archive years attached to one connection at a time; SQLite allows 10 attached databases
+ATTACH_BATCH = 9
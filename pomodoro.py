@@ -1,10 +1,25 @@
-from datetime import datetime
+import heapq
+from datetime import datetime, timedelta
+from typing import Iterator, NamedTuple
 from models import TimerState
-from config import load_config
+from config import PomodoroConfig, load_config
+from state import get_elapsed_seconds
+from hooks import emit
+from clock import Clock, SYSTEM_CLOCK
 
 
-def get_phase_duration(phase: str) -> int:
-    cfg = load_config()
+class Phase(NamedTuple):
+    """One phase of the repeating work/break cycle, in active (unpaused) seconds."""
+
+    name: str
+    cycle: int
+    index: int
+    start: float
+    end: float
+
+
+def get_phase_duration(phase: str, cfg: PomodoroConfig | None = None) -> int:
+    cfg = cfg or load_config().pomodoro
     if phase == "work":
         return cfg.work_minutes * 60
     elif phase == "short_break":
@@ -14,46 +29,152 @@ def get_phase_duration(phase: str) -> int:
     return 0
 
 
-def get_phase_remaining(state: TimerState) -> int:
-    if not state.phase_started_at or not state.pomodoro_phase:
-        return 0
-
-    elapsed = (datetime.now() - state.phase_started_at).total_seconds()
-    duration = get_phase_duration(state.pomodoro_phase)
-    remaining = int(duration - elapsed)
+def get_phase_at(active_seconds: float, cfg: PomodoroConfig | None = None) -> Phase:
+    """The phase a session is in after `active_seconds` of unpaused time.
 
-    return max(0, remaining)
+    A set is `sessions_until_long_break` work periods separated by short
+    breaks and closed by a long break. The set repeats, so the phase is
+    found by arithmetic on the offset into the current set instead of by
+    stepping through every transition.
+    """
+    cfg = cfg or load_config().pomodoro
+    work = cfg.work_minutes * 60
+    short_break = cfg.short_break_minutes * 60
+    long_break = cfg.long_break_minutes * 60
+    sessions = max(1, cfg.sessions_until_long_break)
 
+    period = sessions * work + (sessions - 1) * short_break + long_break
+    if period <= 0 or work + short_break <= 0:
+        return Phase("work", 0, 0, 0.0, float("inf"))
 
-def should_transition(state: TimerState) -> bool:
-    return get_phase_remaining(state) <= 0
+    completed_sets, offset = divmod(max(0.0, active_seconds), period)
+    set_start = completed_sets * period
+    set_index = int(completed_sets) * 2 * sessions
 
+    i = min(int(offset // (work + short_break)), sessions - 1)
+    work_start = set_start + i * (work + short_break)
+    if offset - i * (work + short_break) < work:
+        return Phase("work", i, set_index + 2 * i, work_start, work_start + work)
 
-def get_next_phase(state: TimerState) -> tuple[str, int]:
-    cfg = load_config()
+    break_start = work_start + work
+    if i < sessions - 1:
+        return Phase("short_break", i + 1, set_index + 2 * i + 1, break_start, break_start + short_break)
+    return Phase("long_break", 0, set_index + 2 * i + 1, break_start, break_start + long_break)
 
-    if state.pomodoro_phase == "work":
-        new_cycle = state.pomodoro_cycle + 1
-        if new_cycle >= cfg.sessions_until_long_break:
-            return "long_break", 0
-        else:
-            return "short_break", new_cycle
 
-    return "work", state.pomodoro_cycle
+def get_current_phase(
+    state: TimerState, cfg: PomodoroConfig | None = None, clock: Clock = SYSTEM_CLOCK
+) -> Phase:
+    return get_phase_at(get_elapsed_seconds(state, clock), cfg)
 
 
-def transition_phase(state: TimerState) -> tuple[TimerState, str]:
-    next_phase, next_cycle = get_next_phase(state)
-
-    state.pomodoro_phase = next_phase
-    state.pomodoro_cycle = next_cycle
-    state.phase_started_at = datetime.now()
+def get_phase_remaining(
+    state: TimerState, cfg: PomodoroConfig | None = None, clock: Clock = SYSTEM_CLOCK
+) -> int:
+    if state.mode != "pomodoro" or not state.started_at:
+        return 0
 
-    return state, next_phase
+    elapsed = get_elapsed_seconds(state, clock)
+    phase = get_phase_at(elapsed, cfg)
+    return max(0, int(phase.end - elapsed))
+
+
+def iter_phases(start: float, end: float, cfg: PomodoroConfig | None = None) -> Iterator[tuple[Phase, float, float]]:
+    """Phases overlapping [start, end) of active time, clipped to that range."""
+    cfg = cfg or load_config().pomodoro
+    phase = get_phase_at(start, cfg)
+    while phase.start < end:
+        yield phase, max(phase.start, start), min(phase.end, end)
+        phase = get_phase_at(phase.end, cfg)
+
+
+def pending_phases(
+    state: TimerState, cfg: PomodoroConfig | None = None, clock: Clock = SYSTEM_CLOCK
+) -> list[tuple[str, int, datetime, datetime]]:
+    """Phase intervals not yet written to the log, as wall-clock times.
+
+    `started_at` is shifted forward on every resume, so active offsets
+    since the last pause map exactly onto wall-clock time.
+    """
+    if state.mode != "pomodoro" or not state.started_at:
+        return []
+
+    elapsed = get_elapsed_seconds(state, clock)
+    return [
+        (
+            phase.name,
+            phase.cycle,
+            state.started_at + timedelta(seconds=start),
+            state.started_at + timedelta(seconds=end),
+        )
+        for phase, start, end in iter_phases(state.phase_logged_seconds, elapsed, cfg)
+        if end > start
+    ]
+
+
+def log_phases(state: TimerState, clock: Clock = SYSTEM_CLOCK) -> TimerState:
+    """Write pending phase intervals to the log; called on pause and stop."""
+    rows = pending_phases(state, clock=clock)
+    if rows:
+        from database import save_pomodoro_phases
+
+        save_pomodoro_phases(state.session_id, rows)
+
+    state.phase_logged_seconds = get_elapsed_seconds(state, clock)
+    return state
 
 
-def init_pomodoro_state(state: TimerState) -> TimerState:
-    state.pomodoro_phase = "work"
-    state.pomodoro_cycle = 0
-    state.phase_started_at = datetime.now()
-    return state
+def emit_phase(timer_id: str, state: TimerState, phase: Phase) -> None:
+    """Queue a hook event for the phase a timer has just entered."""
+    emit("pomodoro.phase", lambda: {
+        "timer_id": timer_id,
+        "session_id": state.session_id,
+        "phase": phase.name,
+        "cycle": phase.cycle + 1,
+    })
+
+
+class PhaseScheduler:
+    """Upcoming phase ends of many pomodoro timers in one priority queue.
+
+    Entries are (wall-clock deadline, timer id, phase index, phase end in
+    active seconds). A caller sleeps until `next_deadline()` and then
+    handles everything `pop_due()` returns, however many timers run.
+    Paused timers have no deadline; call `load` again whenever the timers
+    change.
+    """
+
+    def __init__(self, cfg: PomodoroConfig | None = None) -> None:
+        self.cfg = cfg or load_config().pomodoro
+        self.timers: dict[str, TimerState] = {}
+        self.heap: list[tuple[datetime, str, int, float]] = []
+
+    def load(self, timers: dict[str, TimerState], clock: Clock = SYSTEM_CLOCK) -> None:
+        self.timers = timers
+        self.heap = []
+        for timer_id, state in timers.items():
+            if state.mode == "pomodoro" and state.started_at and not state.is_paused:
+                self._push(timer_id, state, get_current_phase(state, self.cfg, clock))
+
+    def _push(self, timer_id: str, state: TimerState, phase: Phase) -> None:
+        if phase.end == float("inf"):
+            return
+        # Active seconds map onto wall-clock time from started_at while running
+        deadline = state.started_at + timedelta(seconds=phase.end)
+        heapq.heappush(self.heap, (deadline, timer_id, phase.index, phase.end))
+
+    def next_deadline(self) -> datetime | None:
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, clock: Clock = SYSTEM_CLOCK) -> list[tuple[str, TimerState, Phase]]:
+        """Timers whose phase has ended, with the phase they are in now."""
+        now = clock.now()
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            _, timer_id, _, end = heapq.heappop(self.heap)
+            state = self.timers[timer_id]
+            # Never earlier than the phase that just ended, so rounding cannot repeat it
+            phase = get_phase_at(max(get_elapsed_seconds(state, clock), end), self.cfg)
+            due.append((timer_id, state, phase))
+            self._push(timer_id, state, phase)
+        return due
@@ -0,0 +1,292 @@
+"""Read-only query API for notebooks and scripts.
+
+    from query import query
+    df = query(since="2025-09-01", category="Physics").to_pandas()
+    weekly = query(since="2025-01-01").aggregate(by="week")
+
+Unlike `database`, importing this module creates no directories, engine
+or tables. Each call opens the database read-only with sqlite3, attaches
+the archives the date range reaches, and fetches rows in chunks straight
+into NumPy columns. Times come back as naive local datetimes, as
+everywhere else in the app.
+"""
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator
+import numpy as np
+from filters import filter_sql
+from models import SessionFilter
+import paths
+
+DB_PATH = Path(paths.DB_PATH)
+
+CHUNK_ROWS = 50_000
+# Stored in place of NULL end times (sessions still running); reads as NaT
+NAT = np.iinfo(np.int64).min
+
+COLUMNS = [
+    ("id", "id", np.int64),
+    ("task", "task", object),
+    ("category_id", "category_id", np.int64),
+    ("mode_id", "mode_id", np.int64),
+    ("start_time", "CAST(strftime('%s', start_time, 'unixepoch', 'localtime') AS INTEGER)", np.int64),
+    ("end_time", f"coalesce(CAST(strftime('%s', end_time, 'unixepoch', 'localtime') AS INTEGER), {NAT})", np.int64),
+    ("duration_seconds", "coalesce(duration_seconds, 0)", np.int64),
+    ("paused_seconds", "coalesce(paused_seconds, 0)", np.int64),
+    ("school_week", "school_week", np.int64),
+]
+
+# Local start epoch, category id and seconds of a session, as `Aggregates.apply` takes them;
+# also valid on the change log, which stores the same columns
+AGGREGATE_COLUMNS = (
+    "CAST(strftime('%s', start_time, 'unixepoch', 'localtime') AS INTEGER), category_id, coalesce(duration_seconds, 0)"
+)
+
+# Bucket keys for `aggregate(by=...)`; time buckets are the local start of the period
+TIME_BUCKETS = {
+    "hour": "strftime('%Y-%m-%d %H:00:00', start_time, 'unixepoch', 'localtime')",
+    "day": "date(start_time, 'unixepoch', 'localtime')",
+    "week": "date(start_time, 'unixepoch', 'localtime', '-6 days', 'weekday 1')",
+    "month": "strftime('%Y-%m-01', start_time, 'unixepoch', 'localtime')",
+    "year": "strftime('%Y-01-01', start_time, 'unixepoch', 'localtime')",
+}
+GROUP_BUCKETS = {
+    "category": "category_id",
+    "mode": "mode_id",
+    "school_week": "school_week",
+}
+
+
+def read_int_columns(cursor: sqlite3.Cursor, count: int, chunk_rows: int = CHUNK_ROWS) -> list[np.ndarray]:
+    """A cursor's `count` integer columns as int64 arrays, fetched in chunks."""
+    chunks = []
+    while rows := cursor.fetchmany(chunk_rows):
+        chunks.append(np.array(rows, dtype=np.int64))
+    table = np.concatenate(chunks) if chunks else np.empty((0, count), dtype=np.int64)
+    return [np.ascontiguousarray(table[:, k]) for k in range(count)]
+
+
+@dataclass
+class Query:
+    """Sessions matching a filter, across the main database and its archives.
+
+    Nothing is read until one of the methods is called; each call reads
+    the current data.
+    """
+
+    filter: SessionFilter = field(default_factory=SessionFilter)
+    db_path: Path = DB_PATH
+    chunk_rows: int = CHUNK_ROWS
+
+    def _connect(self, archives: list[Path]) -> tuple[sqlite3.Connection, list[str]]:
+        """A read-only connection with `archives` attached, and their schemas."""
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        schemas = []
+        for path in archives:
+            conn.execute(f"ATTACH DATABASE ? AS archive_{path.stem}", (f"file:{path}?mode=ro",))
+            schemas.append(f"archive_{path.stem}")
+        return conn, schemas
+
+    def _batches(self) -> Iterator[tuple[sqlite3.Connection, list[str]]]:
+        """Connections and the schemas to read sessions from, paths.ATTACH_BATCH archives at a time.
+
+        The first batch includes the main database, and its connection
+        holds a read transaction until the last batch is read; archives
+        are only written together with the main database, so all batches
+        see the same data.
+        """
+        if not self.db_path.exists():
+            raise FileNotFoundError(f"No database at {self.db_path}")
+
+        since, until = self.filter.since, self.filter.until
+        archives = [
+            path
+            for path in sorted((self.db_path.parent / "archive").glob("*.db"))
+            if path.stem.isdigit()
+            and (since is None or since < datetime(int(path.stem) + 1, 1, 1))
+            and (until is None or until > datetime(int(path.stem), 1, 1))
+        ]
+        batches = [archives[i:i + paths.ATTACH_BATCH] for i in range(0, len(archives), paths.ATTACH_BATCH)] or [[]]
+
+        main, schemas = self._connect(batches[0])
+        try:
+            # ATTACH is refused inside a transaction, so it begins afterwards
+            main.execute("BEGIN")
+            yield main, ["main"] + schemas
+            for batch in batches[1:]:
+                conn, schemas = self._connect(batch)
+                try:
+                    yield conn, schemas
+                finally:
+                    conn.close()
+        finally:
+            main.close()
+
+    def _sessions_sql(self, schemas: list[str], columns: str) -> tuple[str, dict]:
+        where, params = filter_sql(self.filter)
+        sql = " UNION ALL ".join(f"SELECT {columns} FROM {schema}.sessions WHERE {where}" for schema in schemas)
+        return sql, params
+
+    @staticmethod
+    def _names(conn: sqlite3.Connection, table: str) -> np.ndarray:
+        """Names indexed by id, for turning id columns into name columns."""
+        rows = conn.execute(f"SELECT id, name FROM main.{table}").fetchall()
+        names = np.full(max((id for id, _ in rows), default=0) + 1, None, dtype=object)
+        for id, name in rows:
+            names[id] = name
+        return names
+
+    def category_names(self) -> np.ndarray:
+        """Category names indexed by id."""
+        conn, _ = self._connect([])
+        try:
+            return self._names(conn, "categories")
+        finally:
+            conn.close()
+
+    def count(self) -> int:
+        total = 0
+        for conn, schemas in self._batches():
+            sql, params = self._sessions_sql(schemas, "1")
+            total += conn.execute(f"SELECT count(*) FROM ({sql})", params).fetchone()[0]
+        return total
+
+    def totals(self) -> tuple[int, int, dict[str, int]]:
+        """Session count, total seconds and seconds by category name, summed in SQL."""
+        by_category = {}
+        for conn, schemas in self._batches():
+            if schemas[0] == "main":
+                names = self._names(conn, "categories")
+            sql, params = self._sessions_sql(schemas, "category_id, duration_seconds")
+            for category_id, sessions, seconds in conn.execute(
+                f"SELECT category_id, count(*), coalesce(sum(duration_seconds), 0) FROM ({sql}) GROUP BY category_id",
+                params,
+            ):
+                total = by_category.setdefault(category_id, [0, 0])
+                total[0] += sessions
+                total[1] += seconds
+        count = sum(sessions for sessions, _ in by_category.values())
+        seconds = sum(seconds for _, seconds in by_category.values())
+        return count, seconds, {names[id]: seconds for id, (_, seconds) in by_category.items()}
+
+    def aggregate_columns(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Local start epochs, category ids and seconds of matching sessions, for `Aggregates.apply`."""
+        parts = []
+        for conn, schemas in self._batches():
+            sql, params = self._sessions_sql(schemas, AGGREGATE_COLUMNS)
+            parts.append(read_int_columns(conn.execute(sql, params), 3, self.chunk_rows))
+        return tuple(np.concatenate(column) for column in zip(*parts))
+
+    def to_numpy(self) -> dict[str, np.ndarray]:
+        """Matching sessions as one array per column, oldest first.
+
+        start_time and end_time are datetime64[s] (NaT for a running
+        session); category and mode are name arrays, and category_id
+        holds the ids behind the category names.
+        """
+        select = ", ".join(f"{expr} AS {name}" for name, expr, _ in COLUMNS)
+        chunks = [[] for _ in COLUMNS]
+        for batch, (conn, schemas) in enumerate(self._batches()):
+            if batch == 0:
+                category_names = self._names(conn, "categories")
+                mode_names = self._names(conn, "modes")
+            sql, params = self._sessions_sql(schemas, select)
+            cursor = conn.execute(f"{sql} ORDER BY start_time", params)
+            while rows := cursor.fetchmany(self.chunk_rows):
+                for chunk, (_, _, dtype), values in zip(chunks, COLUMNS, zip(*rows)):
+                    chunk.append(np.array(values, dtype=dtype))
+        columns = {
+            name: np.concatenate(chunk) if chunk else np.empty(0, dtype=dtype)
+            for chunk, (name, _, dtype) in zip(chunks, COLUMNS)
+        }
+        if batch > 0:
+            order = np.argsort(columns["start_time"], kind="stable")
+            columns = {name: values[order] for name, values in columns.items()}
+
+        return {
+            "id": columns["id"],
+            "task": columns["task"],
+            "category": category_names[columns["category_id"]],
+            "category_id": columns["category_id"],
+            "mode": mode_names[columns["mode_id"]],
+            "start_time": columns["start_time"].view("datetime64[s]"),
+            "end_time": columns["end_time"].view("datetime64[s]"),
+            "duration_seconds": columns["duration_seconds"],
+            "paused_seconds": columns["paused_seconds"],
+            "school_week": columns["school_week"],
+        }
+
+    def to_pandas(self):
+        """Matching sessions as a DataFrame, oldest first."""
+        import pandas as pd
+
+        df = pd.DataFrame(self.to_numpy())
+        df["category"] = df["category"].astype("category")
+        df["mode"] = df["mode"].astype("category")
+        return df
+
+    def aggregate(self, by: str = "day"):
+        """Session count and total seconds per bucket, summed in SQL.
+
+        `by` is one of hour, day, week (starting Monday), month, year,
+        category, mode or school_week. Time buckets give a DataFrame
+        indexed by the local start of each period, in order; the others
+        are indexed by name or week number, largest total first.
+        """
+        import pandas as pd
+
+        if by in TIME_BUCKETS:
+            bucket = TIME_BUCKETS[by]
+        elif by in GROUP_BUCKETS:
+            bucket = GROUP_BUCKETS[by]
+        else:
+            raise ValueError(f"Cannot aggregate by '{by}'; use one of {', '.join([*TIME_BUCKETS, *GROUP_BUCKETS])}")
+
+        totals = {}
+        for conn, schemas in self._batches():
+            if schemas[0] == "main" and by in ("category", "mode"):
+                names = self._names(conn, "categories" if by == "category" else "modes")
+            sql, params = self._sessions_sql(schemas, "start_time, category_id, mode_id, school_week, duration_seconds")
+            for key, sessions, seconds in conn.execute(
+                f"""
+                SELECT {bucket} AS bucket, count(*) AS sessions, coalesce(sum(duration_seconds), 0) AS seconds
+                FROM ({sql}) GROUP BY bucket
+                """,
+                params,
+            ):
+                total = totals.setdefault(key, [0, 0])
+                total[0] += sessions
+                total[1] += seconds
+        rows = sorted(
+            ((key, sessions, seconds) for key, (sessions, seconds) in totals.items()),
+            key=(lambda row: row[0]) if by in TIME_BUCKETS else (lambda row: -row[2]),
+        )
+        if by in ("category", "mode"):
+            rows = [(names[id], sessions, seconds) for id, sessions, seconds in rows]
+
+        df = pd.DataFrame(rows, columns=[by, "sessions", "seconds"])
+        if by in TIME_BUCKETS:
+            df[by] = pd.to_datetime(df[by])
+        return df.set_index(by)
+
+
+def query(
+    since: datetime | str | None = None,
+    until: datetime | str | None = None,
+    category: str | None = None,
+    mode: str | None = None,
+    week: int | None = None,
+    task: str | None = None,
+    db_path: Path | str = DB_PATH,
+) -> Query:
+    """Sessions matching every given condition; `until` is exclusive.
+
+    Dates may be datetimes or ISO strings such as "2025-09-01".
+    `db_path` can point at another database, e.g. an unpacked backup.
+    """
+    session_filter = SessionFilter(
+        since=since, until=until, category=category, mode=mode, school_week=week, task=task
+    )
+    return Query(session_filter, Path(db_path))
@@ -0,0 +1,314 @@
+"""Local read-only HTTP endpoint for status bars and dashboards.
+
+    cybersyn serve                      # http://127.0.0.1:8765
+    curl -s localhost:8765/status
+
+GET /status, /stats and /charts/<kind> answer from one long-lived
+process, so a widget polling every second does not start Python each
+time. Every response carries an ETag built from the modification stamps
+of the database, state and config files (plus the current second while
+a timer is counting, and the query string); a request whose
+If-None-Match still matches gets 304 after a few stat() calls, without
+touching the database. Bodies are also cached per ETag, so several
+widgets asking for the same data share one computation.
+"""
+import io
+import json
+import os
+import socketserver
+import threading
+import zlib
+from datetime import date, datetime, timedelta
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+from clock import SYSTEM_CLOCK
+from config import CONFIG_FILE, load_config
+from database import DB_PATH, get_session
+from goals import get_goal_progress
+from models import SessionFilter
+from pomodoro import get_current_phase, get_phase_remaining
+from state import load_timers, get_state_version, get_elapsed_seconds, get_paused_seconds
+
+DEFAULT_PORT = 8765
+# Bodies kept per endpoint; the oldest ETags are dropped first
+CACHE_SIZE = 16
+
+CHART_TYPES = {"png": "image/png", "preview": "image/png", "svg": "image/svg+xml", "pdf": "application/pdf"}
+
+
+def _stamp(path: Path) -> str:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return "0"
+    return f"{st.st_mtime_ns:x}.{st.st_size:x}"
+
+
+def data_version() -> str:
+    """Changes whenever a write to the database is committed."""
+    return _stamp(DB_PATH)
+
+
+def parse_filter(params: dict[str, str]) -> SessionFilter:
+    """Filter from query parameters, with the same meaning as the CLI options."""
+    unknown = set(params) - {"since", "until", "category", "mode", "week"}
+    if unknown:
+        raise ValueError(f"Unknown parameter: {', '.join(sorted(unknown))}")
+    try:
+        since = datetime.strptime(params["since"], "%Y-%m-%d") if "since" in params else None
+        # until is inclusive of the whole day
+        until = datetime.strptime(params["until"], "%Y-%m-%d") + timedelta(days=1) if "until" in params else None
+        week = int(params["week"]) if "week" in params else None
+    except ValueError:
+        raise ValueError("since and until must be YYYY-MM-DD and week a number")
+    return SessionFilter(
+        since=since, until=until, category=params.get("category"), mode=params.get("mode"), school_week=week
+    )
+
+
+class ResponseCache:
+    """Most recent bodies by ETag, built under a lock so each is computed once.
+
+    The lock also keeps chart renders one at a time: matplotlib figures are
+    reused between renders and are not thread-safe.
+    """
+
+    def __init__(self, size: int = CACHE_SIZE) -> None:
+        self.size = size
+        self.entries: dict[str, tuple[str, bytes]] = {}
+        self.lock = threading.Lock()
+
+    def get(self, etag: str, build) -> tuple[str, bytes]:
+        with self.lock:
+            if etag not in self.entries:
+                self.entries[etag] = build()
+                while len(self.entries) > self.size:
+                    del self.entries[next(iter(self.entries))]
+            return self.entries[etag]
+
+
+class StatusSource:
+    """Builds /status bodies.
+
+    Session details and goal totals only change with the data, so they
+    are read once per data and state version; elapsed times are worked
+    out from the timer state on each request.
+    """
+
+    def __init__(self) -> None:
+        self.version = None
+        self.timers = {}
+        self.sessions = {}
+        self.cfg = load_config()
+        self.goals = []
+
+    def etag(self) -> str:
+        version = (data_version(), str(get_state_version() or 0), _stamp(CONFIG_FILE), date.today().isoformat())
+        if version != self.version:
+            self.version = version
+            self.timers = load_timers()
+            self.cfg = load_config()
+            self.sessions = {state.session_id: get_session(state.session_id) for state in self.timers.values()}
+            self.goals = get_goal_progress(self.cfg.goals, date.today())
+        tag = "-".join(version)
+        # Counting timers change every second; paused ones do not
+        if any(state.is_running and not state.is_paused for state in self.timers.values()):
+            tag += f"-{int(SYSTEM_CLOCK.now().timestamp())}"
+        return tag
+
+    def body(self) -> dict:
+        timers, live = [], {}
+        for timer_id, state in self.timers.items():
+            session = self.sessions.get(state.session_id)
+            if not session:
+                continue
+            elapsed = int(get_elapsed_seconds(state))
+            live[session.category] = live.get(session.category, 0) + elapsed
+            timer = {
+                "id": timer_id,
+                "session_id": session.id,
+                "task": session.task,
+                "category": session.category,
+                "mode": session.mode,
+                "school_week": session.school_week,
+                "started_at": session.start_time.isoformat(),
+                "elapsed_seconds": elapsed,
+                "paused_seconds": int(get_paused_seconds(state)),
+                "paused": state.is_paused,
+            }
+            if session.mode == "pomodoro":
+                phase = get_current_phase(state, self.cfg.pomodoro)
+                timer["phase"] = phase.name
+                timer["phase_remaining_seconds"] = int(get_phase_remaining(state, self.cfg.pomodoro))
+                timer["cycle"] = phase.cycle + 1
+            timers.append(timer)
+
+        goals = []
+        for progress in self.goals:
+            seconds = progress.seconds + live.get(progress.goal.category, 0)
+            goals.append({
+                "category": progress.goal.category,
+                "period": progress.goal.period,
+                "target_seconds": progress.target_seconds,
+                "seconds": seconds,
+                "reached": seconds >= progress.target_seconds,
+            })
+        return {"running": bool(timers), "timers": timers, "goals": goals}
+
+
+def stats_body(session_filter: SessionFilter) -> dict:
+    from aggregates import get_aggregates
+
+    aggregates = get_aggregates(session_filter)
+    first, last = (str(day) for day in aggregates.day_range()) if not aggregates.is_empty else (None, None)
+    return {
+        "sessions": int(aggregates.daily_counts.sum()),
+        "total_seconds": int(aggregates.daily_seconds.sum()),
+        "active_days": int((aggregates.daily_counts > 0).sum()),
+        "first_day": first,
+        "last_day": last,
+        "by_category": [{"category": name, "seconds": seconds} for name, seconds in aggregates.category_totals()],
+    }
+
+
+def chart_body(kind: str, session_filter: SessionFilter, output_format: str) -> bytes | None:
+    from aggregates import get_aggregates
+    from analytics import render_chart
+
+    aggregates = get_aggregates(session_filter)
+    if aggregates.is_empty:
+        return None
+    buffer = io.BytesIO()
+    render_chart(kind, aggregates, buffer, output_format)
+    return buffer.getvalue()
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = "cybersyn"
+    # Shared by all requests; set up in make_server
+    status: StatusSource
+    caches: dict[str, ResponseCache]
+    status_lock = threading.Lock()
+    quiet = True
+    head_only = False
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        path = url.path.rstrip("/") or "/"
+        try:
+            if path == "/status":
+                self._status()
+            elif path == "/stats":
+                self._stats(params, url.query)
+            elif path.startswith("/charts/"):
+                self._chart(path.removeprefix("/charts/"), params, url.query)
+            else:
+                self._error(HTTPStatus.NOT_FOUND, "Try /status, /stats or /charts/<kind>")
+        except ValueError as e:
+            self._error(HTTPStatus.BAD_REQUEST, str(e))
+
+    def do_HEAD(self) -> None:
+        self.head_only = True
+        self.do_GET()
+
+    def _status(self) -> None:
+        with self.status_lock:
+            etag = f'"status-{self.status.etag()}"'
+            if self._not_modified(etag):
+                return
+            body = self.caches["status"].get(etag, lambda: ("application/json", _json(self.status.body())))
+        self._send(etag, *body)
+
+    def _stats(self, params: dict, query: str) -> None:
+        session_filter = parse_filter(params)
+        etag = f'"stats-{data_version()}-{_query_key(query)}"'
+        if self._not_modified(etag):
+            return
+        body = self.caches["stats"].get(etag, lambda: ("application/json", _json(stats_body(session_filter))))
+        self._send(etag, *body)
+
+    def _chart(self, kind: str, params: dict, query: str) -> None:
+        from analytics import CHART_KINDS
+
+        if kind not in CHART_KINDS:
+            self._error(HTTPStatus.NOT_FOUND, f"Chart kinds: {', '.join(CHART_KINDS)}")
+            return
+        output_format = params.pop("format", "png")
+        if output_format not in CHART_TYPES:
+            raise ValueError(f"format must be one of {', '.join(CHART_TYPES)}")
+        session_filter = parse_filter(params)
+
+        etag = f'"{kind}-{data_version()}-{_query_key(query)}"'
+        if self._not_modified(etag):
+            return
+
+        content_type, body = self.caches["charts"].get(
+            etag, lambda: (CHART_TYPES[output_format], chart_body(kind, session_filter, output_format))
+        )
+        if body is None:
+            self._error(HTTPStatus.NOT_FOUND, "No sessions found")
+            return
+        self._send(etag, content_type, body)
+
+    def _not_modified(self, etag: str) -> bool:
+        tags = {tag.strip().removeprefix("W/") for tag in self.headers.get("If-None-Match", "").split(",")}
+        if etag in tags or "*" in tags:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return True
+        return False
+
+    def _send(self, etag: str | None, content_type: str, body: bytes, status: HTTPStatus = HTTPStatus.OK) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        if not self.head_only:
+            self.wfile.write(body)
+
+    def _error(self, status: HTTPStatus, message: str) -> None:
+        self._send(None, "application/json", _json({"error": message}), status)
+
+    def address_string(self) -> str:
+        # Unix socket peers have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format: str, *args) -> None:
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+def _json(data: dict) -> bytes:
+    return json.dumps(data).encode()
+
+
+def _query_key(query: str) -> str:
+    return f"{zlib.crc32(query.encode()):08x}"
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(port: int = DEFAULT_PORT, socket_path: Path | None = None, quiet: bool = True):
+    """An HTTP server on 127.0.0.1:`port`, or on a Unix socket if `socket_path` is given."""
+    handler = type("CybersynHandler", (Handler,), {
+        "status": StatusSource(),
+        "caches": {"status": ResponseCache(), "stats": ResponseCache(), "charts": ResponseCache()},
+        "quiet": quiet,
+    })
+    if socket_path is not None:
+        # Left behind by a previous run; anything else at that path is not ours to remove
+        if socket_path.is_socket():
+            socket_path.unlink()
+        server = ThreadingUnixHTTPServer(str(socket_path), handler)
+        os.chmod(socket_path, 0o600)
+        return server
+    return ThreadingHTTPServer(("127.0.0.1", port), handler)
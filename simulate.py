@@ -0,0 +1,145 @@
+"""Replay scripted timer sessions on a fake clock and check the accounting.
+
+    uv run simulate.py --sessions 5000 --seed 1
+
+Each session is a script of start/pause/resume/tick/stop events with
+delays between them. The script runs through the same state transitions
+and phase arithmetic as the CLI, without sleeping or touching disk, and
+the results are compared with totals kept independently by the script.
+"""
+import random
+import sys
+from dataclasses import dataclass, field
+import typer
+from clock import FakeClock
+from config import PomodoroConfig
+from models import TimerState
+from pomodoro import get_current_phase, get_phase_duration, pending_phases
+from state import get_elapsed_seconds
+from timer import begin_timer, apply_pause, apply_resume, finish_timer
+
+
+@dataclass
+class Script:
+    mode: str
+    # (seconds to wait, event) pairs; the first event is always "start"
+    events: list[tuple[float, str]] = field(default_factory=list)
+
+
+def random_script(rng: random.Random, max_events: int = 40) -> Script:
+    mode = rng.choice(["stopwatch", "pomodoro"])
+    events = [(0.0, "start")]
+    paused = False
+    for _ in range(rng.randint(0, max_events)):
+        wait = rng.choice([rng.uniform(0, 5), rng.uniform(0, 600), rng.uniform(0, 7200)])
+        event = rng.choice(["tick", "tick", "resume" if paused else "pause"])
+        paused = paused if event == "tick" else not paused
+        events.append((wait, event))
+    events.append((rng.uniform(0, 3600), "stop"))
+    return Script(mode, events)
+
+
+def reference_phase(active_seconds: float, cfg: PomodoroConfig) -> tuple[str, int, int]:
+    """Step through transitions one at a time, the way the old loop did."""
+    durations = {
+        "work": cfg.work_minutes * 60,
+        "short_break": cfg.short_break_minutes * 60,
+        "long_break": cfg.long_break_minutes * 60,
+    }
+    phase, cycle, start, index = "work", 0, 0, 0
+    while start + durations[phase] <= active_seconds:
+        start += durations[phase]
+        index += 1
+        if phase == "work":
+            cycle += 1
+            if cycle >= cfg.sessions_until_long_break:
+                phase, cycle = "long_break", 0
+            else:
+                phase = "short_break"
+        else:
+            phase = "work"
+    return phase, cycle, index
+
+
+def run_script(script: Script, cfg: PomodoroConfig, clock: FakeClock) -> None:
+    """Replay one script, raising AssertionError on the first broken invariant."""
+    state = TimerState()
+    started = clock.now()
+    active = paused = 0.0
+    is_paused = False
+    phases = []
+
+    for wait, event in script.events:
+        clock.advance(wait)
+        if is_paused:
+            paused += wait
+        else:
+            active += wait
+
+        if event == "start":
+            state = begin_timer(1, script.mode, clock.now())
+        elif event == "pause":
+            state = apply_pause(state, clock.now())
+            phases += pending_phases(state, cfg, clock)
+            state.phase_logged_seconds = get_elapsed_seconds(state, clock)
+            is_paused = True
+        elif event == "resume":
+            state = apply_resume(state, clock.now())
+            is_paused = False
+        elif event == "stop":
+            phases += pending_phases(state, cfg, clock)
+            elapsed, paused_seconds = finish_timer(state, clock.now())
+            assert abs(elapsed - active) <= 1, f"duration {elapsed} != active {active}"
+            assert abs(paused_seconds - paused) <= 1, f"paused {paused_seconds} != {paused}"
+            span = (clock.now() - started).total_seconds()
+            assert abs(elapsed + paused_seconds - span) <= 2, "duration + paused != wall time"
+
+        assert abs(get_elapsed_seconds(state, clock) - active) < 1e-3, f"elapsed drifted after {event}"
+
+        if script.mode == "pomodoro":
+            phase = get_current_phase(state, cfg, clock)
+            assert (phase.name, phase.cycle, phase.index) == reference_phase(active, cfg), (
+                f"phase mismatch at {active:.0f}s active"
+            )
+
+    if script.mode == "pomodoro":
+        logged = sum((end - start).total_seconds() for _, _, start, end in phases)
+        assert abs(logged - active) < 1e-3, f"phase log covers {logged}s of {active}s"
+        for (_, _, _, end), (_, _, start, _) in zip(phases, phases[1:]):
+            assert start >= end, "phase log intervals overlap"
+        for name, _, start, end in phases:
+            length = (end - start).total_seconds()
+            assert 0 < length <= get_phase_duration(name, cfg) + 1e-6, f"{name} logged for {length}s"
+
+
+def run_simulation(sessions: int, seed: int = 0) -> int:
+    rng = random.Random(seed)
+    clock = FakeClock()
+    for i in range(sessions):
+        cfg = PomodoroConfig(
+            work_minutes=rng.randint(1, 50),
+            short_break_minutes=rng.randint(1, 15),
+            long_break_minutes=rng.randint(1, 30),
+            sessions_until_long_break=rng.randint(1, 6),
+        )
+        script = random_script(rng)
+        try:
+            run_script(script, cfg, clock)
+        except AssertionError as e:
+            raise AssertionError(f"session {i} ({script.mode}, {cfg}): {e}\n{script.events}") from e
+        clock.advance(rng.uniform(0, 86400))
+    return sessions
+
+
+def main(
+    sessions: int = typer.Option(1000, "--sessions", "-n", help="Number of random sessions"),
+    seed: int = typer.Option(0, "--seed", help="Random seed"),
+):
+    """Fuzz the timer and pomodoro accounting on a fake clock"""
+    checked = run_simulation(sessions, seed)
+    assert "database" not in sys.modules, "the simulation must not import the database"
+    typer.echo(f"{checked} sessions replayed, all invariants hold")
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,298 @@
+"""Columnar snapshot of every session, memory-mapped by the reporting commands.
+
+    cybersyn snapshot
+
+Writes data/snapshot.bin: a JSON header followed by fixed-width arrays
+(start and end times, durations, category, mode and task codes, school
+week) and string tables for the codes, each array 8-byte aligned. Rows
+are sorted by start time, so a date range is a slice found by binary
+search. Opening the file maps it with `numpy.memmap` and builds views
+onto it; nothing is parsed or copied until a column is used.
+
+The header records the change-log position the snapshot was built at
+and a checksum of the category, alias and mode tables. Every write to
+sessions, archiving and restores included, moves that position forward
+and it is never handed out twice, and renaming or aliasing a category
+changes the checksum, so `open_snapshot` compares both with the
+database and returns None when they differ; a snapshot never serves
+stale data. `stats` and `charts` then
+read the database as usual until `snapshot` is run again.
+
+    from snapshot import open_snapshot
+    columns = open_snapshot().to_numpy()   # same columns as query().to_numpy()
+"""
+import json
+import os
+import sqlite3
+import struct
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+import numpy as np
+from filters import filter_terms
+from models import SessionFilter
+from query import DB_PATH, NAT, Query
+import paths
+
+SNAPSHOT_FILE = Path(paths.DATA_DIR) / "snapshot.bin"
+MAGIC = b"CYBSNAP1"
+ALIGN = 8
+CHUNK_ROWS = 50_000
+
+# Name, SQL expression and stored type of each fixed-width column
+COLUMNS = [
+    ("id", "id", "<i8"),
+    ("start_epoch", "start_time", "<i8"),
+    ("start_time", "CAST(strftime('%s', start_time, 'unixepoch', 'localtime') AS INTEGER)", "<i8"),
+    ("end_time", f"coalesce(CAST(strftime('%s', end_time, 'unixepoch', 'localtime') AS INTEGER), {NAT})", "<i8"),
+    ("duration_seconds", "coalesce(duration_seconds, 0)", "<i8"),
+    ("paused_seconds", "coalesce(paused_seconds, 0)", "<i8"),
+    ("category_id", "category_id", "<i4"),
+    ("mode_id", "mode_id", "<i4"),
+    ("school_week", "school_week", "<i4"),
+    ("task", "task", object),
+]
+# Code columns of the name fields a filter can match
+CODE_COLUMNS = {"category": "category_id", "mode": "mode_id", "task": "task_code"}
+# Tables the string tables and aliases are read from; they change without touching sessions
+LOOKUP_TABLES = [
+    "SELECT id, name FROM main.categories ORDER BY id",
+    "SELECT name, category_id FROM main.category_aliases ORDER BY name",
+    "SELECT id, name FROM main.modes ORDER BY id",
+]
+
+
+def source_version(conn: sqlite3.Connection) -> str:
+    """What a snapshot of the current data is keyed on.
+
+    The last change-log position handed out, which sqlite_sequence keeps
+    counting when archiving drops its own change-log entries or `maintain`
+    prunes old ones, and restore continues after; plus a checksum of the
+    lookup tables, which a rename or alias changes without a session write.
+    """
+    row = conn.execute("SELECT seq FROM main.sqlite_sequence WHERE name = 'session_changes'").fetchone()
+    checksum = 0
+    for sql in LOOKUP_TABLES:
+        checksum = zlib.crc32(json.dumps(conn.execute(sql).fetchall()).encode(), checksum)
+    return f"{row[0] if row else 0}:{checksum:08x}"
+
+
+def _string_table(values: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """Offsets into one UTF-8 blob, and the blob."""
+    encoded = [value.encode() for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype="<i8")
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+class StringTable:
+    """Names by code, decoded from the mapped offsets and blob only when looked up."""
+
+    def __init__(self, offsets: np.ndarray, blob: np.ndarray):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, codes):
+        """The name for one code, or an object array of names for an array or slice of codes."""
+        if isinstance(codes, (int, np.integer)):
+            return bytes(self.blob[self.offsets[codes]:self.offsets[codes + 1]]).decode()
+        if isinstance(codes, slice):
+            codes = np.arange(len(self))[codes]
+        # Each distinct code is decoded once, from the span of the blob they cover
+        distinct, inverse = np.unique(np.asarray(codes), return_inverse=True)
+        if not len(distinct):
+            return np.empty(0, dtype=object)
+        starts, ends = self.offsets[distinct], self.offsets[distinct + 1]
+        lo = int(starts[0])
+        data = self.blob[lo:int(ends[-1])].tobytes()
+        names = np.empty(len(distinct), dtype=object)
+        names[:] = [data[a - lo:b - lo].decode() for a, b in zip(starts.tolist(), ends.tolist())]
+        return names[inverse]
+
+    def index(self, name: str) -> int:
+        """The code of `name`, or -1; compares bytes without decoding the table."""
+        target = np.frombuffer(name.encode(), dtype=np.uint8)
+        candidates = np.flatnonzero(np.diff(self.offsets) == len(target))
+        if len(candidates) and len(target):
+            window = self.blob[self.offsets[candidates][:, None] + np.arange(len(target))]
+            candidates = candidates[(window == target).all(axis=1)]
+        return int(candidates[0]) if len(candidates) else -1
+
+
+def _names_by_id(conn: sqlite3.Connection, table: str) -> list[str]:
+    rows = conn.execute(f"SELECT id, name FROM main.{table}").fetchall()
+    names = [""] * (max((id for id, _ in rows), default=0) + 1)
+    for id, name in rows:
+        names[id] = name
+    return names
+
+
+def build_snapshot(db_path: Path = DB_PATH, path: Path = SNAPSHOT_FILE) -> int:
+    """Write a snapshot of every session, archives included; returns the row count."""
+    select = ", ".join(f"{expr} AS {name}" for name, expr, _ in COLUMNS)
+    chunks = [[] for _ in COLUMNS]
+    # The first batch's read transaction lasts until the last one, so the version matches the rows
+    for batch, (conn, schemas) in enumerate(Query(SessionFilter(), db_path)._batches()):
+        if batch == 0:
+            version = source_version(conn)
+            strings = {"category": _names_by_id(conn, "categories"), "mode": _names_by_id(conn, "modes")}
+            aliases = dict(conn.execute("SELECT name, category_id FROM main.category_aliases").fetchall())
+        sql = " UNION ALL ".join(f"SELECT {select} FROM {schema}.sessions" for schema in schemas)
+        cursor = conn.execute(f"{sql} ORDER BY start_epoch, id")
+        while rows := cursor.fetchmany(CHUNK_ROWS):
+            for chunk, (_, _, dtype), values in zip(chunks, COLUMNS, zip(*rows)):
+                chunk.append(np.array(values, dtype=dtype))
+    columns = {
+        name: np.concatenate(chunk) if chunk else np.empty(0, dtype=dtype)
+        for chunk, (name, _, dtype) in zip(chunks, COLUMNS)
+    }
+    if batch > 0:
+        order = np.lexsort((columns["id"], columns["start_epoch"]))
+        columns = {name: values[order] for name, values in columns.items()}
+
+    # Tasks repeat, so they are stored as codes into a table of distinct tasks
+    tasks, task_codes = np.unique(columns.pop("task").astype(str), return_inverse=True)
+    columns["task_code"] = task_codes.astype("<i4")
+    strings["task"] = tasks.tolist()
+    for name, values in strings.items():
+        columns[f"{name}_offsets"], columns[f"{name}_blob"] = _string_table(values)
+
+    layout, offset = {}, 0
+    for name, array in columns.items():
+        layout[name] = [array.dtype.str, offset, len(array)]
+        offset += -(-array.nbytes // ALIGN) * ALIGN
+    header = json.dumps({"version": version, "columns": layout, "category_aliases": aliases}).encode()
+    header += b" " * (-(len(MAGIC) + 8 + len(header)) % ALIGN)
+
+    path.parent.mkdir(exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+        for array in columns.values():
+            f.write(array.tobytes())
+            f.write(b"\0" * (-array.nbytes % ALIGN))
+    os.replace(tmp, path)
+    return len(task_codes)
+
+
+@dataclass
+class Snapshot:
+    """Sessions as read-only arrays onto the mapped file, sorted by start time."""
+
+    version: str
+    columns: dict[str, np.ndarray]
+    # Names by code, for category, mode and task
+    strings: dict[str, StringTable]
+    category_aliases: dict[str, int]
+
+    def __len__(self) -> int:
+        return len(self.columns["id"])
+
+    def _code(self, kind: str, name: str) -> int:
+        code = self.strings[kind].index(name)
+        if code >= 0:
+            return code
+        if kind == "category":
+            return self.category_aliases.get(name, -1)
+        return -1
+
+    def select(self, session_filter: SessionFilter | None = None) -> slice | np.ndarray:
+        """Rows matching the filter: a slice for a date range alone, else an index array."""
+        c = self.columns
+        terms = filter_terms(session_filter)
+        # Rows are sorted by start time, so the time bounds narrow a slice
+        lo, hi = 0, len(self)
+        for field, op, value in terms:
+            if field == "start_time":
+                bound = int(np.searchsorted(c["start_epoch"], value, "left"))
+                lo, hi = (max(lo, bound), hi) if op == ">=" else (lo, min(hi, bound))
+        rows = slice(lo, max(lo, hi))
+
+        mask = None
+        for field, _, value in terms:
+            if field in ("category", "mode", "task"):
+                match = c[CODE_COLUMNS[field]][rows] == self._code(field, value)
+            elif field == "school_week":
+                match = c["school_week"][rows] == value
+            else:
+                continue
+            mask = match if mask is None else mask & match
+        return rows if mask is None else np.flatnonzero(mask) + lo
+
+    def to_numpy(self, session_filter: SessionFilter | None = None) -> dict[str, np.ndarray]:
+        """Matching sessions in the form `Query.to_numpy` returns."""
+        rows = self.select(session_filter)
+        c = self.columns
+        return {
+            "id": c["id"][rows],
+            "task": self.strings["task"][c["task_code"][rows]],
+            "category": self.strings["category"][c["category_id"][rows]],
+            "category_id": c["category_id"][rows].astype(np.int64),
+            "mode": self.strings["mode"][c["mode_id"][rows]],
+            "start_time": c["start_time"][rows].view("datetime64[s]"),
+            "end_time": c["end_time"][rows].view("datetime64[s]"),
+            "duration_seconds": c["duration_seconds"][rows],
+            "paused_seconds": c["paused_seconds"][rows],
+            "school_week": c["school_week"][rows].astype(np.int64),
+        }
+
+    def totals(self, session_filter: SessionFilter | None = None) -> tuple[int, int, dict[str, int]]:
+        """Session count, total seconds and seconds by category name."""
+        _, category_ids, durations = self.aggregate_columns(session_filter)
+        seconds = np.bincount(category_ids, weights=durations, minlength=len(self.strings["category"]))
+        counts = np.bincount(category_ids, minlength=len(seconds))
+        by_category = {str(self.strings["category"][i]): int(seconds[i]) for i in np.flatnonzero(counts)}
+        return len(durations), int(durations.sum()), by_category
+
+    def aggregate_columns(self, session_filter: SessionFilter | None = None):
+        """Local epochs, category ids and durations of matching sessions, for `Aggregates.apply`."""
+        rows = self.select(session_filter)
+        c = self.columns
+        return c["start_time"][rows], c["category_id"][rows], c["duration_seconds"][rows]
+
+
+def load_snapshot(path: Path = SNAPSHOT_FILE) -> Snapshot | None:
+    """Map a snapshot file without checking it against the database."""
+    try:
+        data = np.memmap(path, dtype=np.uint8, mode="r")
+    except (FileNotFoundError, ValueError):
+        return None
+    if bytes(data[:len(MAGIC)]) != MAGIC:
+        return None
+    (size,) = struct.unpack("<Q", bytes(data[len(MAGIC):len(MAGIC) + 8]))
+    start = len(MAGIC) + 8 + size
+    header = json.loads(bytes(data[len(MAGIC) + 8:start]))
+
+    columns = {}
+    for name, (dtype, offset, length) in header["columns"].items():
+        dtype = np.dtype(dtype)
+        begin = start + offset
+        columns[name] = data[begin:begin + length * dtype.itemsize].view(dtype)
+    strings = {
+        kind: StringTable(columns.pop(f"{kind}_offsets"), columns.pop(f"{kind}_blob"))
+        for kind in ("category", "mode", "task")
+    }
+    return Snapshot(header["version"], columns, strings, header["category_aliases"])
+
+
+def current_version(db_path: Path = DB_PATH) -> str | None:
+    if not db_path.exists():
+        return None
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return source_version(conn)
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        conn.close()
+
+
+def open_snapshot(db_path: Path = DB_PATH, path: Path = SNAPSHOT_FILE) -> Snapshot | None:
+    """The snapshot, if one exists and still matches the database."""
+    snapshot = load_snapshot(path)
+    if snapshot is None or snapshot.version != current_version(db_path):
+        return None
+    return snapshot
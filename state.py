@@ -1,27 +1,88 @@
+import fcntl
 import json
+import os
+from contextlib import contextmanager
+from datetime import datetime
 from pathlib import Path
-from models import TimerState
+from typing import Iterator
+from models import TimerState, TimerStore
+from clock import Clock, SYSTEM_CLOCK
 
 STATE_FILE = Path(__file__).parent / "data" / "state.json"
+LOCK_FILE = STATE_FILE.with_suffix(".lock")
 
 
-def load_state() -> TimerState:
+def load_timers() -> dict[str, TimerState]:
+    """Running timers by id, oldest first."""
     if not STATE_FILE.exists():
-        return TimerState()
+        return {}
 
     with open(STATE_FILE, "r") as f:
         data = json.load(f)
 
-    return TimerState(**data)
+    # State files from before multiple timers hold one TimerState
+    if "timers" not in data:
+        state = TimerState(**data)
+        return {str(state.session_id): state} if state.is_running else {}
 
+    return TimerStore(**data).timers
 
-def save_state(state: TimerState) -> None:
-    STATE_FILE.parent.mkdir(exist_ok=True)
 
-    with open(STATE_FILE, "w") as f:
-        json.dump(state.model_dump(mode="json"), f, indent=2, default=str)
+def get_state_version() -> int | None:
+    """Modification time of the state file, a cheap check for changes."""
+    try:
+        return STATE_FILE.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def save_timers(timers: dict[str, TimerState]) -> None:
+    if not timers:
+        clear_state()
+        return
+
+    STATE_FILE.parent.mkdir(exist_ok=True)
+    tmp = STATE_FILE.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(TimerStore(timers=timers).model_dump(mode="json"), f, indent=2, default=str)
+    os.replace(tmp, STATE_FILE)
 
 
 def clear_state() -> None:
     if STATE_FILE.exists():
         STATE_FILE.unlink()
+
+
+@contextmanager
+def edit_timers() -> Iterator[dict[str, TimerState]]:
+    """Load the timers for changing and save them on exit.
+
+    An exclusive lock is held throughout, so two commands acting on
+    different timers at the same moment cannot drop each other's change.
+    Nothing is saved if the block raises.
+    """
+    STATE_FILE.parent.mkdir(exist_ok=True)
+    with open(LOCK_FILE, "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        timers = load_timers()
+        yield timers
+        save_timers(timers)
+
+
+def get_elapsed_seconds(state: TimerState, clock: Clock = SYSTEM_CLOCK, now: datetime | None = None) -> float:
+    """Active seconds as of `now`, which defaults to the clock's current time."""
+    if not state.started_at:
+        return 0.0
+
+    if state.is_paused and state.paused_at:
+        return (state.paused_at - state.started_at).total_seconds()
+
+    return ((now or clock.now()) - state.started_at).total_seconds()
+
+
+def get_paused_seconds(state: TimerState, clock: Clock = SYSTEM_CLOCK, now: datetime | None = None) -> float:
+    """Finished pauses plus the current one up to `now`, if the timer is paused."""
+    paused = state.paused_seconds
+    if state.is_paused and state.paused_at:
+        paused += ((now or clock.now()) - state.paused_at).total_seconds()
+    return paused
@@ -1,7 +1,19 @@
-from datetime import datetime, timedelta
 from collections import defaultdict
 from models import StudySession
 
+WEEKDAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+def format_duration(seconds: int) -> str:
+    hours = seconds // 3600
+    minutes = (seconds % 3600) // 60
+    secs = seconds % 60
+    if hours > 0:
+        return f"{hours}h {minutes}m"
+    if minutes > 0:
+        return f"{minutes}m {secs}s"
+    return f"{secs}s"
+
 
 def get_total_time(sessions: list[StudySession]) -> int:
     return sum(s.duration_seconds for s in sessions)
@@ -28,11 +40,6 @@ def get_time_by_mode(sessions: list[StudySession]) -> dict[str, int]:
     return dict(by_mode)
 
 
-def get_sessions_last_n_days(sessions: list[StudySession], days: int) -> list[StudySession]:
-    cutoff = datetime.now() - timedelta(days=days)
-    return [s for s in sessions if s.start_time >= cutoff]
-
-
 def get_average_session_duration(sessions: list[StudySession]) -> int:
     if not sessions:
         return 0
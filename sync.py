@@ -0,0 +1,495 @@
+"""Keeping several installs in step by exchanging changeset files.
+
+    cybersyn sync export ~/Dropbox/cybersyn
+    cybersyn sync apply ~/Dropbox/cybersyn
+
+Each install is a device with a random id. Sessions get a global id the
+first time sync sees them, and every local change found in the
+`session_changes` log since the last look is stamped with a version
+(a Lamport clock and the device id) and the next number in the device's
+own sequence. `export` writes the sessions stamped since the previous
+export to one gzipped changeset file covering that range of the
+sequence, so its cost follows the number of changes, not the history.
+
+`apply` reads changesets from other devices, in sequence order per
+device, and refuses to skip over a missing range. A change replaces the
+local row only if its version is higher: the larger clock wins, the
+device id breaks ties, so every install ends up with the same rows
+whatever order the files arrive in. Deletes are kept as versioned
+tombstones so an older update cannot bring a row back. Everything in one
+`apply` commits in a single transaction. Running sessions are sent once
+they are stopped; archived sessions are not synced.
+
+A restore can take the database back to before some of its exports. The
+highest sequence number exported under each device id is therefore also
+kept in data/sync.json, outside the database and its backups. When the
+database is behind it, the install continues under a new device id, so
+peers never get different changes under numbers they have applied, and
+its earlier changesets are applied like another device's.
+
+Like `backup` and `maintain`, this uses sqlite3 directly; the triggers
+on `sessions` keep totals, the search index and the change log current.
+"""
+import gzip
+import json
+import os
+import sqlite3
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+import paths
+# Creates the database on a new install, with the triggers that fill the change log
+from database import DB_PATH
+
+FORMAT = 1
+SUFFIX = ".cybersync.gz"
+PUBLISHED_FILE = Path(paths.DATA_DIR) / "sync.json"
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value)",
+    # One row per session ever synced; tombstones keep their version with no session
+    """
+    CREATE TABLE IF NOT EXISTS sync_rows (
+        uid TEXT PRIMARY KEY,
+        session_id INTEGER UNIQUE,
+        clock INTEGER NOT NULL,
+        device TEXT NOT NULL,
+        out_seq INTEGER,
+        deleted INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_sync_rows_out_seq ON sync_rows (out_seq)",
+    # Global ids that turned out to name the same session as another, and the device that sent them
+    "CREATE TABLE IF NOT EXISTS sync_aliases (uid TEXT PRIMARY KEY, target TEXT NOT NULL, device TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_sync_aliases_target ON sync_aliases (target)",
+    "CREATE TABLE IF NOT EXISTS sync_peers (device TEXT PRIMARY KEY, applied_seq INTEGER NOT NULL)",
+]
+
+# Session columns carried by a changeset record, after uid, clock and device
+FIELDS = ["task", "category", "mode", "start_time", "end_time", "duration_seconds", "paused_seconds", "school_week"]
+
+
+@dataclass
+class ExportResult:
+    path: Path | None
+    records: int
+    first_seq: int
+    last_seq: int
+
+
+@dataclass
+class ApplyResult:
+    files: int = 0
+    # Changes that replaced or created a local row
+    applied: int = 0
+    # Changes older than, or the same as, what is already here
+    skipped: int = 0
+    # Sessions that both sides had already, recognised by their contents
+    matched: int = 0
+
+
+@dataclass
+class SyncStatus:
+    device: str | None
+    # Local changes not in any changeset yet
+    pending: int
+    exported_seq: int
+    peers: dict[str, int]
+
+
+def _connect() -> sqlite3.Connection:
+    # Autocommit; transactions are opened explicitly
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    conn.execute("PRAGMA busy_timeout = 5000")
+    for statement in SCHEMA:
+        conn.execute(statement)
+    return conn
+
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection) -> Iterator[None]:
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _state(conn: sqlite3.Connection) -> dict:
+    state = {"device": None, "clock": 0, "stamped_seq": 0, "out_seq": 0, "exported_seq": 0}
+    state.update(conn.execute("SELECT key, value FROM sync_state").fetchall())
+    return state
+
+
+def _save_state(conn: sqlite3.Connection, state: dict) -> None:
+    conn.executemany("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", state.items())
+
+
+def _change_seq(conn: sqlite3.Connection) -> int:
+    return conn.execute("SELECT coalesce(max(seq), 0) FROM session_changes").fetchone()[0]
+
+
+def _published() -> dict:
+    """Highest sequence number exported per device id, and the highest clock exported."""
+    try:
+        with open(PUBLISHED_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"clock": 0, "exported": {}}
+
+
+def _record_export(device: str, last: int, clock: int) -> None:
+    published = _published()
+    published["exported"][device] = max(last, published["exported"].get(device, 0))
+    published["clock"] = max(clock, published["clock"])
+    tmp = PUBLISHED_FILE.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(published, f)
+    os.replace(tmp, PUBLISHED_FILE)
+
+
+def _rotate_if_restored(conn: sqlite3.Connection, state: dict) -> None:
+    """Take a new device id if the database was restored to before some of this device's exports.
+
+    Changes stamped but not exported at that point are renumbered in the
+    new sequence with their versions unchanged, and the clock moves past
+    every version exported, so new local edits still win.
+    """
+    published = _published()
+    device = state["device"]
+    if device is None or state["exported_seq"] >= published["exported"].get(device, 0):
+        return
+    # The old id's changesets after the restore point are applied like any peer's
+    conn.execute(
+        "INSERT OR REPLACE INTO sync_peers (device, applied_seq) VALUES (?, ?)", (device, state["exported_seq"])
+    )
+    pending = conn.execute(
+        "SELECT uid FROM sync_rows WHERE out_seq > ? ORDER BY out_seq", (state["exported_seq"],)
+    ).fetchall()
+    conn.execute("UPDATE sync_rows SET out_seq = NULL WHERE out_seq IS NOT NULL")
+    conn.executemany(
+        "UPDATE sync_rows SET out_seq = ? WHERE uid = ?", [(seq, uid) for seq, (uid,) in enumerate(pending, 1)]
+    )
+    state.update(
+        device=uuid.uuid4().hex[:16],
+        clock=max(state["clock"], published["clock"]),
+        out_seq=len(pending),
+        exported_seq=0,
+    )
+
+
+def _setup(conn: sqlite3.Connection, state: dict) -> None:
+    """Make this install a device: every existing session is stamped, to go out in the first export."""
+    state["device"] = uuid.uuid4().hex[:16]
+    state["clock"] = 1
+    conn.execute(
+        """
+        INSERT INTO sync_rows (uid, session_id, clock, device, out_seq)
+        SELECT lower(hex(randomblob(16))), id, 1, ?, row_number() OVER (ORDER BY id) FROM sessions
+        """,
+        (state["device"],),
+    )
+    state["out_seq"] = conn.execute("SELECT coalesce(max(out_seq), 0) FROM sync_rows").fetchone()[0]
+    state["stamped_seq"] = _change_seq(conn)
+
+
+def _stamp(conn: sqlite3.Connection, state: dict) -> None:
+    """Give a new version and sequence number to every session changed locally since the last stamp."""
+    if state["device"] is None:
+        _setup(conn, state)
+        return
+    changes = conn.execute(
+        "SELECT seq, session_id, op FROM session_changes WHERE seq > ? ORDER BY seq", (state["stamped_seq"],)
+    ).fetchall()
+    if not changes:
+        return
+
+    dirty, created = {}, set()
+    for _, session_id, op in changes:
+        # 'reset' marks rebuilds of derived data and archive moves, not edits
+        if op == "reset":
+            continue
+        row = conn.execute("SELECT uid FROM sync_rows WHERE session_id = ?", (session_id,)).fetchone()
+        uid = row[0] if row else None
+        if op == "delete":
+            if uid is None:
+                continue
+            if uid in created:
+                # Never left this device; nothing to tell anyone
+                conn.execute("DELETE FROM sync_rows WHERE uid = ?", (uid,))
+                dirty.pop(uid, None)
+                continue
+            conn.execute("UPDATE sync_rows SET session_id = NULL, deleted = 1 WHERE uid = ?", (uid,))
+        elif uid is None or op == "insert":
+            if uid is not None:
+                # The id of a deleted session was reused
+                conn.execute("UPDATE sync_rows SET session_id = NULL, deleted = 1 WHERE uid = ?", (uid,))
+                dirty[uid] = True
+            uid = uuid.uuid4().hex
+            created.add(uid)
+            conn.execute(
+                "INSERT INTO sync_rows (uid, session_id, clock, device) VALUES (?, ?, 0, ?)",
+                (uid, session_id, state["device"]),
+            )
+        dirty[uid] = True
+
+    state["clock"] += 1
+    for uid in dirty:
+        state["out_seq"] += 1
+        conn.execute(
+            "UPDATE sync_rows SET clock = ?, device = ?, out_seq = ? WHERE uid = ?",
+            (state["clock"], state["device"], state["out_seq"], uid),
+        )
+    state["stamped_seq"] = changes[-1][0]
+
+
+def export_changes(directory: Path) -> ExportResult:
+    """Write local changes made since the previous export to a changeset file in `directory`."""
+    conn = _connect()
+    try:
+        with _transaction(conn):
+            state = _state(conn)
+            _rotate_if_restored(conn, state)
+            _stamp(conn, state)
+            _save_state(conn, state)
+            rows = conn.execute(
+                """
+                SELECT r.uid, r.clock, r.device, r.deleted, s.id, s.task, c.name, m.name, s.start_time, s.end_time,
+                       coalesce(s.duration_seconds, 0), coalesce(s.paused_seconds, 0), s.school_week
+                FROM sync_rows r
+                LEFT JOIN sessions s ON s.id = r.session_id
+                LEFT JOIN categories c ON c.id = s.category_id
+                LEFT JOIN modes m ON m.id = s.mode_id
+                WHERE r.out_seq > ?
+                ORDER BY r.out_seq
+                """,
+                (state["exported_seq"],),
+            ).fetchall()
+
+        device, first, last = state["device"], state["exported_seq"], state["out_seq"]
+        records = []
+        # Each record carries its own version; it is the file's device unless renumbered after a restore
+        for uid, clock, version_device, deleted, session_id, *values in rows:
+            if deleted:
+                records.append([uid, clock, version_device])
+            # Archived, or still running: a running session goes out once it is stopped
+            elif session_id is not None and values[4] is not None:
+                records.append([uid, clock, version_device, *values])
+
+        path = None
+        if records:
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / f"{device}-{first + 1:010d}-{last:010d}{SUFFIX}"
+            if path.exists():
+                # Peers may have applied it already; its numbers cannot carry other changes
+                raise ValueError(f"{path} already exists")
+            tmp = path.with_name(path.name + ".tmp")
+            header = {"format": FORMAT, "device": device, "first": first + 1, "last": last, "fields": FIELDS}
+            lines = [json.dumps(header)] + [json.dumps(record, separators=(",", ":")) for record in records]
+            # Level 6 compresses nearly as well as 9, in a fraction of the time
+            with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(tmp, path)
+            # Only once the file is in place, so a failed write is retried by the next export.
+            # Without a file the range stays open: peers must see every number in order
+            conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES ('exported_seq', ?)", (last,))
+            _record_export(device, last, state["clock"])
+    finally:
+        conn.close()
+    return ExportResult(path, len(records), first + 1, last)
+
+
+def _read_changeset(path: Path) -> tuple[dict, list[list]]:
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            records = [json.loads(line) for line in f]
+    except (OSError, EOFError, json.JSONDecodeError) as e:
+        raise ValueError(f"{path.name}: not a readable changeset ({e})")
+    if not isinstance(header, dict) or header.get("format") != FORMAT or header.get("fields") != FIELDS:
+        raise ValueError(f"{path.name}: unsupported changeset format")
+    return header, records
+
+
+def _changeset_paths(paths: list[Path]) -> list[Path]:
+    found = []
+    for path in paths:
+        found.extend(sorted(path.glob(f"*{SUFFIX}")) if path.is_dir() else [path])
+    return found
+
+
+class _Names:
+    """Category and mode ids by name for one apply, creating missing names."""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+        self.ids: dict[tuple[str, str], int] = {}
+
+    def id_of(self, table: str, name: str) -> int:
+        key = (table, name)
+        if key not in self.ids:
+            row = self.conn.execute(f"SELECT id FROM {table} WHERE name = ?", (name,)).fetchone()
+            if row is None and table == "categories":
+                row = self.conn.execute("SELECT category_id FROM category_aliases WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                row = (self.conn.execute(f"INSERT INTO {table} (name) VALUES (?)", (name,)).lastrowid,)
+            self.ids[key] = row[0]
+        return self.ids[key]
+
+
+def _match(conn: sqlite3.Connection, uid: str, device: str, values: list, names: _Names) -> tuple | None:
+    """Recognise a session both sides already had, e.g. copied over by hand before syncing.
+
+    Rows last written by the sending device, or already matched to one of
+    its sessions, are not candidates: the sender has its own ids for
+    those. The two global ids are folded into the smaller one on each
+    side, so both sides settle on the same id.
+    """
+    task, category, _, start_time, _, duration = values[:6]
+    row = conn.execute(
+        """
+        SELECT r.uid FROM sessions s JOIN sync_rows r ON r.session_id = s.id
+        WHERE s.start_time = ? AND s.task = ? AND s.category_id = ? AND coalesce(s.duration_seconds, 0) = ?
+            AND r.device != ? AND r.uid NOT IN (SELECT target FROM sync_aliases WHERE device = ?)
+        ORDER BY r.uid LIMIT 1
+        """,
+        (start_time, task, names.id_of("categories", category), duration, device, device),
+    ).fetchone()
+    if row is None:
+        return None
+    keep, drop = sorted((row[0], uid))
+    if keep != row[0]:
+        conn.execute("UPDATE sync_rows SET uid = ? WHERE uid = ?", (keep, row[0]))
+    conn.execute("UPDATE sync_aliases SET target = ? WHERE target = ?", (keep, row[0]))
+    conn.execute("INSERT OR REPLACE INTO sync_aliases (uid, target, device) VALUES (?, ?, ?)", (drop, keep, device))
+    return conn.execute(
+        "SELECT uid, session_id, clock, device FROM sync_rows WHERE uid = ?", (keep,)
+    ).fetchone()
+
+
+def _apply_record(conn: sqlite3.Connection, record: list, names: _Names, result: ApplyResult) -> None:
+    uid, clock, device, *values = record
+    alias = conn.execute("SELECT target FROM sync_aliases WHERE uid = ?", (uid,)).fetchone()
+    uid = alias[0] if alias else uid
+    local = conn.execute("SELECT uid, session_id, clock, device FROM sync_rows WHERE uid = ?", (uid,)).fetchone()
+    if local is None and values:
+        local = _match(conn, uid, device, values, names)
+        if local is not None:
+            result.matched += 1
+            uid = local[0]
+
+    if local is not None and (clock, device) <= (local[2], local[3]):
+        result.skipped += 1
+        return
+    session_id = local[1] if local else None
+
+    if not values:
+        if session_id is not None:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            conn.execute("DELETE FROM pomodoro_phases WHERE session_id = ?", (session_id,))
+        session_id = None
+    else:
+        task, category, mode, start_time, end_time, duration, paused, week = values
+        row = (
+            task, names.id_of("categories", category), names.id_of("modes", mode),
+            start_time, end_time, duration, paused, week,
+        )
+        if session_id is not None:
+            conn.execute(
+                """
+                UPDATE sessions SET task = ?, category_id = ?, mode_id = ?, start_time = ?, end_time = ?,
+                    duration_seconds = ?, paused_seconds = ?, school_week = ?
+                WHERE id = ?
+                """,
+                (*row, session_id),
+            )
+        else:
+            session_id = conn.execute(
+                """
+                INSERT INTO sessions (task, category_id, mode_id, start_time, end_time,
+                    duration_seconds, paused_seconds, school_week)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                row,
+            ).lastrowid
+
+    conn.execute(
+        """
+        INSERT INTO sync_rows (uid, session_id, clock, device, out_seq, deleted) VALUES (?, ?, ?, ?, NULL, ?)
+        ON CONFLICT (uid) DO UPDATE SET
+            session_id = excluded.session_id, clock = excluded.clock, device = excluded.device,
+            out_seq = NULL, deleted = excluded.deleted
+        """,
+        (uid, session_id, clock, device, int(not values)),
+    )
+    result.applied += 1
+
+
+def apply_changes(paths: list[Path], force: bool = False) -> ApplyResult:
+    """Apply changesets from other devices found at `paths` (files or directories).
+
+    Raises ValueError if a device's changes have a gap, unless `force`
+    is set; nothing is applied in that case.
+    """
+    changesets = [_read_changeset(path) + (path,) for path in _changeset_paths(paths)]
+    changesets.sort(key=lambda c: (c[0]["device"], c[0]["first"]))
+    result = ApplyResult()
+
+    conn = _connect()
+    try:
+        with _transaction(conn):
+            state = _state(conn)
+            _rotate_if_restored(conn, state)
+            # Local edits get their versions first, so they are weighed against incoming ones
+            _stamp(conn, state)
+            peers = dict(conn.execute("SELECT device, applied_seq FROM sync_peers").fetchall())
+            names = _Names(conn)
+
+            for header, records, path in changesets:
+                device = header["device"]
+                applied = peers.get(device, 0)
+                if device == state["device"] or header["last"] <= applied:
+                    continue
+                if header["first"] > applied + 1 and not force:
+                    raise ValueError(
+                        f"Changes {applied + 1}-{header['first'] - 1} from device {device} are missing "
+                        f"(before {path.name}); apply them first or use --force"
+                    )
+                for record in records:
+                    _apply_record(conn, record, names, result)
+                    state["clock"] = max(state["clock"], record[1])
+                peers[device] = header["last"]
+                result.files += 1
+
+            conn.executemany("INSERT OR REPLACE INTO sync_peers (device, applied_seq) VALUES (?, ?)", peers.items())
+            # What this apply wrote to the change log is not a local edit
+            state["stamped_seq"] = _change_seq(conn)
+            _save_state(conn, state)
+    finally:
+        conn.close()
+    return result
+
+
+def sync_status() -> SyncStatus:
+    conn = _connect()
+    try:
+        state = _state(conn)
+        if state["device"] is None:
+            pending = conn.execute("SELECT count(*) FROM sessions").fetchone()[0]
+        else:
+            stamped = conn.execute(
+                "SELECT count(*) FROM sync_rows WHERE out_seq > ?", (state["exported_seq"],)
+            ).fetchone()[0]
+            unstamped = conn.execute(
+                "SELECT count(DISTINCT session_id) FROM session_changes WHERE seq > ? AND op != 'reset'",
+                (state["stamped_seq"],),
+            ).fetchone()[0]
+            pending = stamped + unstamped
+        peers = dict(conn.execute("SELECT device, applied_seq FROM sync_peers ORDER BY device").fetchall())
+    finally:
+        conn.close()
+    return SyncStatus(state["device"], pending, state["exported_seq"], peers)
@@ -0,0 +1,149 @@
+import shutil
+import numpy as np
+from aggregates import Aggregates
+
+# Same palette as the matplotlib charts
+CATEGORY_COLORS = ['#2E86AB', '#A23B72', '#F18F01', '#06A77D', '#C73E1D', '#6A4C93', '#E63946', '#06FFA5']
+# Approximation of matplotlib's YlGn, empty cells first
+HEAT_COLORS = ['#303030', '#d9f0a3', '#addd8e', '#78c679', '#31a354', '#006837']
+# Shades standing in for HEAT_COLORS when color is off
+HEAT_GLYPHS = " ░▒▓██"
+LINE_COLOR = '#2E86AB'
+HOUR_COLOR = '#06A77D'
+
+BLOCKS = " ▁▂▃▄▅▆▇█"
+HBLOCKS = " ▏▎▍▌▋▊▉█"
+WEEKDAY_LABELS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+RESET = "\x1b[0m"
+
+
+def _fg(hex_color: str, color: bool) -> str:
+    if not color:
+        return ""
+    r, g, b = (int(hex_color[i:i + 2], 16) for i in (1, 3, 5))
+    return f"\x1b[38;2;{r};{g};{b}m"
+
+
+def _reset(color: bool) -> str:
+    return RESET if color else ""
+
+
+def _heat_cell(level: int, color: bool) -> str:
+    if color:
+        return f"{_fg(HEAT_COLORS[level], color)}██"
+    return HEAT_GLYPHS[level] * 2
+
+
+def _columns(values: np.ndarray, height: int) -> list[str]:
+    """Vertical bar chart rows, top row first, using eighth blocks."""
+    peak = values.max()
+    if peak <= 0:
+        eighths = np.zeros(len(values), dtype=np.int64)
+    else:
+        eighths = np.rint(values / peak * height * 8).astype(np.int64)
+
+    rows = []
+    for level in range(height - 1, -1, -1):
+        cell = np.clip(eighths - level * 8, 0, 8)
+        rows.append("".join(BLOCKS[c] for c in cell))
+    return rows
+
+
+def _resample(values: np.ndarray, width: int) -> np.ndarray:
+    """Average consecutive values into at most `width` buckets."""
+    if len(values) <= width:
+        return values.astype(np.float64)
+    edges = np.linspace(0, len(values), width + 1).astype(np.int64)
+    sums = np.add.reduceat(values, edges[:-1])
+    return sums / np.diff(edges)
+
+
+def render_time_series(aggregates: Aggregates, width: int, height: int = 8, color: bool = True) -> list[str]:
+    first, last = aggregates.day_range()
+    start = int(first.astype(np.int64)) - aggregates.day0
+    end = int(last.astype(np.int64)) - aggregates.day0 + 1
+    daily_hours = aggregates.daily_seconds[start:end] / 3600
+
+    plot_width = width - 8
+    values = _resample(daily_hours, plot_width)
+    per_column = len(daily_hours) / len(values)
+
+    lines = [f"Study Sessions Over Time (avg hours/day, {per_column:.1f} days per column)"]
+    peak = values.max()
+    for i, row in enumerate(_columns(values, height)):
+        label = f"{peak:5.1f}h " if i == 0 else " " * 7
+        lines.append(f"{label}│{_fg(LINE_COLOR, color)}{row}{_reset(color)}")
+    lines.append(" " * 7 + "└" + "─" * len(values))
+    first_label, last_label = str(first), str(last)
+    gap = max(1, len(values) - len(first_label) - len(last_label))
+    lines.append(" " * 8 + first_label + " " * gap + last_label)
+    return lines
+
+
+def render_category_bars(aggregates: Aggregates, width: int, color: bool = True) -> list[str]:
+    totals = aggregates.category_totals()
+    grand_total = sum(seconds for _, seconds in totals) or 1
+    name_width = min(20, max(len(name) for name, _ in totals))
+    bar_width = max(10, width - name_width - 18)
+    peak = totals[0][1] or 1
+
+    lines = ["Study Time by Category"]
+    for i, (name, seconds) in enumerate(totals):
+        eighths = int(round(seconds / peak * bar_width * 8))
+        bar = "█" * (eighths // 8) + (HBLOCKS[eighths % 8] if eighths % 8 else "")
+        label = name[:name_width - 2] + ".." if len(name) > name_width else name
+        hex_color = CATEGORY_COLORS[i % len(CATEGORY_COLORS)]
+        lines.append(
+            f"{label:<{name_width}} {_fg(hex_color, color)}{bar:<{bar_width}}{_reset(color)}"
+            f" {seconds / 3600:7.1f}h ({seconds / grand_total * 100:3.0f}%)"
+        )
+    return lines
+
+
+def render_heatmap(aggregates: Aggregates, width: int, color: bool = True) -> list[str]:
+    grid = aggregates.heatmap_grid() / 3600
+    weeks = max(1, (width - 4) // 2)
+    grid = grid[:, -weeks:]
+
+    peak = grid.max()
+    if peak > 0:
+        levels = np.ceil(grid / peak * (len(HEAT_COLORS) - 1)).astype(np.int64)
+    else:
+        levels = np.zeros(grid.shape, dtype=np.int64)
+
+    lines = [f"Study Activity Heatmap (last {grid.shape[1]} weeks)"]
+    for label, row in zip(WEEKDAY_LABELS, levels):
+        lines.append(f"{label} {''.join(_heat_cell(level, color) for level in row)}{_reset(color)}")
+    legend = " ".join(f"{_heat_cell(level, color)}{_reset(color)}" for level in range(len(HEAT_COLORS)))
+    lines.append(f"    less {legend} more (max {peak:.1f}h/day)")
+    return lines
+
+
+def render_time_of_day(aggregates: Aggregates, height: int = 6, color: bool = True) -> list[str]:
+    hours = aggregates.hourly_seconds / 3600
+    # Two characters per hour
+    values = np.repeat(hours, 2)
+
+    lines = ["Study Time by Hour of Day (total hours)"]
+    peak = hours.max()
+    for i, row in enumerate(_columns(values, height)):
+        label = f"{peak:6.0f}h " if i == 0 else " " * 8
+        lines.append(f"{label}│{_fg(HOUR_COLOR, color)}{row}{_reset(color)}")
+    lines.append(" " * 8 + "└" + "─" * len(values))
+    lines.append(" " * 9 + "".join(f"{h:02d}      " for h in range(0, 24, 4)))
+    return lines
+
+
+def render_dashboard(aggregates: Aggregates, width: int | None = None, color: bool = True) -> str:
+    """All four charts as one block of text, sized to the terminal."""
+    if width is None:
+        width = shutil.get_terminal_size().columns
+    width = max(40, width)
+
+    sections = [
+        render_time_series(aggregates, width, color=color),
+        render_category_bars(aggregates, width, color=color),
+        render_heatmap(aggregates, width, color=color),
+        render_time_of_day(aggregates, color=color),
+    ]
+    return "\n\n".join("\n".join(section) for section in sections)
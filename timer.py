@@ -1,116 +1,178 @@
-import time
-from datetime import datetime
+from datetime import datetime, timedelta
 from models import StudySession, TimerState
-from state import load_state, save_state, clear_state
-from database import save_session, update_session
-from pomodoro import init_pomodoro_state
+from state import load_timers, edit_timers, get_elapsed_seconds, get_paused_seconds
+from pomodoro import log_phases
+from hooks import emit
+from clock import Clock, SYSTEM_CLOCK
 
 
-def start_session(task: str, category: str, week: int, mode: str = "stopwatch") -> StudySession:
-    state = load_state()
-    if state.is_running:
-        raise RuntimeError("A session is already running. Stop it first.")
+# Pure state transitions. They take the current time instead of reading
+# it, so the simulator can replay them without touching disk; the
+# functions that save sessions import the database themselves, since
+# importing it creates data/ and the schema.
 
-    session = StudySession(
-        task=task,
-        category=category,
-        start_time=datetime.now(),
-        mode=mode,
-        school_week=week,
-    )
-
-    session_id = save_session(session)
-    session.id = session_id
-
-    new_state = TimerState(
+def begin_timer(session_id: int, mode: str, now: datetime) -> TimerState:
+    return TimerState(
         session_id=session_id,
         is_running=True,
         mode=mode,
-        started_at=datetime.now(),
+        started_at=now,
     )
 
-    if mode == "pomodoro":
-        new_state = init_pomodoro_state(new_state)
-
-    save_state(new_state)
 
-    return session
-
-
-def pause_session() -> tuple[int, int]:
-    state = load_state()
+def apply_pause(state: TimerState, now: datetime) -> TimerState:
     if not state.is_running:
         raise RuntimeError("No active session to pause.")
     if state.is_paused:
         raise RuntimeError("Session is already paused.")
 
     state.is_paused = True
-    state.paused_at = datetime.now()
-    save_state(state)
-
-    elapsed = get_elapsed_seconds(state)
-    return state.session_id, elapsed
+    state.paused_at = now
+    return state
 
 
-def resume_session() -> tuple[int, int]:
-    state = load_state()
+def apply_resume(state: TimerState, now: datetime) -> TimerState:
     if not state.is_running:
         raise RuntimeError("No active session to resume.")
     if not state.is_paused:
         raise RuntimeError("Session is not paused.")
 
     if state.paused_at and state.started_at:
-        pause_duration = (datetime.now() - state.paused_at).total_seconds()
-        state.started_at = datetime.fromtimestamp(
-            state.started_at.timestamp() + pause_duration
-        )
+        pause_duration = (now - state.paused_at).total_seconds()
+        state.started_at = state.started_at + timedelta(seconds=pause_duration)
+        state.paused_seconds += pause_duration
 
     state.is_paused = False
     state.paused_at = None
-    save_state(state)
-
-    elapsed = get_elapsed_seconds(state)
-    return state.session_id, int(elapsed)
+    return state
 
 
-def stop_session() -> StudySession:
-    state = load_state()
+def finish_timer(state: TimerState, now: datetime) -> tuple[int, int]:
+    """Active and paused seconds of a session stopped at `now`."""
     if not state.is_running:
         raise RuntimeError("No active session to stop.")
 
-    elapsed = get_elapsed_seconds(state)
-    paused_seconds = 0
+    return int(get_elapsed_seconds(state, now=now)), int(get_paused_seconds(state, now=now))
+
+
+def pick_timer(timers: dict[str, TimerState], timer_id: str | None, action: str) -> str:
+    """The id of the timer a command acts on; `timer_id` may be left out when only one runs."""
+    if timer_id is not None:
+        if timer_id not in timers:
+            raise RuntimeError(f"No running timer '{timer_id}'.")
+        return timer_id
+    if not timers:
+        raise RuntimeError(f"No active session to {action}.")
+    if len(timers) > 1:
+        raise RuntimeError(f"Several timers are running ({', '.join(timers)}); choose one with --id.")
+    return next(iter(timers))
+
+
+def start_session(
+    task: str,
+    category: str,
+    week: int,
+    mode: str = "stopwatch",
+    timer_id: str | None = None,
+    clock: Clock = SYSTEM_CLOCK,
+) -> tuple[str, StudySession]:
+    """Start a session on a new timer; returns the timer id and the session.
+
+    Without `timer_id` the timer is named after the session id, so plain
+    numbers are reserved for those.
+    """
+    from database import get_session, save_session
+
+    if timer_id is not None and timer_id.isdigit():
+        raise RuntimeError("Timer ids given with --id must not be plain numbers.")
+
+    with edit_timers() as timers:
+        if timer_id in timers:
+            raise RuntimeError(f"Timer '{timer_id}' is already running. Stop it first.")
+
+        now = clock.now()
+        session = StudySession(
+            task=task,
+            category=category,
+            start_time=now,
+            mode=mode,
+            school_week=week,
+        )
+
+        session_id = save_session(session)
+        session.id = session_id
+        timer_id = timer_id or str(session_id)
+        timers[timer_id] = begin_timer(session_id, mode, now)
 
-    if state.paused_at and state.started_at:
-        paused_seconds = int((datetime.now() - state.paused_at).total_seconds())
+    # As stored, with the category name resolved
+    emit("session.started", lambda: {"timer_id": timer_id, **get_session(session.id).model_dump(mode="json")})
+    return timer_id, session
+
+
+def pause_session(timer_id: str | None = None, clock: Clock = SYSTEM_CLOCK) -> tuple[int, int]:
+    with edit_timers() as timers:
+        timer_id = pick_timer(timers, timer_id, "pause")
+        state = apply_pause(timers[timer_id], clock.now())
+        timers[timer_id] = log_phases(state, clock)
 
-    update_session(
-        state.session_id,
-        end_time=datetime.now(),
-        duration_seconds=int(elapsed),
-        paused_seconds=paused_seconds,
+    elapsed = get_elapsed_seconds(state, clock)
+    emit(
+        "session.paused",
+        lambda: {"timer_id": timer_id, "session_id": state.session_id, "elapsed_seconds": int(elapsed)},
     )
+    return state.session_id, int(elapsed)
 
-    clear_state()
 
-    from database import get_session
-    return get_session(state.session_id)
+def resume_session(timer_id: str | None = None, clock: Clock = SYSTEM_CLOCK) -> tuple[int, int]:
+    with edit_timers() as timers:
+        timer_id = pick_timer(timers, timer_id, "resume")
+        state = timers[timer_id] = apply_resume(timers[timer_id], clock.now())
 
+    elapsed = get_elapsed_seconds(state, clock)
+    emit(
+        "session.resumed",
+        lambda: {"timer_id": timer_id, "session_id": state.session_id, "elapsed_seconds": int(elapsed)},
+    )
+    return state.session_id, int(elapsed)
 
-def get_current_status() -> tuple[TimerState, int] | None:
-    state = load_state()
-    if not state.is_running:
-        return None
 
-    elapsed = get_elapsed_seconds(state)
-    return state, int(elapsed)
+def stop_session(timer_id: str | None = None, clock: Clock = SYSTEM_CLOCK) -> StudySession:
+    from database import get_session, update_session
+
+    with edit_timers() as timers:
+        timer_id = pick_timer(timers, timer_id, "stop")
+        state = timers[timer_id]
+
+        now = clock.now()
+        state = log_phases(state, clock)
+        elapsed, paused_seconds = finish_timer(state, now)
 
+        update_session(
+            state.session_id,
+            end_time=now,
+            duration_seconds=elapsed,
+            paused_seconds=paused_seconds,
+        )
+
+        del timers[timer_id]
+
+    session = get_session(state.session_id)
+    emit("session.stopped", {"timer_id": timer_id, **session.model_dump(mode="json")})
+    return session
 
-def get_elapsed_seconds(state: TimerState) -> float:
-    if not state.started_at:
-        return 0.0
 
-    if state.is_paused and state.paused_at:
-        return (state.paused_at - state.started_at).total_seconds()
+def get_running_timers(clock: Clock = SYSTEM_CLOCK) -> list[tuple[str, TimerState, int]]:
+    """Every running timer with its elapsed seconds, oldest first."""
+    return [
+        (timer_id, state, int(get_elapsed_seconds(state, clock)))
+        for timer_id, state in sorted(load_timers().items(), key=lambda item: item[1].started_at)
+    ]
 
-    return (datetime.now() - state.started_at).total_seconds()
+
+def get_current_status(timer_id: str, clock: Clock = SYSTEM_CLOCK) -> tuple[TimerState, int] | None:
+    state = load_timers().get(timer_id)
+    if state is None or not state.is_running:
+        return None
+
+    elapsed = get_elapsed_seconds(state, clock)
+    return state, int(elapsed)
@@ -0,0 +1,118 @@
+"""Bucketing, downsampling and trend lines for long time series.
+
+Times are numpy datetime64 arrays. `resample` sums values into hour,
+day, week (Monday first), month or year buckets over the whole range, empty
+buckets included; `choose_resolution` picks the finest resolution that
+keeps the bucket count bounded; `lttb` selects a bounded number of points
+that keep the shape of the line. Trends are trailing moving averages,
+computed with np.convolve rather than a per-point loop.
+"""
+import numpy as np
+
+RESOLUTIONS = ["hour", "day", "week", "month", "year"]
+UNITS = {"hour": "h", "day": "D", "week": "D", "month": "M", "year": "Y"}
+# Rough bucket lengths in days, only used to pick a resolution
+BUCKET_DAYS = {"hour": 1 / 24, "day": 1, "week": 7, "month": 30.44, "year": 365.25}
+# Trend window in buckets per resolution
+TREND_WINDOWS = {"hour": 24, "day": 7, "week": 4, "month": 3, "year": 2}
+
+MAX_BUCKETS = 500
+MAX_POINTS = 250
+
+
+def floor_to(times: np.ndarray, resolution: str) -> np.ndarray:
+    """Start of the bucket each time falls in."""
+    floored = times.astype(f"datetime64[{UNITS[resolution]}]")
+    if resolution == "week":
+        # Day 0 (1970-01-01) was a Thursday
+        floored = floored - (floored.astype(np.int64) + 3) % 7
+    return floored
+
+
+def choose_resolution(first: np.datetime64, last: np.datetime64, finest: str = "hour", max_buckets: int = MAX_BUCKETS) -> str:
+    """The finest resolution, no finer than `finest`, giving at most `max_buckets` buckets."""
+    span_days = (last - first) / np.timedelta64(1, "D") + 1
+    for resolution in RESOLUTIONS[RESOLUTIONS.index(finest):]:
+        if span_days / BUCKET_DAYS[resolution] <= max_buckets:
+            return resolution
+    return "year"
+
+
+def resample(times: np.ndarray, values: np.ndarray, resolution: str) -> tuple[np.ndarray, np.ndarray]:
+    """Sum `values` per bucket from the first time to the last.
+
+    Returns the bucket starts and totals, with zeros for empty buckets.
+    """
+    if not len(times):
+        return floor_to(np.asarray(times), resolution), np.zeros(0, dtype=np.asarray(values).dtype)
+
+    floored = floor_to(times, resolution)
+    # Weeks are counted from the Monday before day 0
+    step, shift = (7, 3) if resolution == "week" else (1, 0)
+    ordinals = (floored.astype(np.int64) + shift) // step
+    first = ordinals.min()
+    totals = np.bincount(ordinals - first, weights=values, minlength=int(ordinals.max() - first + 1))
+    starts = ((first + np.arange(len(totals))) * step - shift).astype(floored.dtype)
+    return starts, totals
+
+
+def lttb(y: np.ndarray, threshold: int = MAX_POINTS, x: np.ndarray | None = None) -> np.ndarray:
+    """Indices of at most `threshold` points chosen by Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept. Between them, each bucket
+    contributes the point forming the largest triangle with the previous
+    pick and the mean of the next bucket, which preserves peaks and dips
+    that plain averaging flattens.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.arange(n, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+
+    # Mean of each bucket, the third corner for the bucket before it
+    sizes = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / sizes
+    mean_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / sizes
+    mean_x = np.append(mean_x[1:], x[-1])
+    mean_y = np.append(mean_y[1:], y[-1])
+
+    picks = np.empty(threshold, dtype=np.int64)
+    picks[0], picks[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs(
+            (x[a] - mean_x[i]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (mean_y[i] - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        picks[i + 1] = a
+    return picks
+
+
+def _trailing(values: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+    """Weighted trailing average; the first points use the part of the kernel they have."""
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    sums = np.convolve(values, kernel)[:n]
+    weights = np.convolve(np.ones(n), kernel)[:n]
+    return sums / weights
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Mean of each value and the `window - 1` before it."""
+    return _trailing(values, np.ones(max(1, window)))
+
+
+def ewma(values: np.ndarray, span: int) -> np.ndarray:
+    """Exponentially weighted moving average with pandas' `span` convention.
+
+    The kernel is cut off once weights drop below 0.1% of the first.
+    """
+    alpha = 2 / (max(1, span) + 1)
+    if alpha >= 1:
+        return np.asarray(values, dtype=np.float64)
+    length = min(len(values), int(np.ceil(np.log(1e-3) / np.log(1 - alpha))) + 1)
+    return _trailing(values, (1 - alpha) ** np.arange(max(1, length)))
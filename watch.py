@@ -0,0 +1,150 @@
+import shutil
+import sys
+import time
+from datetime import datetime, timedelta
+from models import StudySession, TimerState, SessionFilter
+from state import load_timers, get_state_version, get_elapsed_seconds
+from database import get_session, get_sessions
+from config import load_config
+from pomodoro import get_current_phase, get_phase_remaining
+from stats import format_duration, get_time_by_category, get_total_time
+from goals import GoalProgress, get_goal_progress, progress_bar
+
+ENTER_SCREEN = "\x1b[?1049h\x1b[?25l"
+LEAVE_SCREEN = "\x1b[?25h\x1b[?1049l"
+REDRAW = "\x1b[H\x1b[J"
+
+
+class WatchView:
+    """In-memory counters behind `cybersyn watch`.
+
+    The state file is stat()ed every tick; SQLite is only read when a
+    session starts or stops, or the day changes. Between those boundaries
+    the live sessions are added on top of the totals that were loaded.
+    """
+
+    def __init__(self) -> None:
+        self.state_version: int | None = -1
+        self.timers: dict[str, TimerState] = {}
+        self.cfg = load_config()
+        self.sessions: dict[int, StudySession] = {}
+        self.day = None
+        self.today_seconds = 0
+        self.week_seconds = 0
+        self.week_by_category: dict[str, int] = {}
+        self.goals: list[GoalProgress] = []
+
+    def refresh(self, now: datetime) -> None:
+        version = get_state_version()
+        boundary = now.date() != self.day
+
+        if version != self.state_version:
+            self.state_version = version
+            previous = {state.session_id for state in self.timers.values()}
+            self.timers = load_timers()
+            self.cfg = load_config()
+            boundary = boundary or previous != {state.session_id for state in self.timers.values()}
+
+        if boundary:
+            self._load_totals(now)
+
+    def _load_totals(self, now: datetime) -> None:
+        self.day = now.date()
+        today = datetime.combine(self.day, datetime.min.time())
+        week_start = today - timedelta(days=today.weekday())
+
+        sessions = get_sessions(SessionFilter(since=week_start))
+        # Running sessions are counted live, not from their stored zero duration
+        running = {state.session_id for state in self.timers.values()}
+        live_sessions = {s.id: s for s in sessions if s.id in running}
+        sessions = [s for s in sessions if s.id not in running]
+
+        self.week_seconds = get_total_time(sessions)
+        self.today_seconds = get_total_time([s for s in sessions if s.start_time >= today])
+        self.week_by_category = get_time_by_category(sessions)
+        # Sessions started before this week are not in the query above
+        self.sessions = {id: live_sessions.get(id) or get_session(id) for id in running}
+        self.goals = get_goal_progress(self.cfg.goals, self.day)
+
+    def render(self, width: int) -> str:
+        lines = [f"Cybersyn  {datetime.now().strftime('%a %Y-%m-%d %H:%M:%S')}", ""]
+
+        live = 0
+        live_by_category: dict[str, int] = {}
+        by_category = dict(self.week_by_category)
+        shown = 0
+        for timer_id, state in self.timers.items():
+            session = self.sessions.get(state.session_id)
+            if not state.is_running or not session:
+                continue
+            elapsed = int(get_elapsed_seconds(state))
+            live += elapsed
+            by_category[session.category] = by_category.get(session.category, 0) + elapsed
+            live_by_category[session.category] = live_by_category.get(session.category, 0) + elapsed
+
+            if shown:
+                lines.append("")
+            shown += 1
+            status = "PAUSED" if state.is_paused else "RUNNING"
+            label = f"  [{timer_id}]" if len(self.timers) > 1 else ""
+            lines.append(f"{status}  {session.task}{label}")
+            lines.append(f"Category: {session.category} | Week: {session.school_week}")
+            lines.append(f"Elapsed: {format_duration(elapsed)}")
+            if state.mode == "pomodoro":
+                phase = get_current_phase(state, self.cfg.pomodoro)
+                phase_display = phase.name.replace("_", " ").title()
+                remaining = get_phase_remaining(state, self.cfg.pomodoro)
+                lines.append(
+                    f"Phase: {phase_display} ({format_duration(remaining)} remaining)"
+                    f" | Cycle: {phase.cycle + 1}"
+                )
+        if not shown:
+            lines.append("No active session")
+
+        lines.append("")
+        lines.append(f"Today: {format_duration(self.today_seconds + live)}")
+        lines.append(f"This week: {format_duration(self.week_seconds + live)}")
+
+        if by_category:
+            lines.append("")
+            lines.append("By category (this week):")
+            peak = max(by_category.values()) or 1
+            name_width = min(20, max(len(name) for name in by_category))
+            bar_width = max(5, width - name_width - 16)
+            for name, seconds in sorted(by_category.items(), key=lambda x: x[1], reverse=True):
+                bar = "█" * int(seconds / peak * bar_width)
+                lines.append(f"  {name[:name_width]:<{name_width}} {bar:<{bar_width}} {format_duration(seconds)}")
+
+        if self.goals:
+            lines.append("")
+            lines.append("Goals:")
+            for recorded in self.goals:
+                goal = recorded.goal
+                progress = GoalProgress(goal, recorded.seconds + live_by_category.get(goal.category, 0))
+                mark = "  done" if progress.reached else ""
+                lines.append(
+                    f"  {goal.category[:20]:<20} {progress_bar(progress)}"
+                    f" {format_duration(progress.seconds)} / {goal.hours:g}h per {goal.period}{mark}"
+                )
+
+        lines.append("")
+        lines.append("Ctrl+C to exit")
+        return "\n".join(lines)
+
+
+def run_watch(interval: float = 1.0) -> None:
+    view = WatchView()
+    out = sys.stdout
+    out.write(ENTER_SCREEN)
+    try:
+        while True:
+            view.refresh(datetime.now())
+            out.write(REDRAW + view.render(shutil.get_terminal_size().columns))
+            out.flush()
+            # Wake on the next tick boundary so the clock does not drift
+            time.sleep(interval - (time.time() % interval))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        out.write(LEAVE_SCREEN)
+        out.flush()